@@ -0,0 +1,238 @@
+import os
+import sys
+import json
+import math
+import platform
+import argparse
+import statistics
+import subprocess
+from itertools import combinations
+from datetime import datetime
+
+# Imported first, it puts src on the path
+from synthetic_league import SyntheticLeague
+from run_benchmarks import BenchmarkSuite, write_results
+
+from file_handler import FileHandler
+from profiling import get_peak_rss
+
+
+# construct is the daily build's startup
+GATE_SCENARIOS = ['construct', 'single_market_table', 'full_workbook',
+                  'refresh']
+BASELINES_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                              'baselines')
+DATA_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data')
+
+
+def run_worker(league: SyntheticLeague, root: str, name: str):
+    """
+    Run scenario name once in this process and return dict of seconds, ops
+    and peak RSS. Scenarios other than construct and refresh first build
+    NBADataAnalysis, untimed, like the daily build does.
+    """
+
+    suite = BenchmarkSuite(league, root, repeat=1)
+    suite.setup()
+    try:
+        if name not in ['construct', 'refresh']:
+            suite.scenario_construct()
+        seconds, ops = suite.time_once(name)
+    finally:
+        suite.teardown()
+    return {'seconds': seconds, 'ops': ops, 'rss_peak_bytes': get_peak_rss()}
+
+def run_scenarios(league: SyntheticLeague, root: str, scenarios: list,
+                  repeat: int, worker_args: list):
+    """
+    Run each scenario repeat times, each run in a fresh Python process so
+    runs don't share caches and peak RSS is the scenario's own. Return dict
+    of scenario -> lists of times_s and rss_peak_bytes, and ops.
+    """
+
+    BenchmarkSuite(league, root).prepare()
+    results = {}
+    for name in scenarios:
+        runs = []
+        for _ in range(repeat):
+            output = subprocess.run(
+                [sys.executable, os.path.abspath(__file__), '--worker', name,
+                 '--data-dir', root] + worker_args,
+                capture_output=True, text=True)
+            if output.returncode != 0:
+                raise RuntimeError(f'{name} failed:\n{output.stderr}')
+            # Scenarios print progress, the result is the last line
+            runs.append(json.loads(output.stdout.strip().splitlines()[-1]))
+        results[name] = {
+            'times_s': [run['seconds'] for run in runs],
+            'rss_peak_bytes': [run['rss_peak_bytes'] for run in runs],
+            'ops': runs[-1]['ops']
+        }
+        print(f'{name}: {statistics.median(results[name]["times_s"]):.3f}s '
+              f'median of {repeat}, peak RSS '
+              f'{max(results[name]["rss_peak_bytes"]) / 1e6:.0f} MB')
+    return results
+
+def mann_whitney_p(baseline: list, new: list):
+    """
+    Return one-sided p-value of the Mann-Whitney U test that new values tend
+    to be larger than baseline values. Exact (every split of the pooled
+    values) for small samples, normal approximation for large ones.
+    """
+
+    def u_statistic(xs, ys):
+        return sum((x > y) + 0.5 * (x == y) for x in xs for y in ys)
+
+    u = u_statistic(new, baseline)
+    pooled = baseline + new
+    n, m = len(new), len(baseline)
+    if math.comb(n + m, n) <= 100000:
+        splits = 0
+        at_least = 0
+        for idx in combinations(range(n + m), n):
+            chosen = set(idx)
+            xs = [pooled[i] for i in idx]
+            ys = [pooled[i] for i in range(n + m) if i not in chosen]
+            at_least += u_statistic(xs, ys) >= u
+            splits += 1
+        return at_least / splits
+    mean = n * m / 2
+    sd = math.sqrt(n * m * (n + m + 1) / 12)
+    return 1 - statistics.NormalDist(mean, sd).cdf(u - 0.5)
+
+def compare(baseline: dict, results: dict, threshold: float=0.1,
+            memory_threshold: float=0.1, alpha: float=0.05):
+    """
+    Return list of comparison dicts, one per scenario in results. A scenario
+    regresses on time if its median is more than threshold (share) slower
+    than the baseline's and the Mann-Whitney p-value is at most alpha, and
+    on memory if its median peak RSS is more than memory_threshold higher.
+    Peak RSS barely varies between runs, so it isn't tested.
+    """
+
+    comparisons = []
+    for name, result in results.items():
+        base = baseline['scenarios'].get(name)
+        if base is None:
+            comparisons.append({'scenario': name, 'status': 'new',
+                                'regressed': False})
+            continue
+        base_time = statistics.median(base['times_s'])
+        new_time = statistics.median(result['times_s'])
+        time_change = new_time / base_time - 1
+        p_value = mann_whitney_p(base['times_s'], result['times_s'])
+        base_rss = statistics.median(base['rss_peak_bytes'])
+        new_rss = statistics.median(result['rss_peak_bytes'])
+        rss_change = new_rss / base_rss - 1
+        time_regressed = time_change > threshold and p_value <= alpha
+        memory_regressed = rss_change > memory_threshold
+        comparisons.append({
+            'scenario': name,
+            'status': 'regressed' if time_regressed or memory_regressed
+                      else 'ok',
+            'regressed': time_regressed or memory_regressed,
+            'baseline_median_s': base_time,
+            'median_s': new_time,
+            'time_change': time_change,
+            'p_value': p_value,
+            'time_regressed': time_regressed,
+            'baseline_rss_bytes': base_rss,
+            'rss_bytes': new_rss,
+            'rss_change': rss_change,
+            'memory_regressed': memory_regressed
+        })
+    return comparisons
+
+def print_comparisons(comparisons: list):
+    for comp in comparisons:
+        if comp['status'] == 'new':
+            print(f'{comp["scenario"]:22} new, not in baseline')
+            continue
+        print(f'{comp["scenario"]:22} {comp["baseline_median_s"]:8.3f}s -> '
+              f'{comp["median_s"]:8.3f}s ({comp["time_change"]:+6.1%}, '
+              f'p={comp["p_value"]:.3f})  '
+              f'{comp["baseline_rss_bytes"] / 1e6:6.0f} -> '
+              f'{comp["rss_bytes"] / 1e6:6.0f} MB '
+              f'({comp["rss_change"]:+6.1%})  {comp["status"].upper()}')
+
+
+if __name__ == "__main__":
+    # Store a baseline, then gate later changes against it:
+    #   python benchmarks/regression_gate.py --save-baseline
+    #   python benchmarks/regression_gate.py
+    parser = argparse.ArgumentParser(
+        description='Fail when key scenarios get slower or use more memory '
+        'than a stored baseline. Runs offline on a synthetic league.')
+    parser.add_argument('--save-baseline', action='store_true',
+                        help='store results as the baseline instead of '
+                        'comparing')
+    parser.add_argument('--baseline', default='baseline',
+                        help='baseline name in benchmarks/baselines')
+    parser.add_argument('--repeat', type=int, default=5,
+                        help='runs per scenario, at least 4 for a p-value '
+                        'of 0.05 or less')
+    parser.add_argument('--threshold', type=float, default=0.1,
+                        help='allowed slowdown of the median time, share')
+    parser.add_argument('--memory-threshold', type=float, default=0.1,
+                        help='allowed growth of the median peak RSS, share')
+    parser.add_argument('--alpha', type=float, default=0.05,
+                        help='significance level for slowdowns')
+    parser.add_argument('--scenarios', default=','.join(GATE_SCENARIOS))
+    parser.add_argument('--seasons', type=int, default=2)
+    parser.add_argument('--teams', type=int, default=30)
+    parser.add_argument('--roster', type=int, default=13)
+    parser.add_argument('--games', type=int, default=82)
+    parser.add_argument('--books', type=int, default=3)
+    parser.add_argument('--markets', type=int, default=4)
+    parser.add_argument('--data-dir', default=DATA_PATH,
+                        help='where the league is written and kept')
+    parser.add_argument('--worker', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    league = SyntheticLeague(seasons=args.seasons, n_teams=args.teams,
+                             roster_size=args.roster,
+                             games_per_team=args.games, n_books=args.books,
+                             n_markets=args.markets)
+    if args.worker:
+        print(json.dumps(run_worker(league, args.data_dir, args.worker)))
+        sys.exit()
+
+    worker_args = ['--seasons', str(args.seasons), '--teams', str(args.teams),
+                   '--roster', str(args.roster), '--games', str(args.games),
+                   '--books', str(args.books), '--markets', str(args.markets)]
+    baseline_handler = FileHandler(f'{args.baseline}.json', BASELINES_PATH,
+                                   indent=4)
+    if not args.save_baseline:
+        if not os.path.exists(baseline_handler.fp):
+            print(f'No baseline at {baseline_handler.fp}, run with '
+                  '--save-baseline first.')
+            sys.exit(2)
+        baseline = baseline_handler.load_file()
+        if baseline['league'] != league.get_config():
+            print('Baseline was stored for a different league, '
+                  f'{baseline["league"]}.')
+            sys.exit(2)
+
+    scenarios = args.scenarios.split(',')
+    results = {
+        'created': datetime.now().isoformat(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'repeat': args.repeat,
+        'league': league.get_config(),
+        'scenarios': run_scenarios(league, args.data_dir, scenarios,
+                                   args.repeat, worker_args)
+    }
+    if args.save_baseline:
+        os.makedirs(BASELINES_PATH, exist_ok=True)
+        baseline_handler.write_file(results)
+        print(f'Baseline written to {baseline_handler.fp}')
+        sys.exit()
+
+    comparisons = compare(baseline, results['scenarios'], args.threshold,
+                          args.memory_threshold, args.alpha)
+    print_comparisons(comparisons)
+    results['baseline'] = args.baseline
+    results['comparisons'] = comparisons
+    write_results(results, f'gate_{datetime.now():%Y%m%d_%H%M%S}')
+    sys.exit(1 if any(comp['regressed'] for comp in comparisons) else 0)
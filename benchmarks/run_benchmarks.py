@@ -0,0 +1,297 @@
+import os
+import time
+import platform
+import argparse
+import tempfile
+import statistics
+from random import Random
+from datetime import datetime
+
+# Imported first, it puts src on the path
+from synthetic_league import SyntheticLeague, SRC_PATH
+
+import get_data
+import get_data_api as api
+import api_replay
+from file_handler import FileHandler
+from data_analysis import NBADataAnalysis
+from analysis_application import AnalysisApplication
+from stub_api_server import (StubAPIServer, StubNBALeague, StubOddsLeague,
+                             StubRouter)
+from profiling import get_peak_rss
+
+
+SCENARIOS = ['construct', 'get_stats', 'def_ranks', 'prop_tables', 'workbook',
+             'single_market_table', 'full_workbook', 'refresh']
+RESULTS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                            'results')
+
+
+class BenchmarkSuite:
+    def __init__(self, league: SyntheticLeague, root: str, repeat: int=3):
+        """
+        Timed scenarios run against a synthetic league. The league is written
+        to root (reused if root already holds one with the same config) and
+        root is the working directory while scenarios run, so nothing reads
+        or writes the real data. Seasons come from a local stub API server.\n
+        repeat = times each scenario is run, every run is kept in results
+        """
+
+        self.league = league
+        self.root = os.path.abspath(root)
+        self.repeat = repeat
+        self.manifest = None # Result of league.write
+        self.analysis = None # NBADataAnalysis from the last construct run
+        self.tables = [] # (table, market abv) from the last prop_tables run
+        self.server = None
+        self.cwd = None
+
+    def prepare(self):
+        """Write the league to root, unless it is already there."""
+
+        manifest_handler = FileHandler('synthetic_league.json', self.root,
+                                       indent=4)
+        if os.path.exists(manifest_handler.fp):
+            self.manifest = manifest_handler.load_file()
+        if (self.manifest is None or
+                self.manifest['config'] != self.league.get_config()):
+            os.makedirs(self.root, exist_ok=True)
+            start = time.perf_counter()
+            self.manifest = self.league.write(self.root)
+            self.manifest['write_s'] = time.perf_counter() - start
+            manifest_handler.write_file(self.manifest)
+
+    def setup(self):
+        """Write the league if needed, start the stub API and enter root."""
+
+        self.prepare()
+        # NBADataAnalysis asks the API for the current season
+        self.server = StubAPIServer(StubNBALeague(
+            seasons=self.league.seasons, n_teams=2, roster_size=1,
+            games_per_team=1)).start()
+        get_data.set_api_overrides(api.NBAStatsAPIClient,
+                                   base_url=self.server.url, key='stub')
+        self.cwd = os.getcwd()
+        os.chdir(self.root)
+
+    def teardown(self):
+        os.chdir(self.cwd)
+        get_data.set_api_overrides(api.NBAStatsAPIClient)
+        self.server.stop()
+
+    def run(self, scenarios: list=None):
+        """
+        Run scenarios (default all, in SCENARIOS order) repeat times each and
+        return results dict. Scenarios after construct use the analysis it
+        built, so it always runs first.
+        """
+
+        scenarios = scenarios or SCENARIOS
+        if 'construct' not in scenarios:
+            scenarios = ['construct'] + scenarios
+        self.setup()
+        try:
+            results = {}
+            for name in scenarios:
+                results[name] = self.time_scenario(name)
+                print(f'{name}: {results[name]["median_s"]:.3f}s median of '
+                      f'{self.repeat}')
+        finally:
+            self.teardown()
+        return {
+            'created': datetime.now().isoformat(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'repeat': self.repeat,
+            'league': self.manifest,
+            'scenarios': results
+        }
+
+    def time_scenario(self, name: str):
+        """
+        Return dict with each run's seconds, their min, median, mean and
+        stdev, operations per run and peak RSS of the process after it.
+        """
+
+        times = []
+        for _ in range(self.repeat):
+            seconds, ops = self.time_once(name)
+            times.append(seconds)
+        return {
+            'times_s': times,
+            'min_s': min(times),
+            'median_s': statistics.median(times),
+            'mean_s': statistics.mean(times),
+            'stdev_s': statistics.stdev(times) if len(times) > 1 else 0.0,
+            'ops': ops,
+            'ops_per_s': ops / statistics.median(times),
+            'rss_peak_bytes': get_peak_rss()
+        }
+
+    def time_once(self, name: str):
+        """Return (seconds, operations) of one run of scenario name."""
+
+        scenario = getattr(self, f'scenario_{name}')
+        start = time.perf_counter()
+        ops = scenario()
+        return time.perf_counter() - start, ops
+
+    def get_markets(self):
+        return FileHandler('api_keys_player_prop_markets.json',
+                           'data/nba/odds').load_file()
+
+    def get_slate_date(self):
+        return datetime.strptime(self.manifest['slate_date'], '%Y-%m-%d')
+
+    def scenario_construct(self):
+        """Build NBADataAnalysis from the json files."""
+
+        self.analysis = None
+        self.analysis = NBADataAnalysis()
+        return 1
+
+    def scenario_get_stats(self):
+        """
+        Mix of get_stats queries for every player with games: all games,
+        home only, vs an opponent, current season and last 10 with several
+        stats.
+        """
+
+        rand = Random(0)
+        team_ids = [team.id for team in self.analysis.teams]
+        season = self.league.seasons[-1]
+        ops = 0
+        for player in self.analysis.players:
+            if len(player.gamelog) == 0:
+                continue
+            player.get_stats(['points'])
+            player.get_stats(['rebounds', 'assists'], loc='home')
+            player.get_stats(['points', 'date'], opps=[rand.choice(team_ids)])
+            player.get_stats(['minutes', 'threes'], seasons=[season])
+            player.get_stats(['points', 'rebounds', 'assists', 'opponent'],
+                             n_games=10)
+            ops += 5
+        return ops
+
+    def scenario_def_ranks(self):
+        """Build defence ranks for each market's stat."""
+
+        markets = self.get_markets()
+        for market in markets:
+            self.analysis.get_def_ranks_vs_stats(market['str_to_stat'])
+        return len(markets)
+
+    def scenario_prop_tables(self):
+        """Build the prop table of every market for the full slate."""
+
+        date_obj = self.get_slate_date()
+        self.tables = []
+        rows = 0
+        for market in self.get_markets():
+            table = self.analysis.create_player_prop_tables(date_obj, market)
+            self.tables.append((table, market['abv_name']))
+            rows += len(table)
+        return rows
+
+    def scenario_workbook(self):
+        """Write the last prop tables to an Excel workbook."""
+
+        if len(self.tables) == 0:
+            self.scenario_prop_tables()
+        self.analysis.tables_to_excel('nba_prop_analysis_tables_data.xlsx',
+                                      tables=self.tables)
+        return len(self.tables)
+
+    def scenario_single_market_table(self):
+        """Build the slate's prop table for the first market only."""
+
+        market = self.get_markets()[0]
+        table = self.analysis.create_player_prop_tables(
+            self.get_slate_date(), market)
+        return len(table)
+
+    def scenario_full_workbook(self):
+        """
+        Update the prop analysis workbook for the slate, every market, the
+        way the daily build does.
+        """
+
+        app = AnalysisApplication()
+        app.sport = 'nba'
+        app.analysis = self.analysis
+        app.update_player_prop_analysis_workbook(self.manifest['slate_date'])
+        return len(self.get_markets())
+
+    def scenario_refresh(self):
+        """
+        Full and delta refresh_data, core and prop line refreshes against a
+        local stub API serving the league's last season, through
+        api_replay.run_benchmark (in its own temporary workspace). Returns
+        number of API requests.
+        """
+
+        league = StubRouter(
+            StubNBALeague(seasons=self.league.seasons[-1:],
+                          n_teams=self.league.n_teams,
+                          roster_size=self.league.roster_size,
+                          games_per_team=self.league.games_per_team,
+                          seed=self.league.seed),
+            StubOddsLeague())
+        # The workspace is built from the repository's key files
+        os.chdir(os.path.dirname(SRC_PATH))
+        try:
+            with StubAPIServer(league=league) as server:
+                results = api_replay.run_benchmark(
+                    server.url, self.manifest['slate_date'],
+                    rate_limit=1000000)
+        finally:
+            os.chdir(self.root)
+            # run_benchmark clears the overrides, put the seasons stub back
+            get_data.set_api_overrides(api.NBAStatsAPIClient,
+                                       base_url=self.server.url, key='stub')
+        return sum(result['requests'] for result in results.values())
+
+
+def write_results(results: dict, name: str=None,
+                  file_path: str=RESULTS_PATH):
+    """Write results to {file_path}/{name}.json, return the file's path."""
+
+    if name is None:
+        config = results['league']['config']
+        name = (f'bench_{config["seasons"]}s_{config["teams"]}t_' +
+                datetime.now().strftime('%Y%m%d_%H%M%S'))
+    os.makedirs(file_path, exist_ok=True)
+    results_handler = FileHandler(f'{name}.json', file_path, indent=4)
+    results_handler.write_file(results)
+    return results_handler.fp
+
+
+if __name__ == "__main__":
+    # python benchmarks/run_benchmarks.py --seasons 20 --repeat 3
+    parser = argparse.ArgumentParser(
+        description='Time analysis scenarios on a synthetic league.')
+    parser.add_argument('--seasons', type=int, default=1)
+    parser.add_argument('--teams', type=int, default=30)
+    parser.add_argument('--roster', type=int, default=13)
+    parser.add_argument('--games', type=int, default=82,
+                        help='games per team per season')
+    parser.add_argument('--books', type=int, default=3)
+    parser.add_argument('--markets', type=int, default=4)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--scenarios', default=','.join(SCENARIOS),
+                        help='comma separated, from ' + ', '.join(SCENARIOS))
+    parser.add_argument('--data-dir', help='where to write (and keep) the '
+                        'league, default a temporary directory')
+    parser.add_argument('--name', help='results file name, without .json')
+    args = parser.parse_args()
+
+    league = SyntheticLeague(seasons=args.seasons, n_teams=args.teams,
+                             roster_size=args.roster,
+                             games_per_team=args.games, n_books=args.books,
+                             n_markets=args.markets, seed=args.seed)
+    scenarios = args.scenarios.split(',')
+    with tempfile.TemporaryDirectory() as tmp:
+        suite = BenchmarkSuite(league, args.data_dir or tmp, args.repeat)
+        results = suite.run(scenarios)
+    print(f'Results written to {write_results(results, args.name)}')
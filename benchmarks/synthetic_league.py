@@ -0,0 +1,257 @@
+import os
+import sys
+import argparse
+from random import Random
+from datetime import datetime, timedelta
+
+# Benchmarks run from the repository root, the code they time lives in src
+SRC_PATH = os.path.join(os.path.dirname(os.path.dirname(
+    os.path.abspath(__file__))), 'src')
+if SRC_PATH not in sys.path:
+    sys.path.insert(0, SRC_PATH)
+
+import get_data
+import gamelog_schema
+from file_handler import FileHandler
+from stub_api_server import StubNBALeague
+
+
+MARKETS_FILE = os.path.join(os.path.dirname(SRC_PATH), 'data', 'nba', 'odds',
+                            'api_keys_player_prop_markets.json')
+BOOKMAKERS = [('draftkings', 'DraftKings'), ('fanduel', 'FanDuel'),
+              ('betmgm', 'BetMGM'), ('williamhill_us', 'Caesars'),
+              ('betrivers', 'BetRivers'), ('bovada', 'Bovada'),
+              ('mybookieag', 'MyBookie.ag'), ('betonlineag', 'BetOnline.ag')]
+
+
+class SyntheticLeague:
+    def __init__(self, seasons: int=1, n_teams: int=30, roster_size: int=13,
+                 games_per_team: int=82, n_books: int=3, n_markets: int=4,
+                 injuries_per_team: int=1, last_season: int=2023,
+                 seed: int=0):
+        """
+        Fake NBA league written in the exact data/nba layout, so
+        NBADataAnalysis can be timed at any scale without the real data.
+        Raw responses come from StubNBALeague and go through get_data's
+        organize functions, so files match what a data reload writes. The
+        last day of the last season is left unplayed, with props for every
+        player in it: the slate for prop tables.\n
+        seasons = number of seasons, ending with last_season\n
+        n_books = bookmakers offering each prop (max 8)\n
+        n_markets = first n_markets of api_keys_player_prop_markets.json\n
+        injuries_per_team = players listed as out on each team
+        """
+
+        self.seasons = list(range(last_season - seasons + 1, last_season + 1))
+        self.n_teams = n_teams
+        self.roster_size = roster_size
+        self.games_per_team = games_per_team
+        self.books = BOOKMAKERS[:n_books]
+        self.markets = FileHandler(os.path.basename(MARKETS_FILE),
+                                   os.path.dirname(MARKETS_FILE)
+                                   ).load_file()[:n_markets]
+        self.injuries_per_team = injuries_per_team
+        self.seed = seed
+        self.rand = Random(seed)
+        self.league = StubNBALeague(seasons=self.seasons, n_teams=n_teams,
+                                    roster_size=roster_size,
+                                    games_per_team=games_per_team, seed=seed)
+        self.slate_date = None # Date of the unplayed games, set by write
+
+    def get_config(self):
+        """Return dict of the settings that decide the league's size."""
+
+        return {'seasons': len(self.seasons), 'first_season': self.seasons[0],
+                'last_season': self.seasons[-1], 'teams': self.n_teams,
+                'roster_size': self.roster_size,
+                'games_per_team': self.games_per_team,
+                'books': len(self.books), 'markets': len(self.markets),
+                'injuries_per_team': self.injuries_per_team,
+                'seed': self.seed}
+
+    def write(self, root: str):
+        """
+        Write the league to {root}/data/nba and create {root}/excel/nba, so a
+        run with root as working directory reads only synthetic data. Return
+        dict of config, slate date and number of rows written per kind.
+        """
+
+        sport_path = os.path.join(root, 'data', 'nba')
+        for folder in ['teams', 'games', 'players/gamelogs',
+                       'odds/player_props']:
+            os.makedirs(os.path.join(sport_path, folder), exist_ok=True)
+        os.makedirs(os.path.join(root, 'excel', 'nba'), exist_ok=True)
+        counts = {}
+
+        teams = [get_data.organize_nba_team_data(team) for team in
+                 self.league.get_response('/teams', {})[1]['response']]
+        FileHandler('nba_teams.json', os.path.join(sport_path, 'teams')
+                    ).write_file(teams)
+        counts['teams'] = len(teams)
+
+        raw_players = self.league.get_response('/players', {})[1]['response']
+        players = [get_data.organize_nba_player_data(player)
+                   for player in raw_players]
+        players_path = os.path.join(sport_path, 'players')
+        FileHandler('nba_players.json', players_path).write_file(players)
+        FileHandler('alt_player_names.json', players_path).write_file({})
+        counts['players'] = len(players)
+
+        counts['games'], counts['gamelogs'] = 0, 0
+        for season in self.seasons:
+            games, gamelogs = self.__write_season(sport_path, season)
+            counts['games'] += games
+            counts['gamelogs'] += gamelogs
+
+        slate = self.__get_slate_games()
+        counts['injuries'] = self.__write_injuries(players_path, raw_players,
+                                                   slate)
+        counts['props'] = self.__write_props(sport_path, raw_players, slate)
+        return {'config': self.get_config(),
+                'slate_date': self.slate_date.strftime('%Y-%m-%d'),
+                'counts': counts}
+
+    def __write_season(self, sport_path: str, season: int):
+        """Write season's games and gamelogs, return number of each."""
+
+        raw_games = self.league.get_response(
+            '/games', {'season': season})[1]['response']
+        # Last day of the last season is the slate, not played yet
+        if season == self.seasons[-1]:
+            slate_start = raw_games[-1]['date']['start']
+            raw_games = [{**game, 'status': {'long': 'Scheduled'}}
+                         if game['date']['start'] == slate_start else game
+                         for game in raw_games]
+        games = {str(game['id']): get_data.organize_nba_game_data(game)
+                 for game in raw_games}
+        FileHandler(f'{season}_nba_games.json',
+                    os.path.join(sport_path, 'games')).write_file(games)
+
+        finished = {game_id: game for game_id, game in games.items()
+                    if game['finished']}
+        gamelogs_path = os.path.join(sport_path, 'players', 'gamelogs')
+        n_gamelogs = 0
+        for team in range(1, self.n_teams + 1):
+            player_stats = self.league.get_response(
+                '/players/statistics', {'team': team, 'season': season})[1]
+            gamelogs = get_data.organize_player_stats_response(
+                'nba', player_stats, finished)
+            FileHandler(f'{season}_{team}_player_gamelogs.json', gamelogs_path
+                        ).write_file(gamelog_schema.normalise_gamelogs(gamelogs))
+            n_gamelogs += len(gamelogs)
+        return len(games), n_gamelogs
+
+    def __get_slate_games(self):
+        """Return raw games of the slate, setting slate_date."""
+
+        raw_games = self.league.get_response(
+            '/games', {'season': self.seasons[-1]})[1]['response']
+        slate_start = raw_games[-1]['date']['start']
+        slate = [game for game in raw_games
+                 if game['date']['start'] == slate_start]
+        self.slate_date = get_data.convert_utc_to_est(slate_start)
+        return slate
+
+    def __get_roster(self, raw_players: list, team: int):
+        return [player for player in raw_players if player['_team'] == team]
+
+    def __write_injuries(self, players_path: str, raw_players: list,
+                         slate: list):
+        injuries = []
+        for game in slate:
+            for side in ['home', 'visitors']:
+                roster = self.__get_roster(raw_players,
+                                           game['teams'][side]['id'])
+                for player in self.rand.sample(
+                        roster, min(self.injuries_per_team, len(roster))):
+                    injuries.append({
+                        'name': f'{player["firstname"]} {player["lastname"]}',
+                        'status': 'Out',
+                        'comment': 'Synthetic injury.'
+                    })
+        FileHandler('nba_player_injuries.json', players_path
+                    ).write_file(injuries)
+        return len(injuries)
+
+    def __write_props(self, sport_path: str, raw_players: list, slate: list):
+        """
+        Write events, markets and one props file per market for the slate,
+        each player getting an over and under line from every book.
+        """
+
+        odds_path = os.path.join(sport_path, 'odds')
+        # Lines were last updated a few hours before tip-off, in UTC like
+        # The Odds API
+        last_update = (datetime.fromisoformat(slate[0]['date']['start']) -
+                       timedelta(hours=4)).strftime('%Y-%m-%dT%H:%M:%SZ')
+        events = []
+        for i, game in enumerate(slate):
+            events.append({
+                'id': f'{self.seed:016x}{i:016x}',
+                'sport_key': 'basketball_nba',
+                'sport_title': 'NBA',
+                'commence_time': game['date']['start'].replace('.000Z', 'Z'),
+                'home_team': f'Team {game["teams"]["home"]["id"]}',
+                'away_team': f'Team {game["teams"]["visitors"]["id"]}'
+            })
+        FileHandler('events.json', odds_path).write_file(events)
+        FileHandler('api_keys_player_prop_markets.json', odds_path
+                    ).write_file(self.markets)
+
+        n_props = 0
+        for market in self.markets:
+            odds = []
+            for event, game in zip(events, slate):
+                players = (self.__get_roster(raw_players,
+                                             game['teams']['home']['id']) +
+                           self.__get_roster(raw_players,
+                                             game['teams']['visitors']['id']))
+                bookmakers = []
+                for book_key, book_name in self.books:
+                    outcomes = []
+                    for player in players:
+                        point = self.rand.randint(0, 30) + 0.5
+                        for name in ['Over', 'Under']:
+                            outcomes.append({
+                                'name': name,
+                                'description': f'{player["firstname"]} '
+                                               f'{player["lastname"]}',
+                                'price': self.rand.choice([-125, -115, -110,
+                                                           -105, 100, 110]),
+                                'point': point
+                            })
+                    bookmakers.append({'key': book_key, 'title': book_name,
+                                       'markets': [{
+                                           'key': market['key'],
+                                           'last_update': last_update,
+                                           'outcomes': outcomes}]})
+                odds.append({**event, 'bookmakers': bookmakers})
+            props = get_data.organize_all_market_odds(odds, market)
+            FileHandler(f'{market["key"]}.json',
+                        os.path.join(odds_path, 'player_props')
+                        ).write_file(props)
+            n_props += len(props)
+        return n_props
+
+
+if __name__ == "__main__":
+    # python benchmarks/synthetic_league.py DIR [--seasons 20] ...
+    parser = argparse.ArgumentParser(
+        description='Write a synthetic NBA league in the data/nba layout.')
+    parser.add_argument('root', help='directory to write data/nba and '
+                        'excel/nba to')
+    parser.add_argument('--seasons', type=int, default=1)
+    parser.add_argument('--teams', type=int, default=30)
+    parser.add_argument('--roster', type=int, default=13)
+    parser.add_argument('--games', type=int, default=82,
+                        help='games per team per season')
+    parser.add_argument('--books', type=int, default=3)
+    parser.add_argument('--markets', type=int, default=4)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    league = SyntheticLeague(seasons=args.seasons, n_teams=args.teams,
+                             roster_size=args.roster,
+                             games_per_team=args.games, n_books=args.books,
+                             n_markets=args.markets, seed=args.seed)
+    print(league.write(args.root))
@@ -1,4 +1,6 @@
+import os
 import sys
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 import pandas as pd
 
@@ -6,6 +8,8 @@ import get_data
 import get_data_api as api
 from file_handler import FileHandler
 from data_analysis import NBADataAnalysis
+from backtest import NBABacktest
+from job_journal import JobJournal
 
 
 class AnalysisApplication:
@@ -14,10 +18,10 @@ class AnalysisApplication:
         self.analysis = None
         self.props_lim = {'nba': 4, 'nfl': 4, 'nhl': 4, 'mlb': 4}
 
-    def initialize_objects(self):
+    def initialize_objects(self, save_aliases: bool=True):
         if self.sport == 'nba':
             get_data.get_player_injuries(self.sport)
-            self.analysis = NBADataAnalysis()
+            self.analysis = NBADataAnalysis(save_aliases=save_aliases)
         elif self.sport == 'nfl':
             pass
         elif self.sport == 'nhl':
@@ -25,51 +29,97 @@ class AnalysisApplication:
         elif self.sport == 'mlb':
             pass
 
-    def complete_data_reload(self):
+    def complete_data_reload(self, resume: bool=True, season_workers: int=3):
         """
         Completely reload all team, game, player, and player stats data for 
         all seasons.\n
-        311/100 API calls, cost $0.0311, 31.1 min.
+        311/100 API calls, cost $0.0311. Seasons run concurrently, so time is 
+        bound by the API rate limit (~31 min at 10 calls/min).\n
+        Every completed step is recorded in a job journal with its output 
+        file's hash. If resume is True, steps completed by an earlier run 
+        (with unchanged output) are skipped, so a failed reload can be 
+        restarted where it stopped.
         """
+
+        journal = JobJournal(f'{self.sport}_complete_data_reload.jsonl')
+        if not resume:
+            journal.clear()
         
         # Get list of all seasons
         seasons = get_data.get_seasons(self.sport)
         
         # Get team data, then load into teams variable
-        get_data.get_team_data(self.sport)
-        json_handler = FileHandler(f'{self.sport}_teams.json', f'data/{self.sport}/teams')
+        teams_path = f'data/{self.sport}/teams'
+        journal.run_step(f'teams/{self.sport}', 'teams', {}, 
+                         f'{teams_path}/{self.sport}_teams.json',
+                         get_data.get_team_data, self.sport)
+        json_handler = FileHandler(f'{self.sport}_teams.json', teams_path)
         teams = json_handler.load_file()
         
         # Get only player data for current season
         # Player objects in data_analysis are only needed for active players
-        get_data.get_player_data(self.sport, seasons[-1])
+        journal.run_step(f'players/{self.sport}/{seasons[-1]}', 'players', 
+                         {'season': seasons[-1]},
+                         f'data/{self.sport}/players/{self.sport}_players.json',
+                         get_data.get_player_data, self.sport, seasons[-1])
+
+        # Go through all seasons and get game data and player stats. Seasons 
+        # are independent, the client's rate limiter is shared between them
+        team_ids = [team['id'] for team in teams]
 
-        # Go through all seasosn and get game data and player stats
-        for season in seasons:
-            get_data.get_game_data(self.sport, season)
-            for team in teams:
-                get_data.get_player_stats_data(f'{self.sport}', team['id'], season)
+        def reload_season(season):
+            journal.run_step(f'games/{self.sport}/{season}', 'games', 
+                             {'season': season},
+                             f'data/{self.sport}/games/{season}_{self.sport}_games.json',
+                             get_data.get_game_data, self.sport, season)
+            get_data.get_all_player_stats_data(self.sport, team_ids, season,
+                                               journal=journal)
+            if season == seasons[-1]:
+                games_handler = FileHandler(f'{season}_{self.sport}_games.json',
+                                            f'data/{self.sport}/games')
+                get_data.save_sync_watermark(self.sport, season, 
+                                             games_handler.load_file())
+
+        with ThreadPoolExecutor(max_workers=season_workers) as executor:
+            futures = [executor.submit(reload_season, season) 
+                       for season in seasons]
+        errors = [future.exception() for future in futures 
+                  if future.exception() is not None]
+        if len(errors) > 0:
+            print(f'{len(errors)} seasons failed, run again to resume.')
+            raise errors[0]
+        # Job finished, the next reload starts from scratch
+        journal.clear()
 
     def refresh_data(self):
         """
-        Refresh all team, game, player, and player stats data for current season.
+        Refresh game, player, and player stats data for current season.
         Can use if last update occured during the current season.\n
-        63/100 API calls, cost $0.00, 6.3 min.
+        Only player stats for games finished since the last sync are fetched, 
+        one call per game, and merged into the gamelog files. Player data is 
+        only reloaded when a new player shows up. About 2 + n_games API 
+        calls, or 63 if the season has not been synced yet or more games 
+        than teams finished since the last sync.
         """
         
         # Get current season
         season = get_data.get_seasons(self.sport)[-1]
         
-        # Get team data, then load into teams variable
-        get_data.get_team_data(self.sport)
-        json_handler = FileHandler(f'{self.sport}_teams.json', f'data/{self.sport}/teams')
-        teams = json_handler.load_file()
+        # Team data rarely changes, only get it if missing
+        if not os.path.exists(f'data/{self.sport}/teams/{self.sport}_teams.json'):
+            get_data.get_team_data(self.sport)
         
-        # For current season, get game and player data, and player stats
+        # For current season, get games, then player stats for new games
         get_data.get_game_data(self.sport, season)
-        get_data.get_player_data(self.sport, season)
-        for team in teams:
-            get_data.get_player_stats_data(self.sport, team['id'], season)
+        new_player_ids = get_data.get_new_player_stats_data(self.sport, season)
+
+        players_path = f'data/{self.sport}/players'
+        player_ids = set()
+        if os.path.exists(f'{players_path}/{self.sport}_players.json'):
+            json_handler = FileHandler(f'{self.sport}_players.json', players_path)
+            player_ids = {player['id'] for player in json_handler.load_file()}
+        if len(player_ids) == 0 or not new_player_ids <= player_ids:
+            get_data.get_player_data(self.sport, season)
 
     def refresh_core_lines(self, date_str: str):
         """
@@ -86,7 +136,8 @@ class AnalysisApplication:
         """
         Update events.json, then use market keys and date string to get odds
         for all markets other than the featured markets.\n
-        Will results in (n_markets x n_events)/20,000 API calls.
+        All markets for an event are fetched in one call, and events are 
+        fetched concurrently. Costs (n_markets x n_events) API credits.
         """
 
         get_data.get_events(self.sport, date_str)
@@ -96,18 +147,20 @@ class AnalysisApplication:
         if limited:
             markets = markets[:self.props_lim[self.sport]]
         
-        for market in markets:
-            get_data.get_additional_market_odds(self.sport, market)
+        get_data.get_additional_markets_odds(self.sport, markets)
 
     def update_core_analysis_workbook(self):
         pass
 
-    def update_player_prop_analysis_workbook(self, date_str: str, limited=False):
+    def update_player_prop_analysis_workbook(self, date_str: str, limited=False,
+                                             output='excel'):
         """
         Update player prop data in prop analysis workbook.\n
         date_str should be in form 'yyyy-mm-dd'\n
         limited is False by default, if True only take core props 
-        from API keys json file (This will differ between sports).
+        from API keys json file (This will differ between sports).\n
+        output = 'excel' (default), 'parquet' or 'arrow'. Parquet and arrow 
+        write partitioned files to data/{sport}/tables instead of a workbook.
         """
 
         markets_handler = FileHandler('api_keys_player_prop_markets.json', 
@@ -122,10 +175,36 @@ class AnalysisApplication:
         # Loop through prop dicts to create separate tables and add to tables
         for market in markets:
             table = self.analysis.create_player_prop_tables(date_obj, market)
-            tables.append((table, market['abv_name']))
+            if output == 'excel':
+                tables.append((table, market['abv_name']))
+            else:
+                tables.append((table, market['key']))
+
+        if output == 'excel':
+            table_name = f'{self.sport}_prop_analysis_tables_data.xlsx'
+            self.analysis.tables_to_excel(table_name, tables=tables)
+        else:
+            self.analysis.tables_to_parquet(date_obj, tables=tables, 
+                                            file_format=output)
+
+    def backtest_player_prop_analysis(self, start_str: str, end_str: str, 
+                                      limited=False):
+        """
+        Replay player prop analysis for each date from start_str to end_str 
+        using only games before tip-off, and save results joined with actual 
+        outcomes to data/{sport}/backtests.\n
+        start_str and end_str should be in form 'yyyy-mm-dd'
+        """
+
+        markets_handler = FileHandler('api_keys_player_prop_markets.json', 
+                                      f'data/{self.sport}/odds')
+        markets = markets_handler.load_file()
+        if limited:
+            markets = markets[:self.props_lim[self.sport]]
 
-        table_name = f'{self.sport}_prop_analysis_tables_data.xlsx'
-        self.analysis.tables_to_excel(table_name, tables=tables)
+        backtest = NBABacktest(self.analysis)
+        results = backtest.run(start_str, end_str, markets)
+        backtest.results_to_csv(results, start_str, end_str)
 
     def input_date(self):
         dt = input('Please input date in format yyyy-mm-dd: ')
@@ -139,6 +218,12 @@ class AnalysisApplication:
             elif lim == 'n':
                 return False
 
+    def input_output(self):
+        while True:
+            out = input('Output format? (excel/parquet/arrow): ')
+            if out in ['excel', 'parquet', 'arrow']:
+                return out
+
     def exit(self):
         sys.exit()
 
@@ -181,6 +266,7 @@ class AnalysisApplication:
         print('00: Complete Reload of Game, Player, and Team Data')
         print()
         print('auto: Toggle Auto')
+        print('offline: Toggle Offline (cached API responses only)')
         print()
         print('1: Refresh Data')
         print('2: Refresh Core Lines')
@@ -193,6 +279,8 @@ class AnalysisApplication:
         print('7: Refresh Data and Player Prop Lines + Update Player Prop Analysis Workbooks')
         print('8: Refresh All Data and Lines + Update All Analysis Workbooks')
         print()
+        print('9: Backtest Player Prop Analysis')
+        print()
         print('main: Return to Main Menu')
         print('exit: Exit Program')
         print('--------------------------')
@@ -202,58 +290,96 @@ class AnalysisApplication:
         while True:
             print()
             command = input('Command: ')
-            if command == '00':
-                self.complete_data_reload()
-            elif command == 'auto':
-                pass
-            elif command == '1':
-                self.refresh_data()
-            elif command == '2':
-                dt = self.input_date()
-                self.refresh_core_lines(dt)
-            elif command == '3':
-                dt = self.input_date()
-                lim = self.input_limited()
-                self.refresh_player_prop_lines(dt, limited=lim)
-            elif command == '4':
-                self.initialize_objects()
-                self.update_core_analysis_workbook()
-            elif command == '5':
-                dt = self.input_date()
-                lim = self.input_limited()
-                self.initialize_objects()
-                self.update_player_prop_analysis_workbook(dt, limited=lim)
-            elif command == '6':
-                dt = self.input_date()
-                self.refresh_data()
-                self.refresh_core_lines(dt)
-                self.initialize_objects()
-                self.update_core_analysis_workbook()
-            elif command == '7':
-                dt = self.input_date()
-                lim = self.input_limited()
-                self.refresh_data()
-                self.refresh_player_prop_lines(dt, limited=lim)
-                self.initialize_objects()
-                self.update_player_prop_analysis_workbook(dt, limited=lim)
-            elif command == '8':
-                dt = self.input_date()
-                lim = self.input_limited()
-                self.refresh_data()
-                self.refresh_core_lines(dt)
-                self.refresh_player_prop_lines(dt, limited=lim)
-                self.initialize_objects()
-                self.update_core_analysis_workbook()
-                self.update_player_prop_analysis_workbook(dt, limited=lim)
-            elif command == 'main':
-                self.main_menu()
-                break
-            elif command == 'exit':
-                self.exit()
-            else:
-                self.sport_menu()
+            # A request that still fails after retries returns to the menu
+            try:
+                if command == '00':
+                    self.complete_data_reload()
+                elif command == 'auto':
+                    pass
+                elif command == 'offline':
+                    get_data.set_cache_only(not get_data.cache_only)
+                    print(f'Offline: {get_data.cache_only}')
+                elif command == '1':
+                    self.refresh_data()
+                elif command == '2':
+                    dt = self.input_date()
+                    self.refresh_core_lines(dt)
+                elif command == '3':
+                    dt = self.input_date()
+                    lim = self.input_limited()
+                    self.refresh_player_prop_lines(dt, limited=lim)
+                elif command == '4':
+                    self.initialize_objects()
+                    self.update_core_analysis_workbook()
+                elif command == '5':
+                    dt = self.input_date()
+                    lim = self.input_limited()
+                    out = self.input_output()
+                    self.initialize_objects()
+                    self.update_player_prop_analysis_workbook(dt, limited=lim, 
+                                                              output=out)
+                elif command == '6':
+                    dt = self.input_date()
+                    self.refresh_data()
+                    self.refresh_core_lines(dt)
+                    self.initialize_objects()
+                    self.update_core_analysis_workbook()
+                elif command == '7':
+                    dt = self.input_date()
+                    lim = self.input_limited()
+                    out = self.input_output()
+                    self.refresh_data()
+                    self.refresh_player_prop_lines(dt, limited=lim)
+                    self.initialize_objects()
+                    self.update_player_prop_analysis_workbook(dt, limited=lim, 
+                                                              output=out)
+                elif command == '8':
+                    dt = self.input_date()
+                    lim = self.input_limited()
+                    out = self.input_output()
+                    self.refresh_data()
+                    self.refresh_core_lines(dt)
+                    self.refresh_player_prop_lines(dt, limited=lim)
+                    self.initialize_objects()
+                    self.update_core_analysis_workbook()
+                    self.update_player_prop_analysis_workbook(dt, limited=lim, 
+                                                              output=out)
+                elif command == '9':
+                    start = self.input_date()
+                    end = self.input_date()
+                    lim = self.input_limited()
+                    self.initialize_objects(save_aliases=False)
+                    self.backtest_player_prop_analysis(start, end, limited=lim)
+                elif command == 'main':
+                    self.main_menu()
+                    break
+                elif command == 'exit':
+                    self.exit()
+                else:
+                    self.sport_menu()
+            except api.APIRequestError as e:
+                print(f'Failed: {e}')
 
 
 if __name__ == "__main__":
+    import argparse
+    from profiling import profiler
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--profile', nargs='?', const='data/profiles',
+                        metavar='DIR', help='time analysis phases and write '
+                        'a json and folded stack report to DIR on exit '
+                        '(same as SBA_PROFILE=1)')
+    parser.add_argument('--profile-memory', action='store_true',
+                        help='profile as with --profile and also report '
+                        'memory after each analysis phase and table (same '
+                        'as SBA_PROFILE=memory)')
+    args = parser.parse_args()
+    # Memory checkpoints are part of the profile report
+    if args.profile_memory and args.profile is None:
+        args.profile = 'data/profiles'
+    if args.profile:
+        profiler.enable(args.profile, memory=args.profile_memory)
+
     app = AnalysisApplication()
     app.main_execute()
\ No newline at end of file
@@ -0,0 +1,206 @@
+import os
+import sys
+import json
+import time
+import shutil
+import hashlib
+import argparse
+import tempfile
+import threading
+
+import get_data
+import get_data_api as api
+from file_handler import FileHandler
+from stub_api_server import (StubAPIServer, StubNBALeague, StubOddsLeague,
+                             StubRouter)
+
+
+class ResponseRecorder:
+    def __init__(self, file_path: str='data/fixtures'):
+        """
+        Save every API response as a fixture file, so a session can be
+        replayed offline with ReplayLeague. API keys are never saved.\n
+        file_path = folder for fixture files
+        """
+
+        self.file_path = file_path
+        self.lock = threading.Lock()
+        os.makedirs(file_path, exist_ok=True)
+
+    def record(self, base_url: str, url: str, params: dict, response,
+               headers: dict={}):
+        path = url[len(base_url):] if url.startswith(base_url) else url
+        params = get_fixture_params(params)
+        fixture = {
+            'path': path,
+            'params': params,
+            'headers': {k: v for k, v in headers.items()
+                        if k.lower().startswith('x-requests')},
+            'response': response
+        }
+        name = get_fixture_key(path, params) + '.json'
+        with self.lock:
+            json_handler = FileHandler(name, self.file_path)
+            json_handler.write_file(fixture)
+
+
+class ReplayLeague:
+    def __init__(self, file_path: str='data/fixtures'):
+        """
+        Serve recorded fixtures from ResponseRecorder through StubAPIServer.
+        Requests must match a recorded path and params (API key ignored).
+        """
+
+        self.fixtures = {}
+        for file in sorted(os.listdir(file_path)):
+            json_handler = FileHandler(file, file_path)
+            fixture = json_handler.load_file()
+            key = get_fixture_key(fixture['path'], fixture['params'])
+            self.fixtures[key] = fixture
+
+    def get_response(self, path: str, params: dict):
+        """Return (status, JSON, headers) for a recorded request."""
+
+        fixture = self.fixtures.get(
+            get_fixture_key(path, get_fixture_params(params)))
+        if fixture is None:
+            return 404, {'message': f'No fixture for {path} {params}'}
+        return 200, fixture['response'], fixture['headers']
+
+
+def get_fixture_params(params: dict):
+    """Return params without API key or empty values, as str values."""
+
+    return {k: str(v) for k, v in params.items()
+            if k != 'apiKey' and v not in [None, '']}
+
+def get_fixture_key(path: str, params: dict):
+    key = json.dumps([path, sorted(params.items())])
+    return hashlib.sha1(key.encode()).hexdigest()
+
+def make_workspace(sport: str):
+    """
+    Create temporary folder with the key files get_data reads and empty data
+    folders, and return its path. Benchmarks run there so data/ is untouched.
+    """
+
+    workspace = tempfile.mkdtemp(prefix='replay_')
+    os.makedirs(os.path.join(workspace, 'src'))
+    for file in ['api_keys_sports.json', 'api_keys_bookmakers.json',
+                 'api_keys_core_markets.json']:
+        shutil.copy(os.path.join('src', file), os.path.join(workspace, 'src'))
+    for folder in ['games', 'teams', 'players/gamelogs', 'odds/core',
+                   'odds/player_props']:
+        os.makedirs(os.path.join(workspace, 'data', sport, folder))
+    shutil.copy(f'data/{sport}/odds/api_keys_player_prop_markets.json',
+                os.path.join(workspace, 'data', sport, 'odds'))
+    return workspace
+
+def run_benchmark(base_url: str, date_str: str, rate_limit: int=None,
+                  before_step=None):
+    """
+    Run refresh_data (full, then delta), refresh_core_lines and
+    refresh_player_prop_lines against the API server at base_url, in a
+    temporary workspace. Return dict with seconds, requests, retries,
+    failures and credits for each step.\n
+    before_step = function called with each step name before it runs
+    """
+
+    from analysis_application import AnalysisApplication
+
+    nba_kwargs = {'base_url': base_url, 'key': 'stub'}
+    if rate_limit is not None:
+        nba_kwargs['rate_limit'] = rate_limit
+    get_data.set_api_overrides(api.NBAStatsAPIClient, **nba_kwargs)
+    get_data.set_api_overrides(api.OddsAPIClient, base_url=base_url,
+                               key='stub')
+
+    app = AnalysisApplication()
+    app.sport = 'nba'
+    steps = [('refresh_data (full)', app.refresh_data, []),
+             ('refresh_data (delta)', app.refresh_data, []),
+             ('refresh_core_lines', app.refresh_core_lines, [date_str]),
+             ('refresh_player_prop_lines', app.refresh_player_prop_lines,
+              [date_str])]
+
+    cwd = os.getcwd()
+    workspace = make_workspace(app.sport)
+    os.chdir(workspace)
+    results = {}
+    try:
+        for name, func, args in steps:
+            # Fresh clients per step, so no response is served from cache
+            shutil.rmtree('data/cache', ignore_errors=True)
+            get_data.api_clients.clear()
+            if before_step is not None:
+                before_step(name)
+            start = time.perf_counter()
+            func(*args)
+            seconds = time.perf_counter() - start
+            summary = {'requests': 0, 'retries': 0, 'failures': 0,
+                       'credits': 0}
+            for client in get_data.api_clients.values():
+                client_summary = client.get_metrics_summary()
+                for key in summary:
+                    summary[key] += client_summary.get(key, 0)
+            results[name] = {'seconds': seconds, **summary,
+                             'requests_per_sec': summary['requests'] / seconds}
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(workspace)
+        get_data.set_api_overrides(api.NBAStatsAPIClient)
+        get_data.set_api_overrides(api.OddsAPIClient)
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Benchmark data refreshes '
+                                     'against a local stand-in API server.')
+    parser.add_argument('--fixtures', help='replay recorded fixtures from '
+                        'this folder (default synthetic league)')
+    parser.add_argument('--record', help='record live API responses to this '
+                        'folder instead of benchmarking')
+    parser.add_argument('--date', default='2024-03-25')
+    parser.add_argument('--latency', type=float, default=0.2)
+    parser.add_argument('--error-rate', type=float, default=0)
+    parser.add_argument('--rate-limit', type=int, default=600,
+                        help='client requests per minute for API-NBA')
+    parser.add_argument('--output', help='save results as JSON to this file')
+    args = parser.parse_args()
+
+    if args.record:
+        get_data.set_recorder(ResponseRecorder(args.record))
+        from analysis_application import AnalysisApplication
+        app = AnalysisApplication()
+        app.sport = 'nba'
+        app.refresh_data()
+        app.refresh_core_lines(args.date)
+        app.refresh_player_prop_lines(args.date)
+        sys.exit()
+
+    if args.fixtures:
+        league = ReplayLeague(args.fixtures)
+    else:
+        league = StubRouter(StubNBALeague(), StubOddsLeague())
+
+    def finish_games(name):
+        """Synthetic league plays its last night of games before the delta."""
+
+        for game in league.leagues[0].games[2023][-15:]:
+            finished = name == 'refresh_data (delta)'
+            game['status']['long'] = 'Finished' if finished else 'Scheduled'
+
+    with StubAPIServer(league=league, latency=args.latency,
+                       error_rate=args.error_rate) as server:
+        results = run_benchmark(server.url, args.date, args.rate_limit,
+                                None if args.fixtures else finish_games)
+
+    for name, result in results.items():
+        print(f'{name:28} {result["seconds"]:7.2f}s '
+              f'{result["requests"]:4} requests '
+              f'{result["requests_per_sec"]:6.1f}/s '
+              f'{result["retries"]:3} retries {result["credits"]:g} credits')
+    if args.output:
+        output_handler = FileHandler(os.path.basename(args.output),
+                                     os.path.dirname(args.output))
+        output_handler.write_file(results)
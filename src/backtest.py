@@ -0,0 +1,202 @@
+import os
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta
+import pandas as pd
+
+from data_analysis import NBADataAnalysis
+from nba_objects import NBAPlayer
+from file_handler import FileHandler
+
+
+# Analysis object shared with forked worker processes. Each worker gets a
+# copy-on-write view of the parent's objects, so no data is copied per date.
+_analysis = None
+
+
+class NBABacktest:
+    def __init__(self, analysis: NBADataAnalysis):
+        self.analysis = analysis
+        self.columns = ['date', 'market', 'first_name', 'last_name', 'team',
+                        'line', 's_pl_all', 's_pl_loc', 's_pl_opp',
+                        's_def_all', 's_def_pos', 'total', 'actual', 'result']
+
+    def run(self, start_date: str, end_date: str, markets: list,
+            n_workers: int=None):
+        """
+        Replay player prop analysis for every date from start_date to end_date
+        (inclusive) and join each row to the actual outcome. Return Pandas
+        DataFrame with one row per player prop.\n
+        start_date and end_date should be in form 'yyyy-mm-dd'\n
+        markets = list of market dicts from api_keys_player_prop_markets.json\n
+        n_workers = number of processes (default os.cpu_count())
+        """
+
+        global _analysis
+
+        start = datetime.strptime(start_date, '%Y-%m-%d')
+        end = datetime.strptime(end_date, '%Y-%m-%d')
+        dates = []
+        while start <= end:
+            dates.append(start)
+            start += timedelta(days=1)
+
+        # Workers are forked so they share the already built objects. Where
+        # fork isn't available, replay dates one at a time.
+        _analysis = self.analysis
+        rows = []
+        if 'fork' in multiprocessing.get_all_start_methods() and n_workers != 1:
+            context = multiprocessing.get_context('fork')
+            with ProcessPoolExecutor(max_workers=n_workers,
+                                     mp_context=context) as executor:
+                for date_rows in executor.map(_replay_date, dates,
+                                              [markets] * len(dates)):
+                    rows += date_rows
+        else:
+            for date_obj in dates:
+                rows += _replay_date(date_obj, markets)
+        _analysis.set_point_in_time()
+        _analysis = None
+
+        return pd.DataFrame(rows, columns=self.columns)
+
+    def results_to_csv(self, results: pd.DataFrame, start_date: str,
+                       end_date: str):
+        """Save backtest results as csv in data/nba/backtests."""
+
+        file_path = 'data/nba/backtests'
+        os.makedirs(file_path, exist_ok=True)
+        csv_handler = FileHandler(f'backtest_{start_date}_{end_date}.csv',
+                                  file_path)
+        csv_handler.write_file(results)
+
+
+def _replay_date(date_obj: datetime, markets: list):
+    """
+    Set analysis to the point in time before the first tip-off on date_obj,
+    score every market, and return list of rows with actual outcomes.
+    """
+
+    analysis = _analysis
+    games = analysis.get_game_objects(date_obj)
+    if len(games) == 0:
+        return []
+
+    # Games are all on the same day, and no team plays twice in a day, so
+    # first tip-off works as the cutoff for the whole slate
+    tip_off = min(game.datetime for game in games)
+    analysis.set_point_in_time(tip_off)
+    # Season, rosters and injuries are put back when the date is done, so
+    # nothing leaks into later dates or the caller's analysis
+    season = analysis.season
+    analysis.season = games[0].season
+    rosters = {team: team.players for team in analysis.teams}
+    player_teams = {player: player.team for player in analysis.players}
+    injuries = {player: player.injury_status for player in analysis.players}
+    try:
+        _set_rosters_before(analysis)
+        # Injury report is only known for today, don't leak it into past dates
+        for player in analysis.players:
+            player.injury_status = None
+        return _score_markets(analysis, date_obj, games, markets)
+    finally:
+        analysis.season = season
+        for team, players in rosters.items():
+            team.players = players
+        for player, team in player_teams.items():
+            player.team = team
+        for player, injury_status in injuries.items():
+            player.injury_status = injury_status
+
+def _set_rosters_before(analysis: NBADataAnalysis):
+    """
+    Set each team's players, and each player's team, to the rosters at the
+    point-in-time cutoff: the team of the player's last gamelog before it.
+    Players traded in later aren't on the slate, players who left are.
+    """
+
+    teams = {team.id: team for team in analysis.teams}
+    for team in analysis.teams:
+        team.players = []
+    for player in analysis.players:
+        gamelog = player.gamelog[:player.gamelog_end]
+        player.team = None
+        if len(gamelog) == 0 or gamelog[-1].team_id not in teams:
+            continue
+        player.team = teams[gamelog[-1].team_id]
+        player.team.players.append(player)
+
+    # Sort by min/game like NBADataAnalysis, over games before the cutoff
+    def sort_by_minutes_played(player):
+        mins = [game.minutes for game in 
+                player.gamelog[:player.gamelog_end][-25:]]
+        return sum(mins) / len(mins)
+
+    for team in analysis.teams:
+        team.players.sort(key=sort_by_minutes_played, reverse=True)
+
+def _score_markets(analysis: NBADataAnalysis, date_obj: datetime, 
+                   games: list, markets: list):
+    """Score every market for date_obj, return rows with actual outcomes."""
+
+    rows = []
+    date_str = date_obj.strftime('%Y-%m-%d')
+    # Table rows name the player and their point-in-time team, which is
+    # unique on the slate
+    slate_players = {}
+    for game in games:
+        for team in [game.away.team, game.home.team]:
+            for player in team.players:
+                slate_players[(player.first_name, player.last_name,
+                               team.code)] = player
+    for market in markets:
+        try:
+            table = analysis.create_player_prop_tables(date_obj, market)
+        # Exception if a team has no games yet this season
+        except ZeroDivisionError:
+            print(f'Skipping {date_str} {market["key"]}, not enough games.')
+            continue
+        for i in range(len(table)):
+            row = table.iloc[i]
+            first, last, code = row.iloc[0], row.iloc[1], row.iloc[2]
+            # Consensus line is the second item in prop info
+            line = row.iloc[39]
+            actual = _get_actual_stat(slate_players.get((first, last, code)),
+                                      games, market['str_to_stat'])
+            if actual is None:
+                result = None
+            elif actual > line:
+                result = 'Over'
+            elif actual < line:
+                result = 'Under'
+            else:
+                result = 'Push'
+            rows.append([date_str, market['key'], first, last, code, line]
+                        + list(row.iloc[-6:]) + [actual, result])
+    return rows
+
+def _get_actual_stat(player: NBAPlayer, games: list, stat: str):
+    """
+    Return player's stat value from their gamelog of any of games, or None
+    if the player didn't play. Matched by game ID, not roster, so a player
+    traded since their last game is still found.
+    """
+
+    if player is None:
+        return None
+    game_ids = {game.id for game in games}
+    # Full gamelog, the point-in-time cutoff hides these games
+    for gamelog in reversed(player.gamelog):
+        if gamelog.game_id in game_ids:
+            return gamelog.string_to_stat(stat)
+    return None
+
+
+if __name__ == "__main__":
+    analysis = NBADataAnalysis()
+    markets_handler = FileHandler('api_keys_player_prop_markets.json',
+                                  'data/nba/odds')
+    markets = markets_handler.load_file()
+    backtest = NBABacktest(analysis)
+    results = backtest.run('2024-03-20', '2024-03-25', markets[:4])
+    print(results)
@@ -6,23 +6,51 @@
 
 import os
 import json
-import timeit
+from bisect import bisect_left
 import pandas as pd
 import numpy as np
 from datetime import datetime
 import get_data
 pd.set_option('display.max_columns', None)
+# pyarrow is only needed for the parquet/arrow table output
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    import pyarrow.feather as feather
+except ImportError:
+    pa = None
 
 from nba_objects import NBAGame, NBATeam, NBAPlayer, NBAPlayerGamelog, NBAPlayerProp
 from file_handler import FileHandler
+from similarity import NBAPlayerIndex
+from database import NBADatabase
+from name_index import NBANameIndex
+import gamelog_schema
+import nba_schema
+import prop_scoring
+from profiling import timed, phase, checkpoint
 
 
 class NBADataAnalysis:
-    def __init__(self):
+    @timed
+    def __init__(self, backend: str='json', seasons: list=None,
+                 save_aliases: bool=False):
+        """
+        backend = 'json' (default) loads the json data files, 'sqlite' loads
+        from NBADatabase with filters run in SQL\n
+        seasons = list of seasons to load games and gamelogs for (default all)\n
+        save_aliases = if True, add fuzzy name matches to the hand edited 
+        alt_player_names.json (default False, ex.) backtests and benchmarks)
+        """
+
         self.games = []
         self.teams = []
         self.players = []
         self.season = get_data.get_seasons('nba')[-1]
+        self.seasons = seasons
+        self.db = NBADatabase() if backend == 'sqlite' else None
+        self.season_games = {} # Season -> games dict from json
+        self.player_index = None # NBAPlayerIndex, built on first use
         
         self.__init_games()
         self.__init_teams()
@@ -31,31 +59,62 @@ class NBADataAnalysis:
         self.__connect_games_and_teams()
         self.__sort_player_gamelogs()
         self.__connect_players_and_teams()
+        with phase('NBANameIndex'):
+            self.name_index = NBANameIndex(self.players)
         self.__connect_props_and_players()
         self.__connect_injuries_and_players()
+        # Fuzzy matches found while connecting match exactly on the next run
+        if save_aliases:
+            with phase('NBANameIndex.save_aliases'):
+                self.name_index.save_aliases()
         self.__set_player_position()
 
+    @timed(checkpoint=True)
     def __init_games(self):
+        if self.db is not None:
+            games = self.db.load_games(self.seasons)
+            for key in games:
+                self.games.append(NBAGame(key, games[key]))
+            return
+
         file_path = 'data/nba/games'
-        game_files = sorted(os.listdir(file_path))
+        game_files = self.__filter_season_files(sorted(os.listdir(file_path)))
         for file in game_files:
             game_handler = FileHandler(file, file_path)
-            games = game_handler.load_file()
+            games = nba_schema.type_games(game_handler.load_file())
+            # Kept to join game details into normalised gamelogs
+            self.season_games[int(file.split('_')[0])] = games
             for key in games:
                 self.games.append(NBAGame(key, games[key]))
-        self.games.sort(key=lambda game: game.datetime)
+        self.games.sort(key=lambda game: game.timestamp)
+
+    def __filter_season_files(self, files: list):
+        """Keep files named {season}_... for seasons, if seasons are set."""
+
+        if self.seasons is None:
+            return files
+        return [file for file in files 
+                if int(file.split('_')[0]) in self.seasons]
 
+    @timed(checkpoint=True)
     def __init_teams(self):
-        team_handler = FileHandler('nba_teams.json', 
-                                   'data/nba/teams')
-        teams = team_handler.load_file()
+        if self.db is not None:
+            teams = self.db.load_teams()
+        else:
+            team_handler = FileHandler('nba_teams.json', 
+                                       'data/nba/teams')
+            teams = team_handler.load_file()
         for team in teams:
             self.teams.append(NBATeam(team))
 
+    @timed(checkpoint=True)
     def __init_players(self):
-        player_handler = FileHandler('nba_players.json', 
-                                     'data/nba/players')
-        players = player_handler.load_file()
+        if self.db is not None:
+            players = self.db.load_players()
+        else:
+            player_handler = FileHandler('nba_players.json', 
+                                         'data/nba/players')
+            players = player_handler.load_file()
         alt_name_handler = FileHandler('alt_player_names.json', 
                                        'data/nba/players')
         alt_names = alt_name_handler.load_file()
@@ -69,32 +128,48 @@ class NBADataAnalysis:
             self.players.append(player)
 
     def __get_player_gamelogs(self):
+        if self.db is not None:
+            return [NBAPlayerGamelog(gamelog) for gamelog in 
+                    self.db.load_player_gamelogs(self.seasons)]
+
         file_path = 'data/nba/players/gamelogs'
-        gamelog_files = sorted(os.listdir(file_path))
+        gamelog_files = self.__filter_season_files(
+            sorted(os.listdir(file_path)))
         player_gamelogs = []
         for file in gamelog_files:
-            gamelog_handler = FileHandler(file, file_path)
-            gamelogs = gamelog_handler.load_file()
+            season = int(file.split('_')[0])
+            # Other game details come from gamelog.game
+            gamelogs = gamelog_schema.load_gamelogs(
+                file, file_path, self.season_games[season], fields=['loc'])
             for gamelog in gamelogs:
                 player_gamelogs.append(NBAPlayerGamelog(gamelog))
         return player_gamelogs
 
     def __get_player_props(self):
-        file_path = 'data/nba/odds/player_props'
-        prop_files = sorted(os.listdir(file_path))
+        # Latest snapshot from odds history, json files from before the store
+        # are used if no odds have been saved to it yet
+        if self.db is not None:
+            props = self.db.load_props(group='player_props')
+        else:
+            props = get_data.get_odds_store('nba').latest(group='player_props')
+        if len(props) == 0:
+            file_path = 'data/nba/odds/player_props'
+            for file in sorted(os.listdir(file_path)):
+                prop_handler = FileHandler(file, file_path)
+                props += nba_schema.type_props(prop_handler.load_file())
         player_props = []
-        for file in prop_files:
-            prop_handler = FileHandler(file, file_path)
-            props = prop_handler.load_file()
-            for prop in props:
-                player_props.append(NBAPlayerProp(prop))
+        for prop in props:
+            player_props.append(NBAPlayerProp(prop))
         return player_props
     
     def __get_player_injuries(self):
+        if self.db is not None:
+            return self.db.load_injuries()
         injuries_handler = FileHandler('nba_player_injuries.json', 
                                        'data/nba/players')
         return injuries_handler.load_file()
 
+    @timed(checkpoint=True)
     def __connect_gamelogs_with_games_and_players(self):
         player_gamelogs = self.__get_player_gamelogs()
         for gamelog in player_gamelogs:
@@ -114,10 +189,12 @@ class NBADataAnalysis:
                     break
         del player_gamelogs
 
+    @timed(checkpoint=True)
     def __sort_player_gamelogs(self):
         for player in self.players:
-            player.gamelog.sort(key=lambda gamelog: gamelog.game.datetime)
+            player.gamelog.sort(key=lambda gamelog: gamelog.game.timestamp)
 
+    @timed(checkpoint=True)
     def __connect_games_and_teams(self):
         for team in self.teams:
             for game in self.games:
@@ -137,6 +214,7 @@ class NBADataAnalysis:
                         else:
                             team.scheduled_games.append(game)
 
+    @timed(checkpoint=True)
     def __connect_players_and_teams(self):
         # Take last team_id in player's gamelog, make that their team
         # If a player switches teams, team won't update until a game is logged
@@ -161,38 +239,24 @@ class NBADataAnalysis:
         for team in self.teams:
             team.players.sort(key=sort_by_minutes_played, reverse=True)
 
+    @timed(checkpoint=True)
     def __connect_props_and_players(self):
-        props = self.__get_player_props()
-        for player in self.players:
-            for i in range(len(props) - 1, -1, -1):
-                name = props[i].player_name
-                if name == player.full_name or name in player.alt_names:
-                    player.props.append(props.pop(i))
-        # Temp while I figure out names that need added to alt_player_names.json
-        unmatched_names = []
-        for prop in props:
-            if prop.player_name not in unmatched_names:
-                unmatched_names.append(prop.player_name)
-        print('Player prop unmatched names:')
-        print(unmatched_names)
-
+        # Unmatched names are kept in self.name_index.get_unmatched('props')
+        # Reversed, so each player's props keep the order of the old list scan
+        for prop in reversed(self.__get_player_props()):
+            player = self.name_index.resolve(prop.player_name, 'props')
+            if player is not None:
+                player.props.append(prop)
+
+    @timed(checkpoint=True)
     def __connect_injuries_and_players(self):
-        injuries = self.__get_player_injuries()
-        for player in self.players:
-            for injury in injuries:
-                name = injury['name']
-                if name == player.full_name or name in player.alt_names:
-                    player.injury_status = injury
-                    injuries.remove(injury)
-                    break
-        # Temp while I figure out names that need added to alt_player_names.json
-        unmatched_names = []
-        for injury in injuries:
-            if injury['name'] not in unmatched_names:
-                unmatched_names.append(injury['name'])
-        print('Injuries unmatched names:')
-        print(unmatched_names)
+        # A player keeps their first injury, later ones are ignored
+        for injury in self.__get_player_injuries():
+            player = self.name_index.resolve(injury['name'], 'injuries')
+            if player is not None and player.injury_status is None:
+                player.injury_status = injury
 
+    @timed(checkpoint=True)
     def __set_player_position(self):
         for player in self.players:
             for game in player.gamelog:
@@ -206,17 +270,135 @@ class NBADataAnalysis:
             except IndexError:
                 continue
 
-    def create_player_prop_tables(self, date_obj: datetime, prop_dict: dict):
+    def query_player_gamelogs(self, seasons: list=None, player: NBAPlayer=None,
+                              opp: NBATeam=None, loc: str=None):
+        """
+        Return DataFrame of gamelogs filtered by seasons, player, opponent and
+        location ('home' or 'away'). With the sqlite backend filters run in
+        SQL, so only matching rows are read. Both backends return columns 
+        gamelog_schema.QUERY_COLUMNS, in the same row order.
+        """
+
+        player_id = None if player is None else player.id
+        opp_id = None if opp is None else opp.id
+        if self.db is not None:
+            return self.db.query_player_gamelogs(
+                seasons=seasons, player_id=player_id, opp_id=opp_id, loc=loc)
+
+        # Stat attributes of NBAPlayerGamelog match their column names
+        columns = gamelog_schema.QUERY_COLUMNS
+        stat_columns = columns[columns.index('points'):]
+        rows = []
+        players = self.players if player is None else [player]
+        for gamelog in [log for p in players for log in p.gamelog]:
+            game = gamelog.game
+            if gamelog.loc == 'home':
+                game_team, game_opp = game.home, game.away
+            else:
+                game_team, game_opp = game.away, game.home
+            if ((seasons is None or game.season in seasons) and
+                    (opp_id is None or game_opp.id == opp_id) and
+                    (loc is None or gamelog.loc == loc)):
+                rows.append({
+                    'game_id': gamelog.game_id, 'season': game.season,
+                    'datetime': game.iso_datetime, 'date': game.date,
+                    'time': game.time, 'loc': gamelog.loc,
+                    'team_id': gamelog.team_id, 'team_code': game_team.code,
+                    'team_score': game_team.points, 'opp_id': game_opp.id,
+                    'opp_code': game_opp.code, 'opp_score': game_opp.points,
+                    'playoffs': game.playoffs, 
+                    'player_id': gamelog.player_id,
+                    'firstname': gamelog.first_name,
+                    'lastname': gamelog.last_name, 'pos': gamelog.position,
+                    'min': gamelog.minutes,
+                    **{col: getattr(gamelog, col) for col in stat_columns}
+                })
+        # Same order as the sqlite backend
+        rows.sort(key=lambda row: (row['season'], row['team_id'], 
+                                   row['datetime'], row['player_id']))
+        return pd.DataFrame(rows, columns=columns)
+
+    def get_player_index(self, refresh: bool=True):
+        """
+        Return NBAPlayerIndex for all players, built on first use.\n
+        refresh = if True (default), first update rows of players whose 
+        gamelogs changed since the last refresh
+        """
+
+        if self.player_index is None:
+            self.player_index = NBAPlayerIndex(self.players)
+        elif refresh:
+            self.player_index.refresh()
+        return self.player_index
+
+    def get_similar_players_vs(self, player: NBAPlayer, opp: NBATeam, 
+                               stat: str, k: int=5, n_games: int=3):
+        """
+        Return list of (NBAPlayer, stat list) tuples for the k players most 
+        similar to player that have played against opp, with their last 
+        n_games stats vs opp.
+        """
+
+        candidates = []
+        for pl in self.players:
+            if pl != player and pl.get_no_of_gp(opps=[opp.id]) > 0:
+                candidates.append(pl.id)
+        similar_ids = self.get_player_index().nearest(player.id, k, candidates)
+
+        players = {pl.id: pl for pl in self.players}
+        similar = []
+        for pl_id in similar_ids:
+            stats = players[pl_id].get_stats([stat], opps=[opp.id], 
+                                             n_games=n_games)
+            similar.append((players[pl_id], stats))
+        return similar
+
+    def set_point_in_time(self, dt: datetime=None):
+        """
+        Limit player gamelogs, team games and player props to what was known
+        strictly before dt, without copying any data. Call with no argument 
+        to clear the cutoff.\n
+        dt must be timezone aware, matching NBAGame.datetime
+        """
+
+        for player in self.players:
+            if dt is None:
+                player.gamelog_end = None
+            else:
+                player.gamelog_end = bisect_left(
+                    player.gamelog, dt.timestamp(), 
+                    key=lambda log: log.game.timestamp)
+            player.point_in_time = dt
+        for team in self.teams:
+            if dt is None:
+                team.finished_games_end = None
+            else:
+                team.finished_games_end = bisect_left(
+                    team.finished_games, dt.timestamp(), 
+                    key=lambda game: game.timestamp)
+
+    @timed
+    def create_player_prop_tables(self, date_obj: datetime, prop_dict: dict,
+                                  batch_scoring: bool=True, 
+                                  similar_by_index: bool=False):
         """
         Gather info for player prop analysis table and return in Pandas 
-        DataFrame.
+        DataFrame.\n
+        batch_scoring = if True (default), score all props on the slate at 
+        once with prop_scoring, otherwise score one player at a time\n
+        similar_by_index = if True, pick injured teammates for the without 
+        player blocks with NBAPlayerIndex instead of by position (default)
         """
 
         # Need defensive performance data for all teams vs stat
         def_ranks = self.__get_def_ranks_vs_stats(prop_dict['str_to_stat'])
+        # Index is refreshed once here, not for every prop
+        if similar_by_index:
+            self.get_player_index()
 
         # Get games for given datetime object
         info = []
+        perf_inputs = []
         games = self.__get_game_objects(date_obj)
         for game in games:
             # These dicts are used for all props within this game
@@ -243,7 +425,8 @@ class NBADataAnalysis:
                         prop_info['line'],
                         matchup_info[team.id]['raw']['loc'],
                         opp_obj,
-                        inj_info['player_objs'][team.id]
+                        inj_info['player_objs'][team.id],
+                        similar_by_index
                     )
                     def_perf = self.__get_def_vs_prop_performance_info(
                         player,
@@ -251,6 +434,21 @@ class NBADataAnalysis:
                         def_ranks,
                         recent_players_vs
                     )
+                    row = (pl_info + matchup_info[team.id]['display'] 
+                           + inj_info['display'] + prop_info['display'] 
+                           + pl_perf + def_perf)
+                    if batch_scoring:
+                        perf_inputs.append(self.__get_performance_inputs(
+                            player,
+                            opp_obj,
+                            prop_dict['str_to_stat'],
+                            prop_info['line'],
+                            matchup_info[team.id]['raw']['loc'],
+                            def_ranks
+                        ))
+                        info.append(row)
+                        continue
+
                     perf_analysis = self.__get_performance_analysis_info(
                         player,
                         opp_obj,
@@ -262,16 +460,23 @@ class NBADataAnalysis:
                     # Will be None if gp threshold is not met
                     if perf_analysis is None:
                         continue
-                    
-                    row = (pl_info + matchup_info[team.id]['display'] 
-                           + inj_info['display'] + prop_info['display'] 
-                           + pl_perf + def_perf + perf_analysis)
-                    info.append(row)
+                    info.append(row + perf_analysis)
+
+        # Score all props at once and add performance analysis to rows
+        if batch_scoring and len(info) > 0:
+            perf_analysis = self.__score_performance_inputs(perf_inputs)
+            for row, scores in zip(info, perf_analysis):
+                row += scores
 
         # Build table and sort by total of prop analysis values
         table = pd.DataFrame(info)
+        if len(info) == 0:
+            checkpoint(f'table {prop_dict["key"]} {date_obj:%Y-%m-%d}')
+            return table
         table = table.sort_values(table.columns[423], ascending=False)
-        return table.reset_index(drop=True)
+        table = table.reset_index(drop=True)
+        checkpoint(f'table {prop_dict["key"]} {date_obj:%Y-%m-%d}')
+        return table
                     
     def create_alt_player_prop_tables(self):
         pass
@@ -295,6 +500,101 @@ class NBADataAnalysis:
 
         writer.close()
 
+    def tables_to_parquet(self, date_obj: datetime, tables: list, 
+                          file_format: str='parquet', compression: str='zstd'):
+        """
+        Given a datetime object and a list of Pandas Dataframes, write each 
+        table, along with a long-format version of its scores, to files 
+        partitioned by date and market. Tables in list must be tuples with 
+        format (pd, market_key).\n
+        file_format = 'parquet' or 'arrow' (Arrow IPC)\n
+        Files are written to data/nba/tables/{props, scores}/date=yyyy-mm-dd/
+        market={market_key}/
+        """
+
+        if pa is None:
+            print('pyarrow is required to write parquet/arrow tables.')
+            return
+        
+        date_str = date_obj.strftime('%Y-%m-%d')
+        for table, market_key in tables:
+            partition = os.path.join(f'date={date_str}', f'market={market_key}')
+            props = self.__type_table_columns(table)
+            scores = self.__get_long_format_scores(table)
+            for name, data in [('props', props), ('scores', scores)]:
+                path = os.path.join('data/nba/tables', name, partition)
+                os.makedirs(path, exist_ok=True)
+                arrow_table = pa.Table.from_pandas(data, preserve_index=False)
+                if file_format == 'parquet':
+                    pq.write_table(arrow_table, 
+                                   os.path.join(path, 'part-0.parquet'),
+                                   compression=compression)
+                elif file_format == 'arrow':
+                    feather.write_feather(arrow_table, 
+                                          os.path.join(path, 'part-0.arrow'),
+                                          compression=compression)
+                else:
+                    print(f'File format {file_format} not supported.')
+                    return
+
+    def __type_table_columns(self, table: pd):
+        """
+        Return copy of analysis table with string column names and a single
+        type per column. Columns holding only numbers become float, columns 
+        holding anything else become str, so the table can be stored as typed
+        columns.
+        """
+
+        typed = {}
+        for col in table.columns:
+            values = table[col]
+            non_null = values.dropna()
+            if all(isinstance(v, (int, float, np.number)) 
+                   and not isinstance(v, bool) for v in non_null):
+                typed[f'c{col}'] = pd.to_numeric(values).astype('float64')
+            else:
+                typed[f'c{col}'] = values.map(lambda v: None if v is None 
+                                              else str(v)).astype('string')
+        return pd.DataFrame(typed)
+
+    def __get_long_format_scores(self, table: pd):
+        """
+        Return DataFrame with one row per player and score component, taken 
+        from the last six columns of an analysis table.
+        """
+
+        components = ['pl_all', 'pl_loc', 'pl_opp', 'def_all', 'def_pos', 
+                      'total']
+        rows = []
+        for i in range(len(table)):
+            row = table.iloc[i]
+            for component, value in zip(components, row.iloc[-6:]):
+                rows.append({
+                    'first_name': row.iloc[0],
+                    'last_name': row.iloc[1],
+                    'team': row.iloc[2],
+                    # Consensus line is the second item in prop info
+                    'line': float(row.iloc[39]),
+                    'component': component,
+                    'score': None if pd.isna(value) else float(value)
+                })
+        scores = pd.DataFrame(rows, columns=['first_name', 'last_name', 'team',
+                                             'line', 'component', 'score'])
+        return scores.astype({'first_name': 'string', 'last_name': 'string',
+                              'team': 'string', 'line': 'float64', 
+                              'component': 'category', 'score': 'float64'})
+
+    def get_game_objects(self, date_obj: datetime):
+        """Given datetime object, return game objects for that day"""
+
+        return self.__get_game_objects(date_obj)
+
+    def get_def_ranks_vs_stats(self, stat: str):
+        """Given str_to_stat, return dict with defensive ranks."""
+
+        return self.__get_def_ranks_vs_stats(stat)
+
+    @timed
     def __get_game_objects(self, date_obj: datetime):
         """Given datetime object, return game objects for that day"""
 
@@ -307,6 +607,7 @@ class NBADataAnalysis:
                 break
         return games
 
+    @timed
     def __get_def_ranks_vs_stats(self, stat: str):
         """Given str_to_stat, return dict with defensive ranks."""
 
@@ -378,6 +679,7 @@ class NBADataAnalysis:
         table.insert(0, 'Rank', ranks)
         return table
     
+    @timed
     def __get_matchup_info(self, game: NBAGame):
         """Given game object, return dict with matchup info"""
 
@@ -402,6 +704,7 @@ class NBADataAnalysis:
             }
         }
 
+    @timed
     def __get_injury_info(self, game: NBAGame):
         """Given NBA Game obj, return dict with injury info."""
         
@@ -440,6 +743,7 @@ class NBADataAnalysis:
             'player_objs': player_objs
         }
     
+    @timed
     def __get_recent_player_stats_vs(self, opp: NBATeam, stat: str):
         """
         Return dict, where the player's pos points to recent related player
@@ -485,6 +789,7 @@ class NBADataAnalysis:
 
         return recent_pl_vs
     
+    @timed
     def __get_player_info(self, player: NBAPlayer):
         """
         Given NBAPlayer obj, return list with basic player info for analysis 
@@ -499,6 +804,7 @@ class NBADataAnalysis:
         att = player.position + ' ● ' + player.team.code + ' ● #' + jersey
         return [player.first_name, player.last_name, player.team.code, att]
 
+    @timed
     def __get_player_prop_info(self, props: list):
         """
         Given list of NBAProp objects, return list with player prop info for 
@@ -542,9 +848,11 @@ class NBADataAnalysis:
             'line': consensus
         }
 
+    @timed
     def __get_player_prop_performance_info(self, player: NBAPlayer, stat: str, 
                                            line: float, loc: str, opp: NBATeam, 
-                                           inj: list):
+                                           inj: list, 
+                                           similar_by_index: bool=False):
         """
         Return list with player performance info for analysis tables.\n
         Includes overall, home/away, vs {opp}, w/o player 1, w/o player 2
@@ -581,7 +889,8 @@ class NBADataAnalysis:
                                            n_games=len_graph_opp)
 
         # Get stats for without blocks
-        wo_players = self.__find_similar_players(player, inj, 2)
+        wo_players = self.__find_similar_players(player, inj, 2, 
+                                                 similar_by_index)
         wo_blocks = []
         for pl in wo_players:
             wo_blocks.append(f'w/o  {pl.first_name[0]}. {pl.last_name}')
@@ -594,6 +903,7 @@ class NBADataAnalysis:
         return avg_all + graph_all + avg_loc + graph_loc + avg_opp + \
             graph_opp + wo_blocks
     
+    @timed
     def __get_def_vs_prop_performance_info(self, player: NBAPlayer, 
                                            opp: NBATeam, def_ranks: dict,
                                            recent_pl_vs: list):
@@ -634,6 +944,7 @@ class NBADataAnalysis:
         
         return def_vs_blocks + recent_vs_blocks
 
+    @timed
     def __get_performance_analysis_info(self, player: NBAPlayer, opp: NBATeam, 
                                         stat: str, line: float, loc: str, 
                                         def_ranks: dict):
@@ -692,6 +1003,77 @@ class NBADataAnalysis:
         return scores + [total]
 
 
+    @timed
+    def __get_performance_inputs(self, player: NBAPlayer, opp: NBATeam, 
+                                 stat: str, line: float, loc: str, 
+                                 def_ranks: dict):
+        """
+        Return dict with the values prop_scoring needs to score one prop. 
+        Same inputs as __get_performance_analysis_info.
+        """
+
+        inputs = {
+            'lines': line,
+            'gp': [],
+            'spl_4': [],
+            'avgs': [],
+            'cover_counts': [],
+            'cover_lens': [],
+            'def_ranks': [],
+            'def_gp_season': opp.get_no_of_gp(seasons=[self.season])
+        }
+
+        # Player performance for all, loc and opp, in prop_scoring order
+        for p_loc, p_opp in [('all', []), (loc, []), ('all', [opp.id])]:
+            gp = player.get_no_of_gp(loc=p_loc, opps=p_opp)
+            if len(p_opp) == 0:
+                spl_4 = player.get_no_of_gp(seasons=[self.season], loc=p_loc)
+            else:
+                spl_4 = gp
+            splits = prop_scoring.get_player_splits(gp, spl_4)
+            log = player.get_stats([stat], loc=p_loc, opps=p_opp)
+
+            avgs, counts, lens = [], [], []
+            for split in splits:
+                if len(log) >= split and split != 0:
+                    avgs.append(round(sum(log[-split:]) / split, 2))
+                else:
+                    avgs.append(np.nan)
+                split_log = log[-split:]
+                counts.append(sum(1 for s in split_log if s > line))
+                lens.append(len(split_log))
+            # gp threshold not met, scores will be NaN
+            if len(splits) == 0:
+                avgs, counts, lens = [np.nan]*4, [0]*4, [0]*4
+
+            inputs['gp'].append(gp)
+            inputs['spl_4'].append(spl_4)
+            inputs['avgs'].append(avgs)
+            inputs['cover_counts'].append(counts)
+            inputs['cover_lens'].append(lens)
+
+        # Defense ranks vs all and vs player's position
+        for pos in ['all', player.base_position]:
+            inputs['def_ranks'].append(
+                [split['rank'] for split in def_ranks[opp.id][pos].values()])
+
+        return inputs
+
+    @timed
+    def __score_performance_inputs(self, perf_inputs: list):
+        """
+        Given list of dicts from __get_performance_inputs, return list of 
+        performance analysis lists in the same format as 
+        __get_performance_analysis_info.
+        """
+
+        arrays = {}
+        for key in perf_inputs[0]:
+            arrays[key] = np.array([inputs[key] for inputs in perf_inputs], 
+                                   dtype=float)
+        scores, totals = prop_scoring.score_player_props(**arrays)
+        return prop_scoring.format_scores(scores, totals)
+
     def __analyze_player_prop_performance(self, player: NBAPlayer, stat: str,
                                           line: float, seasons=[], loc='all', 
                                           opp=[]):
@@ -719,7 +1101,11 @@ class NBADataAnalysis:
         avgs = self.__get_player_averages(player, stat, m['splits']['avl'],
                                           loc=loc, opps=opp)
         m_avl = []
-        for avg in avgs:
+        for avg, w in zip(avgs, m['weights']['avl']):
+            # Split 4 is zero with no games this season, it has no weight
+            if avg is None and w == 0:
+                m_avl.append(0)
+                continue
             m_avl.append(self.__calculate_avg_vs_line_metric(avg, line))
 
         # Calculate log vs line metrics
@@ -951,12 +1337,21 @@ class NBADataAnalysis:
         return lst
     
     def __find_similar_players(self, main_player: NBAPlayer, player_list: list, 
-                               n: int):
+                               n: int, by_index: bool=False):
         """
         Return n NBAPlayer object(s) from player_list that are most comparable
-        to player. player_list must be list of NBAPlayer objects.
+        to player. player_list must be list of NBAPlayer objects.\n
+        by_index = if True, rank by NBAPlayerIndex distance instead of same 
+        position, then same base position, then the rest
         """
         
+        if by_index:
+            # Index is refreshed by the caller
+            index = self.get_player_index(refresh=False)
+            candidates = {player.id: player for player in player_list}
+            similar_ids = index.nearest(main_player.id, n, list(candidates))
+            return [candidates[pl_id] for pl_id in similar_ids]
+
         similar_players = []
         for player in player_list:
             if (player.position == main_player.position 
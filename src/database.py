@@ -0,0 +1,390 @@
+import os
+import json
+import sqlite3
+import threading
+import pandas as pd
+
+from file_handler import FileHandler
+import gamelog_schema
+import nba_schema
+
+
+class NBADatabase:
+    def __init__(self, fp: str='data/nba/nba.db'):
+        """
+        SQLite storage for NBA data, an optional alternative to the json
+        files. Tables are normalised: player gamelogs reference games by ID
+        and game details are joined back in when loading.\n
+        fp = database file
+        """
+
+        self.fp = fp
+        self.lock = threading.Lock()
+        # Ingest may run on several threads, all writes go through self.lock
+        self.conn = sqlite3.connect(fp, check_same_thread=False)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.player_stat_columns = [
+            'pos', 'min', 'points', 'fgm', 'fga', 'fgp', 'ftm', 'fta', 'ftp',
+            'tpm', 'tpa', 'tpp', 'off_reb', 'def_reb', 'tot_reb', 'assists',
+            'fouls', 'steals', 'turnovers', 'blocks', 'plus_minus', 'comment']
+        self.prop_columns = [
+            'event_id', 'sport_key', 'sport_name', 'home_team', 'away_team',
+            'bookmaker_key', 'bookmaker_name', 'market_key', 'market_name',
+            'market_abv', 'last_update', 'name', 'player_name', 'price',
+            'line', 'timestamp']
+        self.__create_tables()
+
+    def close(self):
+        self.conn.close()
+
+    def __create_tables(self):
+        # Values are typed by nba_schema before they are stored
+        self.conn.executescript('''
+            CREATE TABLE IF NOT EXISTS teams (
+                id INTEGER PRIMARY KEY, name TEXT, city TEXT, nickname TEXT,
+                code TEXT, logo TEXT, conference TEXT, division TEXT);
+            CREATE TABLE IF NOT EXISTS games (
+                id INTEGER PRIMARY KEY, season INTEGER, datetime TEXT,
+                timestamp REAL, date TEXT, time TEXT, finished INTEGER,
+                overtime INTEGER, playoffs INTEGER, arena TEXT);
+            CREATE TABLE IF NOT EXISTS team_gamelogs (
+                game_id INTEGER, team_id INTEGER, season INTEGER, loc TEXT,
+                code TEXT, q1 INTEGER, q2 INTEGER, q3 INTEGER, q4 INTEGER,
+                ot INTEGER, total INTEGER, outcome TEXT, margin INTEGER,
+                PRIMARY KEY (game_id, team_id));
+            CREATE TABLE IF NOT EXISTS player_gamelogs (
+                game_id INTEGER, player_id INTEGER, team_id INTEGER,
+                opp_id INTEGER, loc TEXT, season INTEGER, datetime TEXT,
+                firstname TEXT, lastname TEXT, pos TEXT, min INTEGER,
+                points INTEGER, fgm INTEGER, fga INTEGER, fgp REAL,
+                ftm INTEGER, fta INTEGER, ftp REAL, tpm INTEGER, tpa INTEGER,
+                tpp REAL, off_reb INTEGER, def_reb INTEGER, tot_reb INTEGER,
+                assists INTEGER, fouls INTEGER, steals INTEGER,
+                turnovers INTEGER, blocks INTEGER, plus_minus INTEGER,
+                comment TEXT, PRIMARY KEY (game_id, player_id));
+            CREATE TABLE IF NOT EXISTS players (
+                id INTEGER PRIMARY KEY, firstname TEXT, lastname TEXT,
+                height_feet, height_inches, weight, jersey, position TEXT);
+            CREATE TABLE IF NOT EXISTS props (
+                event_id TEXT, sport_key TEXT, sport_name TEXT,
+                home_team TEXT, away_team TEXT, bookmaker_key TEXT,
+                bookmaker_name TEXT, market_key TEXT, market_name TEXT,
+                market_abv TEXT, last_update TEXT, name TEXT,
+                player_name TEXT, price, line REAL, timestamp REAL,
+                market_group TEXT,
+                PRIMARY KEY (event_id, bookmaker_key, market_key,
+                             player_name, name, line));
+            CREATE TABLE IF NOT EXISTS injuries (
+                name TEXT PRIMARY KEY, status TEXT, comment TEXT);
+            CREATE INDEX IF NOT EXISTS player_gamelogs_player_datetime
+                ON player_gamelogs (player_id, datetime);
+            CREATE INDEX IF NOT EXISTS player_gamelogs_game
+                ON player_gamelogs (game_id);
+            CREATE INDEX IF NOT EXISTS team_gamelogs_team_season
+                ON team_gamelogs (team_id, season);
+            CREATE INDEX IF NOT EXISTS props_market_player
+                ON props (market_key, player_name);
+        ''')
+
+    def __upsert(self, table: str, rows: list, keys: list):
+        """Insert rows (list of dicts), updating rows with the same keys."""
+
+        if len(rows) == 0:
+            return
+        with self.lock, self.conn:
+            self.__execute_upsert(table, rows, keys)
+
+    def __execute_upsert(self, table: str, rows: list, keys: list):
+        """
+        Run the upsert for __upsert without locking or committing, so it can
+        share a transaction with other statements. Hold self.lock.
+        """
+
+        if len(rows) == 0:
+            return
+        columns = list(rows[0])
+        updates = ', '.join(f'{col}=excluded.{col}' for col in columns
+                            if col not in keys)
+        sql = (f'INSERT INTO {table} ({", ".join(columns)}) '
+               f'VALUES ({", ".join("?" * len(columns))}) '
+               f'ON CONFLICT ({", ".join(keys)}) DO UPDATE SET {updates}')
+        self.conn.executemany(sql, [[row[col] for col in columns]
+                                    for row in rows])
+
+    def upsert_teams(self, teams: list):
+        """teams = list of dicts from organize_nba_team_data"""
+
+        self.__upsert('teams', teams, ['id'])
+
+    def upsert_games(self, games: dict):
+        """games = dict of game ID -> dict from organize_nba_game_data"""
+
+        game_rows, team_rows = [], []
+        for game_id, game in games.items():
+            game_rows.append({
+                'id': int(game_id), 'season': game['season'],
+                'datetime': game['datetime'], 'timestamp': game['timestamp'],
+                'date': game['date'],
+                'time': game['time'], 'finished': game['finished'],
+                'overtime': game['overtime'], 'playoffs': game['playoffs'],
+                'arena': json.dumps(game['arena'])
+            })
+            for loc in ['away', 'home']:
+                team = game[loc]
+                team_rows.append({
+                    'game_id': int(game_id), 'team_id': team['id'],
+                    'season': game['season'], 'loc': loc,
+                    'code': team['code'], **team['score'],
+                    'outcome': team['outcome'], 'margin': team['margin']
+                })
+        self.__upsert('games', game_rows, ['id'])
+        self.__upsert('team_gamelogs', team_rows, ['game_id', 'team_id'])
+
+    def upsert_players(self, players: list):
+        """players = list of dicts from organize_nba_player_data"""
+
+        rows = [{'id': player['id'], 'firstname': player['firstname'],
+                 'lastname': player['lastname'],
+                 'height_feet': player['height']['feet'],
+                 'height_inches': player['height']['inches'],
+                 'weight': player['weight'], 'jersey': player['jersey'],
+                 'position': player['position']} for player in players]
+        self.__upsert('players', rows, ['id'])
+
+    def upsert_player_gamelogs(self, gamelogs: list):
+        """
+        gamelogs = list of dicts from organize_nba_player_stat_data. Game
+        details (date, scores, opp code) are not stored, they come from games.
+        """
+
+        rows = []
+        for log in gamelogs:
+            row = {'game_id': int(log['game_id']),
+                   'player_id': log['player_id'], 'team_id': log['team_id'],
+                   'opp_id': log['opp_id'], 'loc': log['loc'],
+                   'season': log['season'], 'datetime': log['datetime'],
+                   'firstname': log['firstname'], 'lastname': log['lastname']}
+            for col in self.player_stat_columns:
+                row[col] = log[col]
+            rows.append(row)
+        self.__upsert('player_gamelogs', rows, ['game_id', 'player_id'])
+
+    def replace_props(self, props: list, markets: list):
+        """
+        Replace all props for markets (list of market dicts) with props, the
+        latest snapshot from organize_all_market_odds, in one transaction.
+        """
+
+        groups = {market['key']: market['group'] for market in markets}
+        keys = ['event_id', 'bookmaker_key', 'market_key', 'player_name',
+                'name', 'line']
+        rows = {}
+        for prop in props:
+            row = {col: prop[col] for col in self.prop_columns}
+            # player_name is part of the key, NULLs would never conflict
+            if row['player_name'] is None:
+                row['player_name'] = ''
+            # Same outcome listed twice in a response keeps the last one. 
+            # Deduplicated here too, h2h lines are NULL.
+            rows[tuple(row[key] for key in keys)] = {
+                **row, 'market_group': groups[prop['market_key']]}
+        with self.lock, self.conn:
+            self.conn.executemany('DELETE FROM props WHERE market_key = ?',
+                                  [[key] for key in groups])
+            self.__execute_upsert('props', list(rows.values()), keys)
+
+    def replace_injuries(self, injuries: list):
+        """Replace all injuries with injuries, in one transaction."""
+
+        with self.lock, self.conn:
+            self.conn.execute('DELETE FROM injuries')
+            self.__execute_upsert('injuries', injuries, ['name'])
+
+    def load_teams(self):
+        """Return list of team dicts, same form as nba_teams.json."""
+
+        return [dict(row) for row in
+                self.conn.execute('SELECT * FROM teams ORDER BY id')]
+
+    def load_games(self, seasons: list=None):
+        """
+        Return dict of game ID (str) -> game dict, same form as the games
+        json files.\n
+        seasons = list of seasons to load (default all)
+        """
+
+        where, params = self.__get_filters(seasons=seasons, table='g')
+        teams = {}
+        for row in self.conn.execute(
+                f'SELECT t.* FROM team_gamelogs t JOIN games g '
+                f'ON g.id = t.game_id {where}', params):
+            teams[(row['game_id'], row['loc'])] = {
+                'id': row['team_id'], 'code': row['code'],
+                'score': {q: row[q] for q in ['q1', 'q2', 'q3', 'q4', 'ot',
+                                             'total']},
+                'outcome': row['outcome'], 'margin': row['margin']
+            }
+
+        games = {}
+        for row in self.conn.execute(
+                f'SELECT * FROM games g {where} ORDER BY g.timestamp', params):
+            games[str(row['id'])] = {
+                'season': row['season'], 'datetime': row['datetime'],
+                'timestamp': row['timestamp'], 'date': row['date'], 'time': row['time'],
+                'finished': bool(row['finished']),
+                'overtime': bool(row['overtime']),
+                'playoffs': bool(row['playoffs']),
+                'arena': json.loads(row['arena']),
+                'away': teams[(row['id'], 'away')],
+                'home': teams[(row['id'], 'home')]
+            }
+        return games
+
+    def load_players(self):
+        """Return list of player dicts, same form as nba_players.json."""
+
+        return [{'id': row['id'], 'firstname': row['firstname'],
+                 'lastname': row['lastname'],
+                 'height': {'feet': row['height_feet'],
+                            'inches': row['height_inches']},
+                 'weight': row['weight'], 'jersey': row['jersey'],
+                 'position': row['position']}
+                for row in self.conn.execute('SELECT * FROM players')]
+
+    def load_player_gamelogs(self, seasons: list=None, player_id: int=None,
+                             opp_id: int=None, loc: str=None):
+        """
+        Return list of gamelog dicts, same form as the gamelog json files,
+        with game details joined in from games. Filters run in SQL.\n
+        seasons = list of seasons (default all)\n
+        player_id, opp_id = player and opponent team IDs (default all)\n
+        loc = 'home' or 'away' (default both)
+        """
+
+        where, params = self.__get_filters(seasons, player_id, opp_id, loc,
+                                           table='p')
+        stats = ', '.join(f'p.{col}' for col in self.player_stat_columns)
+        sql = f'''
+            SELECT p.game_id, p.season, p.datetime, g.date, g.time, p.loc,
+                   p.team_id, t.code AS team_code, t.total AS team_score,
+                   p.opp_id, o.code AS opp_code, o.total AS opp_score,
+                   g.playoffs, p.player_id, p.firstname, p.lastname, {stats}
+            FROM player_gamelogs p
+            JOIN games g ON g.id = p.game_id
+            JOIN team_gamelogs t ON t.game_id = p.game_id
+                AND t.team_id = p.team_id
+            JOIN team_gamelogs o ON o.game_id = p.game_id
+                AND o.team_id = p.opp_id
+            {where}
+            ORDER BY p.season, p.team_id, p.datetime, p.player_id'''
+        gamelogs = []
+        for row in self.conn.execute(sql, params):
+            log = dict(row)
+            log['game_id'] = str(log['game_id'])
+            log['playoffs'] = bool(log['playoffs'])
+            gamelogs.append(log)
+        return gamelogs
+
+    def query_player_gamelogs(self, **filters):
+        """
+        Same as load_player_gamelogs, as a Pandas DataFrame with columns
+        gamelog_schema.QUERY_COLUMNS.
+        """
+
+        return pd.DataFrame(self.load_player_gamelogs(**filters),
+                            columns=gamelog_schema.QUERY_COLUMNS)
+
+    def load_props(self, group: str=None, market_keys: list=None):
+        """
+        Return list of prop dicts, same form as organize_all_market_odds.\n
+        group = market group, ex.) 'player_props' (default all)\n
+        market_keys = list of market keys (default all)
+        """
+
+        clauses, params = [], []
+        if group is not None:
+            clauses.append('market_group = ?')
+            params.append(group)
+        if market_keys is not None:
+            clauses.append(f'market_key IN '
+                           f'({", ".join("?" * len(market_keys))})')
+            params += list(market_keys)
+        where = 'WHERE ' + ' AND '.join(clauses) if clauses else ''
+        columns = ', '.join(self.prop_columns)
+        props = []
+        for row in self.conn.execute(f'SELECT {columns} FROM props {where}',
+                                     params):
+            prop = dict(row)
+            # Stored as '' for core markets, see replace_props
+            if prop['player_name'] == '':
+                prop['player_name'] = None
+            props.append(prop)
+        return props
+
+    def load_injuries(self):
+        return [dict(row) for row in
+                self.conn.execute('SELECT * FROM injuries')]
+
+    def __get_filters(self, seasons: list=None, player_id: int=None,
+                      opp_id: int=None, loc: str=None, table: str=''):
+        clauses, params = [], []
+        if seasons is not None:
+            clauses.append(f'{table}.season IN '
+                           f'({", ".join("?" * len(seasons))})')
+            params += list(seasons)
+        if player_id is not None:
+            clauses.append(f'{table}.player_id = ?')
+            params.append(player_id)
+        if opp_id is not None:
+            clauses.append(f'{table}.opp_id = ?')
+            params.append(opp_id)
+        if loc is not None:
+            clauses.append(f'{table}.loc = ?')
+            params.append(loc)
+        where = 'WHERE ' + ' AND '.join(clauses) if clauses else ''
+        return where, params
+
+    def import_json(self, sport: str='nba'):
+        """Load every json data file for sport into the database."""
+
+        self.upsert_teams(FileHandler(f'{sport}_teams.json',
+                                      f'data/{sport}/teams').load_file())
+        self.upsert_players(FileHandler(f'{sport}_players.json',
+                                        f'data/{sport}/players').load_file())
+        self.replace_injuries(FileHandler(f'{sport}_player_injuries.json',
+                                          f'data/{sport}/players').load_file())
+        games = {}
+        file_path = f'data/{sport}/games'
+        for file in sorted(os.listdir(file_path)):
+            season_games = nba_schema.type_games(
+                FileHandler(file, file_path).load_file())
+            self.upsert_games(season_games)
+            games[int(file.split('_')[0])] = season_games
+        file_path = f'data/{sport}/players/gamelogs'
+        for file in sorted(os.listdir(file_path)):
+            season = int(file.split('_')[0])
+            self.upsert_player_gamelogs(gamelog_schema.load_gamelogs(
+                file, file_path, games[season]))
+
+        # Props from the latest odds snapshot
+        from get_data import get_odds_store
+        store = get_odds_store(sport)
+        groups = store.load()[['market_key', 'group']].drop_duplicates()
+        markets = [{'key': key, 'group': group}
+                   for key, group in groups.itertuples(index=False)]
+        self.replace_props(store.latest(), markets)
+
+
+if __name__ == "__main__":
+    import time
+
+    db = NBADatabase()
+    start = time.perf_counter()
+    db.import_json()
+    print(f'Imported json in {time.perf_counter() - start:.1f}s')
+
+    start = time.perf_counter()
+    gamelogs = db.load_player_gamelogs(seasons=[2023], opp_id=17, loc='home')
+    print(f'{len(gamelogs)} home gamelogs vs LAL in 2023 in '
+          f'{time.perf_counter() - start:.3f}s')
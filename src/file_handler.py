@@ -1,72 +1,297 @@
 import os
+import io
 import json
 import csv
+import gzip
+import time
+import tempfile
 import pandas as pd
+import numpy as np
+
+# Optional fast paths, stdlib json and no zstd support without them
+try:
+    import orjson
+except ImportError:
+    orjson = None
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# Temp files are created private, written files get the usual permissions
+_umask = os.umask(0)
+os.umask(_umask)
 
 class FileHandler:
-    def __init__(self, name: str, file_path=''):
+    def __init__(self, name: str, file_path='', indent: int=None,
+                 fast: bool=True, buffer_size: int=1,
+                 compact_every: int=None, compact_key=None,
+                 sync: bool=False):
+        """
+        name = file name, type is taken from the extension. A trailing .gz or
+        .zst compresses the file, ex.) 'data.json.zst'\n
+        indent = JSON indent, None writes compact JSON (default)\n
+        fast = use orjson for JSON when it is installed (default True)\n
+        For .jsonl files:\n
+        buffer_size = records held by add_to_file before they are appended
+        (default 1, every record is written right away). Above 1, call
+        flush() (or use with) to write the rest, records still buffered when
+        the handler is dropped are lost.\n
+        compact_every = compact file after this many flushes, keeping only
+        the last record for each compact_key (default never)\n
+        compact_key = function of a record, required with compact_every\n
+        sync = fsync after each flush, so flushed records survive a crash
+        """
+
         self.name = name
-        self.type = name.split('.')[-1]
+        self.compression = None
+        extensions = name.split('.')
+        if extensions[-1] in ['gz', 'zst']:
+            self.compression = extensions.pop()
+        self.type = extensions[-1]
         self.file_path = file_path
         self.fp = os.path.join(file_path, name)
+        self.indent = indent
+        self.fast = fast and orjson is not None
+        self.buffer_size = buffer_size
+        if compact_every and compact_key is None:
+            raise ValueError('compact_every needs a compact_key, compacting '
+                             'without one only rewrites the file.')
+        self.compact_every = compact_every
+        self.compact_key = compact_key
+        self.sync = sync
+        self.buffer = [] # Encoded .jsonl records not yet written
+        self.n_flushes = 0
+        if self.compression == 'zst' and zstandard is None:
+            raise ImportError('zstandard is needed for .zst files.')
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.flush()
 
     def load_file(self):
         if self.type == 'json':
             return self.__load_json()
+        elif self.type == 'jsonl':
+            return list(self.iter_file())
         elif self.type == 'csv':
             return self.__csv_to_df()
+        elif self.type == 'npz':
+            return self.__load_npz()
         else:
             print(f'File type .{self.type} not supported.')
 
     def write_file(self, data):
         if self.type == 'json':
             self.__write_json(data)
+        elif self.type == 'jsonl':
+            self.buffer = []
+            self.__write_bytes(b''.join(self.__encode_line(record)
+                                        for record in data))
         elif self.type == 'csv':
             if type(data) is pd.core.frame.DataFrame:
                 self.__df_to_csv(data)
             elif type(data) is list:
-                self.__list_to_csv(data)        
+                self.__list_to_csv(data)
+        elif self.type == 'npz':
+            self.__write_npz(data)
         else:
             print(f'File type .{self.type} not supported.')
 
     def add_to_file(self, data):
         if self.type == 'json':
             self.__add_to_json(data)
+        elif self.type == 'jsonl':
+            self.buffer.append(self.__encode_line(data))
+            if len(self.buffer) >= self.buffer_size:
+                self.flush()
         elif self.type == 'csv':
             self.__add_to_csv(data)
         else:
             print(f'File type .{self.type} not supported.')
 
+    def iter_file(self):
+        """
+        Yield .jsonl records one at a time without loading the whole file.
+        A last line cut off by a crash is skipped.
+        """
+
+        if not os.path.exists(self.fp):
+            return
+        with self.__open_lines() as f:
+            for line in f:
+                try:
+                    yield self.__decode_line(line)
+                except ValueError:
+                    if line.endswith(b'\n'):
+                        raise
+
+    def flush(self):
+        """Append buffered .jsonl records to the file in one write."""
+
+        if len(self.buffer) == 0:
+            return
+        data = b''.join(self.buffer)
+        self.buffer = []
+        # Compressed chunks are appended as separate gzip members/zstd frames
+        if self.compression == 'gz':
+            data = gzip.compress(data, compresslevel=6)
+        elif self.compression == 'zst':
+            data = zstandard.ZstdCompressor(level=3).compress(data)
+        if self.compression is None:
+            self.__drop_cut_off_line()
+        with open(self.fp, 'ab') as f:
+            f.write(data)
+            if self.sync:
+                f.flush()
+                os.fsync(f.fileno())
+        self.n_flushes += 1
+        if self.compact_every and self.n_flushes % self.compact_every == 0:
+            self.compact_file(self.compact_key)
+
+    def compact_file(self, key=None):
+        """
+        Rewrite .jsonl file as one block, dropping a cut off last line. If
+        key is given (function of a record), keep only the last record for
+        each key.
+        """
+
+        self.flush()
+        records = self.iter_file()
+        if key is not None:
+            latest = {}
+            for record in records:
+                latest.pop(key(record), None)
+                latest[key(record)] = record
+            records = latest.values()
+        self.write_file(list(records))
+
+    def __drop_cut_off_line(self):
+        """
+        Truncate a last line left without a newline by a crash, so appended
+        records start on their own line.
+        """
+
+        if not os.path.exists(self.fp):
+            return
+        with open(self.fp, 'r+b') as f:
+            end = f.seek(0, os.SEEK_END)
+            pos = end
+            while pos > 0:
+                start = max(0, pos - 65536)
+                f.seek(start)
+                block = f.read(pos - start)
+                if pos == end and block.endswith(b'\n'):
+                    return
+                newline = block.rfind(b'\n')
+                if newline != -1:
+                    f.truncate(start + newline + 1)
+                    return
+                pos = start
+            f.truncate(0)
+
+    def __open_lines(self):
+        if self.compression == 'gz':
+            return gzip.open(self.fp, 'rb')
+        elif self.compression == 'zst':
+            reader = zstandard.ZstdDecompressor().stream_reader(
+                open(self.fp, 'rb'), read_across_frames=True,
+                closefd=True)
+            return io.BufferedReader(reader)
+        return open(self.fp, 'rb')
+
+    def __encode_line(self, record):
+        if self.fast:
+            option = orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY
+            return orjson.dumps(record, option=option) + b'\n'
+        return json.dumps(record, separators=(',', ':')).encode() + b'\n'
+
+    def __decode_line(self, line: bytes):
+        if self.fast:
+            return orjson.loads(line)
+        return json.loads(line)
+
+    def __read_bytes(self):
+        with open(self.fp, 'rb') as f:
+            data = f.read()
+        if self.compression == 'gz':
+            return gzip.decompress(data)
+        elif self.compression == 'zst':
+            return zstandard.ZstdDecompressor().decompressobj().decompress(data)
+        return data
+
+    def __write_bytes(self, data: bytes):
+        """
+        Compress data by extension and write it atomically. Data goes to a
+        temp file in the same folder which then replaces the file, so a crash
+        never leaves a partly written file.
+        """
+
+        if self.compression == 'gz':
+            data = gzip.compress(data, compresslevel=6)
+        elif self.compression == 'zst':
+            data = zstandard.ZstdCompressor(level=3).compress(data)
+        fd, tmp = tempfile.mkstemp(dir=self.file_path or '.',
+                                   prefix=f'.{self.name}.', suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            os.chmod(tmp, 0o666 & ~_umask)
+            os.replace(tmp, self.fp)
+        except BaseException:
+            os.remove(tmp)
+            raise
+
     def __load_json(self):
-        with open(self.fp, 'r') as f:
-            return json.load(f)
-    
+        data = self.__read_bytes()
+        if self.fast:
+            return orjson.loads(data)
+        return json.loads(data)
+
     def __write_json(self, data):
-        with open(self.fp, 'w') as f:
-            json.dump(data, f, indent=4)
+        # orjson only supports an indent of 2, use json for anything else
+        if self.fast and self.indent in [None, 2]:
+            option = orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY
+            if self.indent == 2:
+                option |= orjson.OPT_INDENT_2
+            self.__write_bytes(orjson.dumps(data, option=option))
+        else:
+            separators = (',', ':') if self.indent is None else None
+            self.__write_bytes(json.dumps(data, indent=self.indent,
+                                          separators=separators).encode())
 
     def __add_to_json(self, data):
-        with open(self.fp) as f:
-            json_data = json.load(f)
-        
+        json_data = self.__load_json()
+
         if type(json_data) is list:
             json_data.append(data)
         elif type(json_data) is dict:
             json_data.update(data)
-        
-        with open(self.fp, 'w') as f:
-            json.dump(json_data, f, indent=4)
+
+        self.__write_json(json_data)
+
+    def __load_npz(self):
+        with np.load(io.BytesIO(self.__read_bytes())) as npz:
+            return dict(npz)
+
+    def __write_npz(self, data: dict):
+        buffer = io.BytesIO()
+        np.savez_compressed(buffer, **data)
+        self.__write_bytes(buffer.getvalue())
 
     def __csv_to_df(self):
         return pd.read_csv(self.fp)
 
     def __df_to_csv(self, df: pd):
-        df.to_csv(self.fp, index=False)
+        self.__write_bytes(df.to_csv(index=False).encode())
 
     def __list_to_csv(self, data):
-        with open(self.fp, 'w') as f:
-            writer = csv.writer(f)
-            writer.writerow(data)
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(data)
+        self.__write_bytes(buffer.getvalue().encode())
 
     def __add_to_csv(self, data):
         with open(self.fp, 'a') as f:
@@ -74,5 +299,96 @@ class FileHandler:
             writer.writerow(data)
 
 
+def benchmark_codecs(file_path: str='data/nba/players/gamelogs',
+                     repeat: int=3):
+    """
+    Read and write every json file in file_path with each codec. Return dict
+    of codec -> size (MB), read and write throughput (MB/s of uncompressed
+    compact JSON).
+    """
+
+    datasets = []
+    for file in sorted(os.listdir(file_path)):
+        if file.endswith('.json'):
+            datasets.append(FileHandler(file, file_path, fast=False).load_file())
+    raw_mb = sum(len(json.dumps(data, separators=(',', ':')))
+                 for data in datasets) / 1e6
+
+    codecs = {
+        'json indent=4': ('json', {'indent': 4, 'fast': False}),
+        'json compact': ('json', {'fast': False}),
+        'orjson': ('json', {}),
+        'orjson + gzip': ('json.gz', {}),
+    }
+    if zstandard is not None:
+        codecs['orjson + zstd'] = ('json.zst', {})
+
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        for codec, (extension, kwargs) in codecs.items():
+            if orjson is None and kwargs.get('fast', True):
+                continue
+            handlers = [FileHandler(f'{i}.{extension}', tmp, **kwargs)
+                        for i in range(len(datasets))]
+            write = read = float('inf')
+            for _ in range(repeat):
+                start = time.perf_counter()
+                for handler, data in zip(handlers, datasets):
+                    handler.write_file(data)
+                write = min(write, time.perf_counter() - start)
+                start = time.perf_counter()
+                for handler in handlers:
+                    handler.load_file()
+                read = min(read, time.perf_counter() - start)
+            size = sum(os.path.getsize(handler.fp) for handler in handlers)
+            results[codec] = {'size_mb': size / 1e6,
+                              'write_mb_s': raw_mb / write,
+                              'read_mb_s': raw_mb / read}
+    return results
+
+def benchmark_jsonl(n: int=1_000_000, n_json: int=2000):
+    """
+    Time appending n odds-like records one at a time to .jsonl files (plain
+    and compressed) and streaming them back, and appending n_json records
+    with add_to_file on a .json file for comparison. Return dict of case ->
+    records per second.
+    """
+
+    record = {'event_id': 'fb671f3e60942f8bc5804ebca360d3f5',
+              'bookmaker_key': 'draftkings', 'market_key': 'player_points',
+              'player_name': 'Brandon Miller', 'name': 'Over',
+              'price': -110, 'line': 17.5, 'ts': 1711397931.0}
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        extensions = ['jsonl', 'jsonl.gz']
+        if zstandard is not None:
+            extensions.append('jsonl.zst')
+        for extension in extensions:
+            start = time.perf_counter()
+            with FileHandler(f'bench.{extension}', tmp,
+                             buffer_size=1000) as handler:
+                for i in range(n):
+                    handler.add_to_file({**record, 'i': i})
+            results[f'append {extension}'] = n / (time.perf_counter() - start)
+            start = time.perf_counter()
+            count = sum(1 for _ in handler.iter_file())
+            results[f'stream {extension}'] = count / (time.perf_counter()
+                                                      - start)
+
+        handler = FileHandler('bench.json', tmp)
+        handler.write_file([])
+        start = time.perf_counter()
+        for i in range(n_json):
+            handler.add_to_file({**record, 'i': i})
+        results['append json'] = n_json / (time.perf_counter() - start)
+    return results
+
+
 if __name__ == "__main__":
-    pass
\ No newline at end of file
+    for case, records_per_sec in benchmark_jsonl().items():
+        print(f'{case:20} {records_per_sec:12,.0f} records/s')
+
+    for codec, result in benchmark_codecs().items():
+        print(f'{codec:16} {result["size_mb"]:8.1f} MB '
+              f'write {result["write_mb_s"]:7.1f} MB/s '
+              f'read {result["read_mb_s"]:7.1f} MB/s')
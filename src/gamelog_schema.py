@@ -0,0 +1,172 @@
+import os
+import time
+import json
+import tempfile
+
+from file_handler import FileHandler
+import nba_schema
+
+
+# Gamelog fields that come from the game, not the player. Normalised gamelog
+# files leave them out and reference the game by game_id only.
+GAME_FIELDS = ['season', 'datetime', 'date', 'time', 'loc', 'team_code',
+               'team_score', 'opp_id', 'opp_code', 'opp_score', 'playoffs']
+# Columns of query_player_gamelogs DataFrames with either backend, in order.
+# Same fields as organize_nba_player_stat_data.
+QUERY_COLUMNS = [
+    'game_id', 'season', 'datetime', 'date', 'time', 'loc', 'team_id',
+    'team_code', 'team_score', 'opp_id', 'opp_code', 'opp_score', 'playoffs',
+    'player_id', 'firstname', 'lastname', 'pos', 'min', 'points', 'fgm',
+    'fga', 'fgp', 'ftm', 'fta', 'ftp', 'tpm', 'tpa', 'tpp', 'off_reb',
+    'def_reb', 'tot_reb', 'assists', 'fouls', 'steals', 'turnovers',
+    'blocks', 'plus_minus', 'comment']
+
+
+def normalise_gamelogs(gamelogs: list):
+    """Return gamelogs without the fields that are stored with the game."""
+
+    return [{key: value for key, value in log.items()
+             if key not in GAME_FIELDS} for log in gamelogs]
+
+def is_normalised(gamelogs: list):
+    return len(gamelogs) == 0 or 'datetime' not in gamelogs[0]
+
+def join_gamelogs(gamelogs: list, games: dict, fields: list=None):
+    """
+    Add game fields to normalised gamelogs in place, joined from games by
+    game_id, and return them. Full gamelogs are returned as they are.\n
+    games = dict of game ID -> game dict, ex.) from {season}_nba_games.json\n
+    fields = game fields to add (default all, same fields as
+    organize_nba_player_stat_data)
+    """
+
+    if not is_normalised(gamelogs):
+        return gamelogs
+
+    # Game fields for each (game, team) pair, built once per game
+    game_fields = {}
+    for log in gamelogs:
+        key = (log['game_id'], log['team_id'])
+        values = game_fields.get(key)
+        if values is None:
+            game = games[log['game_id']]
+            if game['home']['id'] == log['team_id']:
+                loc, opp_loc = 'home', 'away'
+            else:
+                loc, opp_loc = 'away', 'home'
+            values = {
+                'season': game['season'],
+                'datetime': game['datetime'],
+                'date': game['date'],
+                'time': game['time'],
+                'loc': loc,
+                'team_code': game[loc]['code'],
+                'team_score': game[loc]['score']['total'],
+                'opp_id': game[opp_loc]['id'],
+                'opp_code': game[opp_loc]['code'],
+                'opp_score': game[opp_loc]['score']['total'],
+                'playoffs': game['playoffs']
+            }
+            if fields is not None:
+                values = {field: values[field] for field in fields}
+            game_fields[key] = values
+        log.update(values)
+    return gamelogs
+
+def load_gamelogs(file_name: str, file_path: str, games: dict,
+                  fields: list=None):
+    """
+    Load a gamelog file in either format and return gamelogs with game
+    fields (default all) joined in.
+    """
+
+    gamelogs = FileHandler(file_name, file_path).load_file()
+    # Files from before the typed schema are typed here
+    gamelogs = nba_schema.type_gamelogs(gamelogs)
+    return join_gamelogs(gamelogs, games, fields)
+
+def load_season_games(sport: str, season: int):
+    games_handler = FileHandler(f'{season}_{sport}_games.json',
+                                f'data/{sport}/games')
+    return nba_schema.type_games(games_handler.load_file())
+
+def migrate_gamelogs(sport: str='nba', file_path: str=None):
+    """
+    Rewrite every gamelog file of sport in the normalised format. Files that
+    are already normalised are skipped. Return number of files rewritten.
+    """
+
+    file_path = file_path or f'data/{sport}/players/gamelogs'
+    games = {}
+    n = 0
+    for file in sorted(os.listdir(file_path)):
+        if not file.endswith('.json'):
+            continue
+        gamelog_handler = FileHandler(file, file_path)
+        gamelogs = gamelog_handler.load_file()
+        if is_normalised(gamelogs):
+            continue
+        season = int(file.split('_')[0])
+        if season not in games:
+            games[season] = load_season_games(sport, season)
+        # Check nothing is lost before dropping the game fields
+        joined = join_gamelogs(normalise_gamelogs(gamelogs), games[season])
+        if joined != gamelogs:
+            raise ValueError(f'{file} does not match its games file.')
+        gamelog_handler.write_file(normalise_gamelogs(gamelogs))
+        n += 1
+    return n
+
+def benchmark_gamelogs(sport: str='nba', file_path: str=None,
+                       repeat: int=3):
+    """
+    Compare size and load time (parse + join) of the gamelog files of sport
+    in full and normalised format, both written as compact JSON. Normalised
+    files are timed joining all game fields and joining only loc, which is
+    all NBADataAnalysis needs. Return dict of format -> size (MB) and load
+    seconds.
+    """
+
+    file_path = file_path or f'data/{sport}/players/gamelogs'
+    games = {}
+    datasets = []
+    for file in sorted(os.listdir(file_path)):
+        if not file.endswith('.json'):
+            continue
+        season = int(file.split('_')[0])
+        if season not in games:
+            games[season] = load_season_games(sport, season)
+        gamelogs = join_gamelogs(FileHandler(file, file_path).load_file(),
+                                 games[season])
+        datasets.append((file, season, gamelogs))
+
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        for form, convert, fields in [
+                ('full', lambda logs: logs, None),
+                ('normalised', normalise_gamelogs, None),
+                ('normalised, loc only', normalise_gamelogs, ['loc'])]:
+            for file, _, gamelogs in datasets:
+                FileHandler(file, tmp).write_file(convert(gamelogs))
+            size = sum(os.path.getsize(os.path.join(tmp, file))
+                       for file, _, _ in datasets)
+            seconds = float('inf')
+            for _ in range(repeat):
+                start = time.perf_counter()
+                for file, season, _ in datasets:
+                    load_gamelogs(file, tmp, games[season], fields)
+                seconds = min(seconds, time.perf_counter() - start)
+            results[form] = {'size_mb': size / 1e6, 'load_s': seconds}
+    results['original'] = {'size_mb': sum(
+        os.path.getsize(os.path.join(file_path, file))
+        for file, _, _ in datasets) / 1e6}
+    return results
+
+
+if __name__ == "__main__":
+    import sys
+
+    # python gamelog_schema.py [--migrate]
+    print(json.dumps(benchmark_gamelogs(), indent=4))
+    if '--migrate' in sys.argv:
+        print(f'Migrated {migrate_gamelogs()} gamelog files.')
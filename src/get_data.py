@@ -1,15 +1,100 @@
 from datetime import datetime, timezone
-import time
-import timeit
 import os
 
 import get_data_api as api
 import get_data_scrape as scrape
 from file_handler import FileHandler
+from job_journal import JobJournal
+from odds_store import OddsStore
+import gamelog_schema
+import nba_schema
+
+
+# One client per API for the whole run, so HTTP connections, rate limits, 
+# response cache and request metrics are shared between calls
+api_clients = {}
+# If True, only cached API responses are used (offline mode)
+cache_only = False
+# Client class -> keyword arguments, ex.) base_url and key of a stub server
+api_overrides = {}
+# ResponseRecorder given to every new client, None to not record
+recorder = None
+# One OddsStore per sport, so segments are only loaded once per run
+odds_stores = {}
+# NBADatabase that ingested NBA data is also upserted into, None for json only
+database = None
+
+
+def get_api_client(client_class):
+    """Return the run's instance of client_class, creating it if needed."""
+
+    if client_class not in api_clients:
+        cache = api.ResponseCache(f'data/cache/{client_class.__name__}', 
+                                  cache_only=cache_only)
+        kwargs = api_overrides.get(client_class, {})
+        api_clients[client_class] = client_class(cache=cache, **kwargs)
+        api_clients[client_class].recorder = recorder
+    return api_clients[client_class]
+
+def get_odds_store(sport: str):
+    """Return the run's OddsStore for sport, creating it if needed."""
+
+    if sport not in odds_stores:
+        odds_stores[sport] = OddsStore(sport)
+    return odds_stores[sport]
+
+def set_database(db):
+    """
+    Upsert NBA data into db, an NBADatabase, as well as the json files from 
+    now on (None stops).
+    """
+
+    global database
+    database = db
+
+def get_database(sport: str):
+    """Return the run's database if it stores sport's data, else None."""
+
+    return database if sport == 'nba' else None
+
+def save_odds(sport: str, props: list, markets: list):
+    """Save organized props for markets to the OddsStore and database."""
+
+    get_odds_store(sport).append(props, markets)
+    if get_database(sport) is not None:
+        get_database(sport).replace_props(props, markets)
 
+def set_api_overrides(client_class, **kwargs):
+    """
+    Create client_class with kwargs from now on, ex.) base_url and key of a 
+    local stub server, or rate_limit. No kwargs removes the override.
+    """
+
+    if kwargs:
+        api_overrides[client_class] = kwargs
+    else:
+        api_overrides.pop(client_class, None)
+    api_clients.pop(client_class, None)
+
+def set_recorder(value):
+    """
+    Record every network response of new clients with value, a 
+    ResponseRecorder (None stops recording).
+    """
 
-def pause_api_calls():
-    time.sleep(6)
+    global recorder
+    recorder = value
+    api_clients.clear()
+
+def set_cache_only(value: bool):
+    """
+    Turn offline mode on or off. In offline mode API clients only use cached 
+    responses, so data can be rebuilt without spending quota.
+    """
+
+    global cache_only
+    cache_only = value
+    api_clients.clear()
 
 def get_seasons(sport: str):
     """
@@ -20,7 +105,7 @@ def get_seasons(sport: str):
     print(f'Getting {sport.upper()} season data...')
 
     if sport == 'nba':
-        return api.NBAStatsAPIClient().get_seasons()['response']
+        return get_api_client(api.NBAStatsAPIClient).get_seasons()['response']
 
     elif sport == 'nfl':
         pass
@@ -41,8 +126,7 @@ def get_team_data(sport: str):
     
     new_teams = []
     if sport == 'nba':
-        pause_api_calls()
-        teams = api.NBAStatsAPIClient().get_teams()
+        teams = get_api_client(api.NBAStatsAPIClient).get_teams()
         for team in teams['response']:
             # Skip ID 37, not an NBA Franchise
             if team['nbaFranchise'] and team['id'] != 37:
@@ -61,6 +145,8 @@ def get_team_data(sport: str):
     file_path = f'data/{sport}/teams'
     json_handler = FileHandler(file_name, file_path)
     json_handler.write_file(new_teams)
+    if get_database(sport) is not None:
+        get_database(sport).upsert_teams(new_teams)
 
 def organize_nba_team_data(team: dict):
     return {
@@ -93,13 +179,15 @@ def get_game_data(sport: str, season: int):
 
     new_games = {}
     if sport == 'nba':
-        pause_api_calls()
-        games = api.NBAStatsAPIClient().get_games(season=season, 
-                                                  league='standard')
+        client = get_api_client(api.NBAStatsAPIClient)
+        games = client.get_games(season=season, league='standard')
         for game in games['response']:
             # Include only regular and post season games
             if game['stage'] in [2, 4]:
-                new_games[game['id']] = organize_nba_game_data(game)
+                try:
+                    new_games[game['id']] = organize_nba_game_data(game)
+                except nba_schema.SchemaError as e:
+                    print(f'Rejected malformed game {game["id"]}: {e}')
 
     elif sport == 'nfl':
         pass
@@ -114,6 +202,8 @@ def get_game_data(sport: str, season: int):
     file_path = f'data/{sport}/games'
     json_handler = FileHandler(file_name, file_path)
     json_handler.write_file(new_games)
+    if get_database(sport) is not None:
+        get_database(sport).upsert_games(new_games)
 
 def organize_nba_game_data(game: dict):
     # Stage 2 is regular season, stage 4 is playoffs
@@ -200,7 +290,7 @@ def organize_nba_game_data(game: dict):
         home_outcome, away_outcome = None, None
         home_margin, away_margin = None, None
 
-    return {
+    return nba_schema.type_game({
             'season': game['season'],
             'datetime': new_dt_iso,
             'date': new_date,
@@ -223,7 +313,7 @@ def organize_nba_game_data(game: dict):
                      'outcome': home_outcome,
                      'margin': home_margin
                      }
-            }
+            })
 
 def organize_nfl_game_data(team: dict):
     return {}
@@ -245,11 +335,11 @@ def get_player_data(sport: str, season: int):
 
     if sport == 'nba':
         player_ids = []
-        for team in teams:
-            pause_api_calls()
-            print(team['name'])
-            players = api.NBAStatsAPIClient().get_players(team=team['id'], 
-                                                          season=season)
+        # Requests for all teams run concurrently within API rate limit
+        kwargs_list = [{'team': team['id'], 'season': season} for team in teams]
+        client = get_api_client(api.NBAStatsAPIClient)
+        all_players = client.map_requests('get_players', kwargs_list)
+        for players in all_players:
             for player in players['response']:
                 if player['id'] not in player_ids:
                     new_players.append(organize_nba_player_data(player))
@@ -268,6 +358,8 @@ def get_player_data(sport: str, season: int):
     file_path = f'data/{sport}/players'
     json_handler = FileHandler(file_name, file_path)
     json_handler.write_file(new_players)
+    if get_database(sport) is not None:
+        get_database(sport).upsert_players(new_players)
 
 def organize_nba_player_data(player: dict):
     # Check that the suffix is not in first name by mistake.
@@ -306,15 +398,228 @@ def get_player_stats_data(sport: str, team: int=None,
 
     print(f'Getting {sport.upper()} player stats data for team {team} season {season}...')
 
+    if sport == 'nba':
+        client = get_api_client(api.NBAStatsAPIClient)
+        player_stats = client.get_player_stats(team=team, season=season)
+        save_player_stats_data(sport, team, season, player_stats)
+
+    elif sport == 'nfl':
+        pass
+
+    elif sport == 'mlb':
+        pass
+
+    elif sport == 'nhl':
+        pass
+
+def get_all_player_stats_data(sport: str, teams: list, season: int, 
+                              journal: JobJournal=None):
+    """
+    Given sport, list of team IDs and season, save player gamelog info for 
+    every team. Requests run concurrently within the API rate limit instead 
+    of pausing between calls. Return list of organized gamelogs saved.\n
+    journal = JobJournal, teams already completed are skipped and each saved 
+    team is recorded. Teams that did get saved are kept if another fails.
+    """
+
+    if journal is not None:
+        teams = [team for team in teams if not journal.is_complete(
+            f'player_stats/{sport}/{season}/{team}')]
+
+    print(f'Getting {sport.upper()} player stats data for {len(teams)} teams season {season}...')
+
+    new_player_stats = []
+    if sport == 'nba':
+        kwargs_list = [{'team': team, 'season': season} for team in teams]
+        client = get_api_client(api.NBAStatsAPIClient)
+        all_player_stats = client.map_requests('get_player_stats', kwargs_list,
+                                               return_exceptions=True)
+        errors = []
+        for kwargs, player_stats in zip(kwargs_list, all_player_stats):
+            if isinstance(player_stats, Exception):
+                errors.append(player_stats)
+                continue
+            team = kwargs['team']
+            new_player_stats += save_player_stats_data(sport, team, season, 
+                                                       player_stats)
+            if journal is not None:
+                journal.record(f'player_stats/{sport}/{season}/{team}', 
+                               'players/statistics', kwargs,
+                               f'data/{sport}/players/gamelogs/{season}_{team}_player_gamelogs.json')
+        if len(errors) > 0:
+            raise errors[0]
+
+    elif sport == 'nfl':
+        pass
+
+    elif sport == 'mlb':
+        pass
+
+    elif sport == 'nhl':
+        pass
+
+    return new_player_stats
+
+def save_player_stats_data(sport: str, team: int, season: int, 
+                           player_stats: dict):
+    """
+    Given sport, team, season and API response from player stats call, 
+    organize and save player gamelog info. Return list of organized gamelogs.
+    """
+
     # Open games .json to get info for gamelogs
     json_handler = FileHandler(f'{season}_{sport}_games.json', f'data/{sport}/games')
     games = json_handler.load_file()
+    new_player_stats = organize_player_stats_response(sport, player_stats, 
+                                                      games)
+
+    # Gamelogs are saved normalised, game details stay in the games file
+    file_name = f'{season}_{team}_player_gamelogs.json'
+    file_path = f'data/{sport}/players/gamelogs'
+    json_handler = FileHandler(file_name, file_path)
+    json_handler.write_file(gamelog_schema.normalise_gamelogs(new_player_stats))
+    if get_database(sport) is not None:
+        get_database(sport).upsert_player_gamelogs(new_player_stats)
+    return new_player_stats
+
+def get_new_player_stats_data(sport: str, season: int):
+    """
+    Given sport and season, fetch player stats only for games finished since 
+    the season's sync watermark, one call per game, and merge them into the 
+    existing gamelog files. Games file for the season must be up to date. 
+    If there is no watermark yet, or more new games than teams, reload stats 
+    for every team instead (one call per team).\n
+    Return set of player IDs in the new gamelogs.
+    """
+
+    json_handler = FileHandler(f'{season}_{sport}_games.json', f'data/{sport}/games')
+    games = json_handler.load_file()
+    watermark = load_sync_watermark(sport, season)
+    json_handler = FileHandler(f'{sport}_teams.json', f'data/{sport}/teams')
+    team_ids = [team['id'] for team in json_handler.load_file()]
+
+    new_game_ids = []
+    if watermark is not None:
+        new_game_ids = [game_id for game_id, game in games.items() 
+                        if game['finished'] and (datetime.fromisoformat(
+                            game['datetime']) > datetime.fromisoformat(watermark))]
+    if watermark is None or len(new_game_ids) > len(team_ids):
+        new_player_stats = get_all_player_stats_data(sport, team_ids, season)
+        save_sync_watermark(sport, season, games, 
+                            {stat['game_id'] for stat in new_player_stats})
+        return {stat['player_id'] for stat in new_player_stats}
+
+    print(f'Getting {sport.upper()} player stats data for {len(new_game_ids)} games since {watermark}...')
+
+    new_player_stats = []
+    if sport == 'nba':
+        kwargs_list = [{'game': int(game_id)} for game_id in new_game_ids]
+        client = get_api_client(api.NBAStatsAPIClient)
+        for player_stats in client.map_requests('get_player_stats', 
+                                                kwargs_list):
+            new_player_stats += organize_player_stats_response(
+                sport, player_stats, games)
+
+    elif sport == 'nfl':
+        pass
+
+    elif sport == 'mlb':
+        pass
+
+    elif sport == 'nhl':
+        pass
+
+    merge_player_stats_data(sport, season, new_game_ids, new_player_stats)
+    save_sync_watermark(sport, season, games, 
+                        {stat['game_id'] for stat in new_player_stats})
+    return {stat['player_id'] for stat in new_player_stats}
+
+def merge_player_stats_data(sport: str, season: int, game_ids: list, 
+                            player_stats: list):
+    """
+    Given organized gamelogs for game_ids, replace any existing gamelogs for 
+    those games in each team's gamelog file and keep files in date order.
+    """
+
+    game_ids = set(game_ids)
+    games = gamelog_schema.load_season_games(sport, season)
+    teams = {}
+    for player_stat in player_stats:
+        teams.setdefault(player_stat['team_id'], []).append(player_stat)
+
+    for team, team_stats in teams.items():
+        file_name = f'{season}_{team}_player_gamelogs.json'
+        file_path = f'data/{sport}/players/gamelogs'
+        json_handler = FileHandler(file_name, file_path)
+        if os.path.exists(os.path.join(file_path, file_name)):
+            # Loaded gamelogs are typed like the new ones
+            gamelogs = [log for log in gamelog_schema.load_gamelogs(
+                file_name, file_path, games) if log['game_id'] not in game_ids]
+        else:
+            gamelogs = []
+        gamelogs += team_stats
+        gamelogs.sort(key=lambda log: datetime.fromisoformat(log['datetime']))
+        json_handler.write_file(gamelog_schema.normalise_gamelogs(gamelogs))
+    if get_database(sport) is not None:
+        get_database(sport).upsert_player_gamelogs(player_stats)
+
+def load_sync_watermark(sport: str, season: int):
+    """
+    Return iso datetime string of the sport's sync watermark for season, or 
+    None if the season has not been synced.
+    """
+
+    file_path = f'data/{sport}'
+    if not os.path.exists(os.path.join(file_path, 'sync_watermarks.json')):
+        return None
+    watermark_handler = FileHandler('sync_watermarks.json', file_path)
+    return watermark_handler.load_file().get(str(season))
+
+def save_sync_watermark(sport: str, season: int, games: dict, 
+                        stats_game_ids: set=None):
+    """
+    Given games dict for season, save the datetime of the last finished game 
+    with no unfinished games before it. Games still in play when the sync 
+    ran are picked up on the next sync.\n
+    stats_game_ids = set of game IDs that returned player stats. If given, 
+    the watermark also stops before the first finished game after the 
+    current watermark that has no stats yet, so it is fetched again.
+    """
+
+    old_watermark = load_sync_watermark(sport, season)
+    watermark = None
+    for game_id, game in sorted(games.items(), 
+                                key=lambda item: datetime.fromisoformat(
+                                    item[1]['datetime'])):
+        if not game['finished']:
+            break
+        if (stats_game_ids is not None and game_id not in stats_game_ids and
+                (old_watermark is None or datetime.fromisoformat(
+                    game['datetime']) > datetime.fromisoformat(old_watermark))):
+            break
+        watermark = game['datetime']
+    if watermark is None:
+        return
+
+    file_path = f'data/{sport}'
+    watermark_handler = FileHandler('sync_watermarks.json', file_path)
+    watermarks = {}
+    if os.path.exists(os.path.join(file_path, 'sync_watermarks.json')):
+        watermarks = watermark_handler.load_file()
+    watermarks[str(season)] = watermark
+    watermark_handler.write_file(watermarks)
+
+def organize_player_stats_response(sport: str, player_stats: dict, 
+                                   games: dict):
+    """
+    Given sport, API response from player stats call and games dict for the 
+    season, return list of organized gamelogs for players who played.
+    """
+
     new_player_stats = []
 
     if sport == 'nba':
-        pause_api_calls()
-        player_stats = api.NBAStatsAPIClient().get_player_stats(team=team, 
-                                                                season=season)
+        rejected = []
         for player_stat in player_stats['response']:
             game_id = str(player_stat['game']['id'])
             # Skip if game not in games (Preseason)
@@ -322,11 +627,16 @@ def get_player_stats_data(sport: str, team: int=None,
                 game = games[game_id]
             except KeyError:
                 continue
-            new_player_stat = organize_nba_player_stat_data(player_stat, game, game_id)
             # Check that the player actually played in the game
-            if (new_player_stat['min'] is not None and 
-                new_player_stat['min'] not in ['-', '--', '0:00']):
-                new_player_stats.append(new_player_stat)
+            if player_stat['min'] in [None, '-', '--', '0:00']:
+                continue
+            try:
+                new_player_stats.append(
+                    organize_nba_player_stat_data(player_stat, game, game_id))
+            except nba_schema.SchemaError as e:
+                rejected.append(str(e))
+        if len(rejected) > 0:
+            print(f'Rejected {len(rejected)} malformed gamelogs, first: {rejected[0]}')
 
     elif sport == 'nfl':
         pass
@@ -337,10 +647,7 @@ def get_player_stats_data(sport: str, team: int=None,
     elif sport == 'nhl':
         pass
 
-    file_name = f'{season}_{team}_player_gamelogs.json'
-    file_path = f'data/{sport}/players/gamelogs'
-    json_handler = FileHandler(file_name, file_path)
-    json_handler.write_file(new_player_stats)
+    return new_player_stats
 
 def organize_nba_player_stat_data(player_stat: dict, game: dict, game_id: str):
     # Determine whether player was home or away
@@ -356,7 +663,7 @@ def organize_nba_player_stat_data(player_stat: dict, game: dict, game_id: str):
     first_name, last_name = fix_player_name(player_stat['player']['firstname'], 
                                             player_stat['player']['lastname'])
     
-    return {
+    return nba_schema.type_player_stat({
             'game_id': game_id,
             'season': game['season'],
             'datetime': game['datetime'],
@@ -395,7 +702,7 @@ def organize_nba_player_stat_data(player_stat: dict, game: dict, game_id: str):
             'blocks': player_stat['blocks'],
             'plus_minus': player_stat['plusMinus'],
             'comment': player_stat['comment']
-    }
+    })
 
 def organize_nfl_player_stat_data(player_stat: dict, game: dict, game_id: str):
     return {}
@@ -415,6 +722,8 @@ def get_player_injuries(sport: str):
     injuries = scrape.get_player_injuries(sport)
     injuries_handler = FileHandler(f'{sport}_player_injuries.json', f'data/{sport}/players')
     injuries_handler.write_file(injuries)
+    if get_database(sport) is not None:
+        get_database(sport).replace_injuries(injuries)
 
 def get_events(sport: str, date_str: str):
     """
@@ -425,15 +734,16 @@ def get_events(sport: str, date_str: str):
     sports_handler = FileHandler('api_keys_sports.json', 'src')
     sports = sports_handler.load_file()
     
-    events = api.OddsAPIClient().get_events(sports[sport]['key'], date_str)
+    client = get_api_client(api.OddsAPIClient)
+    events = client.get_events(sports[sport]['key'], date_str)
     events_handler = FileHandler('events.json', f'data/{sport}/odds')
     events_handler.write_file(events)
     
 def get_core_market_odds(sport: str, market: dict, date_str: str):
     """
     Given sport ('nba', 'nfl', i.e.), appropriate market dict from 
-    api_keys_core_markets.json, and date_str in format yyyy-mm-dd, return 
-    json with odds.
+    api_keys_core_markets.json, and date_str in format yyyy-mm-dd, save 
+    odds to the sport's OddsStore.
     """
 
     market_name = market['name']
@@ -448,25 +758,34 @@ def get_core_market_odds(sport: str, market: dict, date_str: str):
     for bookie in bookmakers:
         bookies.append(bookie['key'])
 
-    market_key, market_group = market['key'], market['group']
-    odds = api.OddsAPIClient().get_odds(sport=sports[sport]['key'],
-                                        markets=[market_key],
-                                        bookmakers=bookies,
-                                        date_str=date_str)
+    market_key = market['key']
+    client = get_api_client(api.OddsAPIClient)
+    odds = client.get_odds(sport=sports[sport]['key'],
+                           markets=[market_key],
+                           bookmakers=bookies,
+                           date_str=date_str)
     
     odds = organize_all_market_odds(odds, market)
-    odds_handler = FileHandler(f'{market_key}.json', f'data/{sport}/odds/{market_group}')
-    odds_handler.write_file(odds)
+    save_odds(sport, odds, [market])
 
-def get_additional_market_odds(sport: str, market: dict):
+def get_additional_markets_odds(sport: str, markets: list, 
+                                max_markets_per_call: int=None,
+                                credit_budget: float=None):
     """
-    Given sport ('nba', 'nfl', i.e.) and appropriate market dict from 
-    api_keys_player_props_markets.json, api_keys_alt_player_prop_markets.json, 
-    and more to be added later, return json with odds.
+    Given sport ('nba', 'nfl', i.e.) and list of market dicts from 
+    api_keys_player_props_markets.json (or other additional markets), save 
+    odds for every market. Markets are grouped into as few calls per event 
+    as possible and events are requested concurrently, then the combined 
+    responses are split back per market and saved to the sport's OddsStore.\n
+    max_markets_per_call = max market keys in one request (default all)\n
+    credit_budget = max API credits to spend, calls that could go over the 
+    budget are skipped (default no limit)\n
+    Return dict with calls and credits used versus the one market per call 
+    plan, and IDs of events whose request failed. Failed events are skipped 
+    and the rest are still saved.
     """
 
-    market_name = market['ext_name']
-    print(f'Getting {sport.upper()} {market_name} odds...')
+    print(f'Getting {sport.upper()} odds for {len(markets)} markets...')
 
     events_handler = FileHandler('events.json', f'data/{sport}/odds')
     events = events_handler.load_file()
@@ -480,21 +799,93 @@ def get_additional_market_odds(sport: str, market: dict):
     for bookie in bookmakers:
         bookies.append(bookie['key'])
 
-    market_key, market_group = market['key'], market['group']
-    odds_list = []
+    # Every 10 bookmakers are billed as one region, and each call costs 
+    # (markets returned x regions) credits
+    regions = max(1, -(-len(bookies) // 10))
+    market_keys = [market['key'] for market in markets]
+    chunk_size = max_markets_per_call or len(market_keys)
+    chunks = [market_keys[i:i + chunk_size] 
+              for i in range(0, len(market_keys), chunk_size)]
+
+    client = get_api_client(api.OddsAPIClient)
+    budget = credit_budget
+    if client.credits_remaining is not None:
+        budget = min(budget if budget is not None else float('inf'), 
+                     client.credits_remaining)
+
+    # Plan calls event by event, and stop at the first event that could go 
+    # over budget so the events that are kept get every market
+    kwargs_list = []
+    planned_cost = 0
     for event in events:
-        odds = api.OddsAPIClient().get_event_odds(sport=sports[sport]['key'],
-                                                  event_id=event['id'],
-                                                  markets=[market_key],
-                                                  bookmakers=bookies)
-        odds_list.append(odds)
-    
-    odds_list = organize_all_market_odds(odds_list, market)
-    odds_handler = FileHandler(f'{market_key}.json', f'data/{sport}/odds/{market_group}')
-    odds_handler.write_file(odds_list)
+        event_cost = len(market_keys) * regions
+        if budget is not None and planned_cost + event_cost > budget:
+            break
+        planned_cost += event_cost
+        for chunk in chunks:
+            kwargs_list.append({'sport': sports[sport]['key'],
+                                'event_id': event['id'],
+                                'markets': chunk,
+                                'bookmakers': bookies})
+    n_naive = len(events) * len(market_keys)
+    n_skipped = len(events) * len(chunks) - len(kwargs_list)
+    if n_skipped > 0:
+        print(f'Skipping {n_skipped} calls, over budget of {budget} credits.')
+
+    n_metrics = len(client.metrics)
+    responses = client.map_requests('get_event_odds', kwargs_list,
+                                    return_exceptions=True)
+
+    # Split combined responses back into one odds list per market
+    odds_lists = {key: [] for key in market_keys}
+    failed_events = []
+    for kwargs, odds in zip(kwargs_list, responses):
+        if isinstance(odds, Exception):
+            if kwargs['event_id'] not in failed_events:
+                failed_events.append(kwargs['event_id'])
+            continue
+        for key in kwargs['markets']:
+            odds_lists[key].append(split_market_odds(odds, key))
+
+    all_odds = []
+    for market in markets:
+        all_odds += organize_all_market_odds(odds_lists[market['key']], market)
+    save_odds(sport, all_odds, markets)
+
+    # Credits reported by the API, cached responses cost nothing
+    credits = [metric['credits'] for metric in client.metrics[n_metrics:]]
+    report = {
+        'calls': len(kwargs_list),
+        'naive_calls': n_naive,
+        'credits': sum(c for c in credits if c is not None),
+        'naive_credits': n_naive * regions,
+        'credits_remaining': client.credits_remaining,
+        'failed_events': failed_events
+    }
+    print(f'{report["calls"]} calls (naive {report["naive_calls"]}), '
+          f'{report["credits"]:g} credits (naive {report["naive_credits"]}).')
+    if len(failed_events) > 0:
+        print(f'Failed to get odds for {len(failed_events)} events: '
+              f'{", ".join(failed_events)}')
+    return report
+
+def split_market_odds(odds: dict, market_key: str):
+    """
+    Given event odds response with several markets, return copy with only 
+    market_key, in the same structure as a single market response.
+    """
+
+    bookmakers = []
+    for bookmaker in odds['bookmakers']:
+        markets = [market for market in bookmaker['markets'] 
+                   if market['key'] == market_key]
+        if len(markets) > 0:
+            bookmakers.append({**bookmaker, 'markets': markets})
+    return {**odds, 'bookmakers': bookmakers}
 
 def organize_all_market_odds(odds, market_dict):
     new_odds = []
+    rejected = []
     for event in odds:
         # For totals markets, there is another list structure around a single dict
         if type(event) is list:
@@ -533,8 +924,13 @@ def organize_all_market_odds(odds, market_dict):
                         'line': line
                     }
 
-                    new_odds.append(prop)
+                    try:
+                        new_odds.append(nba_schema.type_prop(prop))
+                    except nba_schema.SchemaError as e:
+                        rejected.append(str(e))
     
+    if len(rejected) > 0:
+        print(f'Rejected {len(rejected)} malformed props, first: {rejected[0]}')
     return new_odds
 
 def convert_utc_to_est(date_str: str):
@@ -585,7 +981,6 @@ if __name__ == "__main__":
     
     #markets_handler = FileHandler('api_keys_player_prop_markets.json', 'data/nba/odds')
     #markets = markets_handler.load_file()
-    #for market in markets[1:13]:
-        #get_additional_market_odds('nba', market)
+    #get_additional_markets_odds('nba', markets[1:13])
 
     get_player_injuries('nba')
@@ -1,23 +1,324 @@
 import requests
 import json
+import os
+import time
+import hashlib
+import asyncio
+import threading
+from collections import OrderedDict
 from datetime import datetime, timezone, timedelta
 from file_handler import FileHandler
 
 
+class TokenBucket:
+    def __init__(self, rate: int, per: float=60, capacity: int=None):
+        """
+        Token bucket rate limiter, safe to share between threads.\n
+        rate = number of requests allowed per 'per' seconds\n
+        capacity = max burst size (default rate)
+        """
+
+        self.rate = rate / per
+        self.capacity = capacity if capacity is not None else rate
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        """Block until a token is available, then take it."""
+
+        with self.lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, 
+                                  self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                time.sleep((1 - self.tokens) / self.rate)
+
+
+class ResponseCache:
+    def __init__(self, file_path: str, max_bytes: int=500_000_000, 
+                 cache_only: bool=False):
+        """
+        On-disk cache of API responses, one json file per request. Least 
+        recently used files are deleted once the cache is over max_bytes. 
+        File sizes and use order are kept in memory, the folder is only 
+        listed on the first put.\n
+        cache_only = if True, never use the network. Cached responses are 
+        returned regardless of age (offline mode).
+        """
+
+        self.file_path = file_path
+        self.max_bytes = max_bytes
+        self.cache_only = cache_only
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+        self.entries = None # File name -> size, least recently used first
+        self.total_bytes = 0
+        os.makedirs(file_path, exist_ok=True)
+
+    def get_key(self, url: str, params: dict):
+        """
+        Return cache key for url and params. Params are sorted and API keys 
+        are left out, so the key doesn't change with parameter order or key.
+        """
+
+        norm_params = sorted((str(k), str(v)) for k, v in params.items() 
+                             if k != 'apiKey' and v not in [None, '', []])
+        return hashlib.sha1(repr((url, norm_params)).encode()).hexdigest()
+
+    def get(self, url: str, params: dict, ttl: float):
+        """
+        Return cached response if one exists and is younger than ttl seconds
+        (or cache_only is set), else None.
+        """
+
+        file_name = self.get_key(url, params) + '.json'
+        fp = os.path.join(self.file_path, file_name)
+        try:
+            age = time.time() - os.path.getmtime(fp)
+            if not self.cache_only and age > ttl:
+                self.misses += 1
+                return None
+            cached = FileHandler(file_name, self.file_path).load_file()
+            # Update access time for LRU eviction, keep mtime as time stored.
+            # Another thread may have evicted the file since it was loaded
+            os.utime(fp, (time.time(), os.path.getmtime(fp)))
+        except (FileNotFoundError, json.JSONDecodeError):
+            self.misses += 1
+            return None
+        with self.lock:
+            if self.entries is not None and file_name in self.entries:
+                self.entries.move_to_end(file_name)
+        self.hits += 1
+        return cached['response']
+
+    def put(self, url: str, params: dict, response):
+        """Store response, then evict least recently used files if needed."""
+
+        file_name = self.get_key(url, params) + '.json'
+        params = {k: v for k, v in params.items() if k != 'apiKey'}
+        FileHandler(file_name, self.file_path).write_file({
+            'url': url,
+            'params': params,
+            'response': response
+        })
+        size = os.path.getsize(os.path.join(self.file_path, file_name))
+        with self.lock:
+            if self.entries is None:
+                # New file is listed with the rest
+                self.__load_entries()
+            else:
+                self.total_bytes += size - self.entries.pop(file_name, 0)
+                self.entries[file_name] = size
+            self.__evict_entries()
+
+    def evict(self):
+        """
+        List the folder again, then delete least recently accessed files 
+        until under max_bytes.
+        """
+
+        with self.lock:
+            self.__load_entries()
+            self.__evict_entries()
+
+    def __load_entries(self):
+        """Read sizes and access order of the cached files."""
+
+        files = []
+        for file in os.listdir(self.file_path):
+            stat = os.stat(os.path.join(self.file_path, file))
+            files.append((stat.st_atime, file, stat.st_size))
+        files.sort()
+        self.entries = OrderedDict((file, size) for _, file, size in files)
+        self.total_bytes = sum(self.entries.values())
+
+    def __evict_entries(self):
+        """Delete least recently used files until under max_bytes."""
+
+        while self.total_bytes > self.max_bytes and len(self.entries) > 0:
+            file, size = self.entries.popitem(last=False)
+            try:
+                os.remove(os.path.join(self.file_path, file))
+            except FileNotFoundError:
+                pass
+            self.total_bytes -= size
+
+
+class APIRequestError(Exception):
+    """Raised when a request still fails after all retries."""
+
+
 class APIClient:
-    def __init__(self):
-        pass
+    def __init__(self, retries: int=3, backoff: float=1, timeout: float=30,
+                 pool_size: int=10):
+        """
+        Shared HTTP session with keep-alive connection pooling.\n
+        retries = retries on 429, 5xx and connection errors\n
+        backoff = seconds before first retry, doubles each retry. Retry-After
+        header is used instead, if the server sends one.\n
+        timeout = seconds to wait for a response\n
+        pool_size = max connections kept open per host
+        """
+
+        self.retries = retries
+        self.backoff = backoff
+        self.limiter = None # TokenBucket, applied to network requests only
+        self.cache = None # ResponseCache
+        self.recorder = None # ResponseRecorder, saves responses as fixtures
+        self.timeout = timeout
+        self.retry_statuses = [429, 500, 502, 503, 504]
+        self.metrics = [] # One dict per request, see get_request
+        self.credits_remaining = None # From usage headers, if API sends them
+        self.session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(pool_connections=pool_size, 
+                                                pool_maxsize=pool_size)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+    def map_requests(self, method: str, kwargs_list: list, 
+                     return_exceptions: bool=False):
+        """
+        Call client method once for each dict of keyword arguments in 
+        kwargs_list, with requests in flight concurrently up to 
+        self.max_concurrency. get_request applies self.limiter to each request.
+        Return list of results in the same order as kwargs_list.\n
+        return_exceptions = if True, failed calls return their exception 
+        instead of raising, so completed results are not lost\n
+        Ex.) map_requests('get_player_stats', [{'team': 1, 'season': 2023}, 
+        {'team': 2, 'season': 2023}])
+        """
+
+        return asyncio.run(self.__map_requests_async(method, kwargs_list,
+                                                     return_exceptions))
+
+    async def __map_requests_async(self, method: str, kwargs_list: list,
+                                   return_exceptions: bool):
+        loop = asyncio.get_running_loop()
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+        func = getattr(self, method)
+
+        async def call(kwargs):
+            async with semaphore:
+                # Requests are blocking, so run them in executor threads
+                return await loop.run_in_executor(None, 
+                                                  lambda: func(**kwargs))
+
+        return await asyncio.gather(*[call(kwargs) for kwargs in kwargs_list],
+                                    return_exceptions=return_exceptions)
 
     def get_request(self, url, params):
-        """Return JSON given API url and appropriate parameters."""
+        """
+        Return JSON given API url and appropriate parameters. Cached response 
+        is used if it is within the endpoint's TTL. Retry with exponential 
+        backoff on 429, 5xx and connection errors, and raise APIRequestError 
+        if the request still fails.
+        """
 
-        r = requests.get(url, headers=self.headers, params=params)
-        
-        if r.status_code == 200:
-            return r.json()
+        ttl = self.get_cache_ttl(url, params)
+        if self.cache is not None and ttl is not None:
+            cached = self.cache.get(url, params, ttl)
+            if cached is not None:
+                return cached
+            if self.cache.cache_only:
+                raise APIRequestError(f'No cached response for {url} {params}')
+
+        start = time.perf_counter()
+        status = None
+        for attempt in range(self.retries + 1):
+            wait = self.backoff * 2**attempt
+            if self.limiter is not None:
+                self.limiter.acquire()
+            try:
+                r = self.session.get(url, headers=self.headers, params=params,
+                                     timeout=self.timeout)
+                status = r.status_code
+                if status == 200:
+                    self.__add_metric(url, status, attempt + 1, start, 
+                                      r.headers)
+                    response = r.json()
+                    self.check_response(url, response)
+                    if self.recorder is not None:
+                        self.recorder.record(self.base_url, url, params, 
+                                             response, r.headers)
+                    if self.cache is not None and ttl is not None:
+                        self.cache.put(url, params, response)
+                    return response
+                if status not in self.retry_statuses:
+                    break
+                wait = self.__get_retry_after(r, wait)
+            except (requests.ConnectionError, requests.Timeout):
+                status = None
+            if attempt < self.retries:
+                time.sleep(wait)
+
+        self.__add_metric(url, status, attempt + 1, start)
+        raise APIRequestError(f'Request to {url} failed with status: {status}')
+
+    def get_cache_ttl(self, url: str, params: dict):
+        """
+        Return seconds a cached response for url stays valid, float('inf') 
+        if it never changes, or None to never cache. Override per API.
+        """
+
+        return None
+
+    def check_response(self, url: str, response):
+        """
+        Raise APIRequestError if a 200 response reports an error in its body, 
+        so it is never cached or saved. Override per API.
+        """
+
+        pass
+
+    def __get_retry_after(self, r: requests.Response, default: float):
+        """Return seconds from Retry-After header, or default if not set."""
+
+        try:
+            return float(r.headers['Retry-After'])
+        except (KeyError, ValueError):
+            return default
+
+    def __add_metric(self, url: str, status: int, attempts: int, 
+                     start: float, headers: dict={}):
+        # Usage quota headers are only sent by The Odds API
+        credits = headers.get('x-requests-last')
+        remaining = headers.get('x-requests-remaining')
+        if remaining is not None:
+            self.credits_remaining = float(remaining)
+        self.metrics.append({
+            'url': url,
+            'status': status,
+            'attempts': attempts,
+            'seconds': time.perf_counter() - start,
+            'credits': float(credits) if credits is not None else None
+        })
+
+    def get_metrics_summary(self):
+        """
+        Return dict with number of requests, retries, failures and latency 
+        stats (seconds) for all requests made by this client.
+        """
 
-        print('Request failed with status:', r.status_code)
-        return {}
+        latencies = sorted(m['seconds'] for m in self.metrics)
+        if len(latencies) == 0:
+            return {'requests': 0}
+        return {
+            'requests': len(self.metrics),
+            'retries': sum(m['attempts'] - 1 for m in self.metrics),
+            'failures': sum(1 for m in self.metrics if m['status'] != 200),
+            'mean': sum(latencies) / len(latencies),
+            'p50': latencies[len(latencies) // 2],
+            'p95': latencies[int(len(latencies) * 0.95)],
+            'max': latencies[-1],
+            'credits': sum(m['credits'] for m in self.metrics 
+                           if m['credits'] is not None)
+        }
     
     def get_params(self, keys, values):
         """
@@ -34,10 +335,23 @@ class APIClient:
 
 
 class NBAStatsAPIClient(APIClient):
-    def __init__(self):
-        self.base_url = 'https://api-nba-v1.p.rapidapi.com'
-        self.key = self.__init_key()
+    def __init__(self, rate_limit: int=10, max_concurrency: int=4, 
+                 base_url: str=None, key: str=None, 
+                 cache: ResponseCache=None):
+        """
+        rate_limit = requests allowed per minute by the API plan\n
+        max_concurrency = max requests in flight at once in map_requests\n
+        base_url, key = override for local stub server (default RapidAPI)\n
+        cache = ResponseCache for responses (default no cache)
+        """
+
+        super().__init__(pool_size=max_concurrency)
+        self.cache = cache
+        self.base_url = base_url or 'https://api-nba-v1.p.rapidapi.com'
+        self.key = key or self.__init_key()
         self.host = 'api-nba-v1.p.rapidapi.com'
+        self.limiter = TokenBucket(rate_limit)
+        self.max_concurrency = max_concurrency
         self.headers = {
                         'X-RapidAPI-Key': self.key,
                         'X-RapidAPI-Host': self.host
@@ -48,6 +362,34 @@ class NBAStatsAPIClient(APIClient):
         keys = key_handler.load_file()
         return keys['data']['nba']['key']
 
+    def get_cache_ttl(self, url: str, params: dict):
+        """
+        Games and player stats for finished seasons never change. Everything
+        else is cached for an hour (day for teams and seasons).
+        """
+
+        endpoint = url.replace(self.base_url, '')
+        if endpoint in ['/seasons', '/teams']:
+            return 24 * 60 * 60
+        if (endpoint in ['/games', '/players/statistics'] and 
+            self.__season_finished(params.get('season'))):
+            return float('inf')
+        return 60 * 60
+
+    def check_response(self, url: str, response):
+        """API-NBA reports errors, like the daily quota, with a 200 status."""
+
+        if response.get('errors'):
+            raise APIRequestError(f'Request to {url} failed: '
+                                  f'{response["errors"]}')
+
+    def __season_finished(self, season):
+        """NBA season yyyy ends in June of yyyy+1, playoffs included."""
+
+        if season is None:
+            return False
+        return datetime.now() > datetime(int(season) + 1, 7, 1)
+
     def get_seasons(self):
         """Return JSON with callable seasons."""
 
@@ -157,9 +499,19 @@ class MLBStatsAPIClient:
 
 
 class OddsAPIClient(APIClient):
-    def __init__(self):
-        self.base_url = 'https://api.the-odds-api.com/v4/sports'
-        self.key = self.__init_key()
+    def __init__(self, max_concurrency: int=4, base_url: str=None, 
+                 key: str=None, cache: ResponseCache=None):
+        """
+        max_concurrency = max requests in flight at once in map_requests\n
+        base_url, key = override for local stub server (default The Odds API)\n
+        cache = ResponseCache for responses (default no cache)
+        """
+
+        super().__init__(pool_size=max_concurrency)
+        self.cache = cache
+        self.max_concurrency = max_concurrency
+        self.base_url = base_url or 'https://api.the-odds-api.com/v4/sports'
+        self.key = key or self.__init_key()
         self.headers = None
 
     def __init_key(self):
@@ -167,6 +519,13 @@ class OddsAPIClient(APIClient):
         keys = key_handler.load_file()
         return keys['odds']['key']
 
+    def get_cache_ttl(self, url: str, params: dict):
+        """Odds move quickly, cache for one minute (events for five)."""
+
+        if url.endswith('/events'):
+            return 5 * 60
+        return 60
+
     def get_sports(self, all: str='false'):
         """
         Return a json containing info on in-season sports. Set all = 'true' (str) 
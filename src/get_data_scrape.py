@@ -1,43 +1,184 @@
 import requests
-from bs4 import BeautifulSoup
+from bs4 import BeautifulSoup, SoupStrainer
 
+import os
+import json
 import time
+import hashlib
 from random import randint
 
-# Request webpage and use .text to return the content of the response in Unicode, not bytes like .content would
-# then remove comments so we can access all tables. Give to BeautifulSoup to create our soup object.
-# Pause for a few moments so we don't go beyond website access limit
-def get_soup(url: str) -> BeautifulSoup:
+# lxml is optional, BeautifulSoup with html.parser is used without it
+try:
+    import lxml.html
+except ImportError:
+    lxml = None
+
+
+class PageCache:
+    def __init__(self, file_path: str='data/cache/scrape', ttl: float=15*60):
+        """
+        Cache of scraped pages. Pages are reused without a request for ttl
+        seconds, then revalidated with a conditional request (ETag and
+        Last-Modified), so an unchanged page is not downloaded again.
+        """
+
+        self.file_path = file_path
+        self.ttl = ttl
+        os.makedirs(file_path, exist_ok=True)
+
+    def get_page(self, url: str, headers: dict):
+        """
+        Return tuple (page text, True if a request was sent to the site).
+        """
+
+        key = hashlib.sha1(url.encode()).hexdigest()
+        page_fp = os.path.join(self.file_path, f'{key}.html')
+        meta_fp = os.path.join(self.file_path, f'{key}.json')
+
+        meta = None
+        if os.path.exists(page_fp) and os.path.exists(meta_fp):
+            with open(meta_fp) as f:
+                meta = json.load(f)
+            if time.time() - meta['fetched'] < self.ttl:
+                return self.__read(page_fp), False
+
+        headers = dict(headers)
+        if meta is not None:
+            if meta.get('etag'):
+                headers['If-None-Match'] = meta['etag']
+            if meta.get('last_modified'):
+                headers['If-Modified-Since'] = meta['last_modified']
+
+        r = requests.get(url, headers=headers)
+        if r.status_code == 304 and meta is not None:
+            text = self.__read(page_fp)
+        else:
+            r.raise_for_status()
+            text = r.text
+            with open(page_fp, 'w', encoding='utf-8') as f:
+                f.write(text)
+
+        meta = {
+            'url': url,
+            'fetched': time.time(),
+            'etag': r.headers.get('ETag', meta and meta.get('etag')),
+            'last_modified': r.headers.get('Last-Modified',
+                                           meta and meta.get('last_modified'))
+        }
+        with open(meta_fp, 'w') as f:
+            json.dump(meta, f)
+        return text, True
+
+    def __read(self, page_fp: str):
+        with open(page_fp, encoding='utf-8') as f:
+            return f.read()
+
+
+page_cache = None
+
+
+def get_page(url: str) -> str:
+    """
+    Return page text from cache, or request it. Pause for a few moments only
+    after a request actually went to the site, so we don't go beyond website
+    access limit.
+    """
+
+    global page_cache
+    if page_cache is None:
+        page_cache = PageCache()
+
     headers = requests.utils.default_headers()
     headers.update({
         'User-Agent': 'Mozilla/5.0 (X11; Ubuntu; Linux x86_64; rv:52.0) Gecko/20100101 Firefox/52.0',
     })
 
-    r = requests.get(url, headers=headers).text.replace("<!--","").replace("-->","")
-    time.sleep(randint(4, 6))
+    text, fetched = page_cache.get_page(url, headers)
+    if fetched:
+        time.sleep(randint(4, 6))
+    return text
+
+# Request webpage and use .text to return the content of the response in Unicode, not bytes like .content would
+# then remove comments so we can access all tables. Give to BeautifulSoup to create our soup object.
+def get_soup(url: str) -> BeautifulSoup:
+    r = get_page(url).replace("<!--","").replace("-->","")
     return BeautifulSoup(r, "html.parser")
 
-# Get a list of dictionaries of player injuries, including player id, game status, practice status, and comments from PFR
-# only includes QB, RB, WR, TE, and K
+# Get a list of dictionaries of player injuries, including player name, game status, and comments from ESPN
 def get_player_injuries(sport: str):
+    page = get_page(f'https://www.espn.com/{sport}/injuries')
+    return parse_player_injuries(page)
+
+def parse_player_injuries(page: str, parser: str=None):
+    """
+    Return list of injury dicts from ESPN injuries page text. Only table body
+    rows are parsed.\n
+    parser = 'lxml' or 'html.parser' (default lxml if installed)
+    """
+
+    if parser is None:
+        parser = 'lxml' if lxml is not None else 'html.parser'
+
     injuries = []
-    soup = get_soup(f'https://www.espn.com/{sport}/injuries')
-    for table in soup.find_all('table'):
-        for row in table.find('tbody').find_all('tr'):
-            injury = {}
-            
+    if parser == 'lxml':
+        doc = lxml.html.fromstring(page)
+        for row in doc.xpath('//table/tbody/tr'):
+            td = row.xpath('./td')
+            injuries.append({
+                'name': td[0].text_content(),
+                'status': td[3].xpath('.//span')[0].text_content(),
+                'comment': td[4].text_content()
+            })
+    else:
+        soup = BeautifulSoup(page, 'html.parser',
+                             parse_only=SoupStrainer('tbody'))
+        for row in soup.find_all('tr'):
             td = row.find_all('td')
-            injury['name'] = td[0].get_text()
-            injury['status'] = td[3].find('span').get_text()
-            injury['comment'] = td[4].get_text()
-            
-            injuries.append(injury)
+            injuries.append({
+                'name': td[0].get_text(),
+                'status': td[3].find('span').get_text(),
+                'comment': td[4].get_text()
+            })
 
     return injuries
 
+def benchmark_parse(page_fp: str, n: int=20):
+    """
+    Time injury page parsing for each available parser on a saved page. Also
+    time the old approach (comment strip, full soup, find_all tables).
+    Return dict of parser -> mean seconds per parse.
+    """
+
+    with open(page_fp, encoding='utf-8') as f:
+        page = f.read()
+
+    def parse_full_soup():
+        soup = BeautifulSoup(page.replace("<!--","").replace("-->",""),
+                             "html.parser")
+        return [row for table in soup.find_all('table')
+                for row in table.find('tbody').find_all('tr')]
+
+    parsers = {'full soup': parse_full_soup,
+               'html.parser': lambda: parse_player_injuries(page, 'html.parser')}
+    if lxml is not None:
+        parsers['lxml'] = lambda: parse_player_injuries(page, 'lxml')
+
+    results = {}
+    for name, parse in parsers.items():
+        start = time.perf_counter()
+        for _ in range(n):
+            parse()
+        results[name] = (time.perf_counter() - start) / n
+    return results
+
 
 ## Testing ##
 if __name__ == "__main__":
+    import sys
 
-    print(get_player_injuries('nba'))
-    
\ No newline at end of file
+    # python get_data_scrape.py saved_page.html -> parse benchmark
+    if len(sys.argv) > 1:
+        for name, seconds in benchmark_parse(sys.argv[1]).items():
+            print(f'{name:12} {seconds * 1000:8.2f} ms')
+    else:
+        print(get_player_injuries('nba'))
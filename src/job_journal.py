@@ -0,0 +1,86 @@
+import os
+import hashlib
+import threading
+from datetime import datetime
+
+from file_handler import FileHandler
+
+
+class JobJournal:
+    def __init__(self, name: str, file_path: str='data/jobs'):
+        """
+        Append-only journal of completed job steps, one JSON line per step
+        with the endpoint, params, output file and its content hash. A step
+        counts as done on restart only if its output file still matches the
+        recorded hash.\n
+        name = journal file name, ex.) 'nba_complete_data_reload.jsonl'
+        """
+
+        self.file_path = file_path
+        self.fp = os.path.join(file_path, name)
+        self.lock = threading.Lock()
+        self.steps = {} # step ID -> journal entry
+        os.makedirs(file_path, exist_ok=True)
+        # Every entry is appended and synced to disk as soon as it's recorded
+        self.journal_handler = FileHandler(name, file_path, buffer_size=1,
+                                           sync=True)
+        for entry in self.journal_handler.iter_file():
+            self.steps[entry['step']] = entry
+
+    def is_complete(self, step_id: str):
+        """Return True if step was recorded and its output is unchanged."""
+
+        entry = self.steps.get(step_id)
+        if entry is None:
+            return False
+        if entry['output'] is None:
+            return True
+        return (os.path.exists(entry['output']) and
+                self.get_file_hash(entry['output']) == entry['sha1'])
+
+    def record(self, step_id: str, endpoint: str, params: dict,
+               output: str=None):
+        """
+        Record step as completed. Write only after output file is saved, so
+        a crash mid-step leaves the step to be run again.
+        """
+
+        entry = {
+            'step': step_id,
+            'endpoint': endpoint,
+            'params': params,
+            'output': output,
+            'sha1': self.get_file_hash(output) if output else None,
+            'completed': datetime.now().isoformat()
+        }
+        with self.lock:
+            self.journal_handler.add_to_file(entry)
+            self.steps[step_id] = entry
+
+    def run_step(self, step_id: str, endpoint: str, params: dict,
+                 output: str, func, *args, **kwargs):
+        """
+        Call func(*args, **kwargs) and record the step, unless it is already
+        complete. Return True if func was called.
+        """
+
+        if self.is_complete(step_id):
+            return False
+        func(*args, **kwargs)
+        self.record(step_id, endpoint, params, output)
+        return True
+
+    def clear(self):
+        """Forget all steps, so the next run starts from scratch."""
+
+        with self.lock:
+            if os.path.exists(self.fp):
+                os.remove(self.fp)
+            self.steps = {}
+
+    def get_file_hash(self, file: str):
+        sha1 = hashlib.sha1()
+        with open(file, 'rb') as f:
+            for block in iter(lambda: f.read(1 << 20), b''):
+                sha1.update(block)
+        return sha1.hexdigest()
@@ -0,0 +1,197 @@
+import re
+import unicodedata
+from collections import Counter
+
+from file_handler import FileHandler
+
+
+SUFFIXES = ['jr', 'sr', 'ii', 'iii', 'iv', 'v']
+
+
+def normalise_name(name: str):
+    """
+    Return name in a form that matches how books and sites spell it, ex.)
+    'Dāvis Bertāns' -> 'davis bertans', 'Kelly Oubre Jr.' -> 'kelly oubre',
+    'C.J. McCollum' -> 'cj mccollum', 'Hood-Schifino' -> 'hood schifino'.
+    """
+
+    # Drop accents, then punctuation inside words, then suffixes
+    name = unicodedata.normalize('NFKD', name)
+    name = ''.join(c for c in name if not unicodedata.combining(c)).lower()
+    name = re.sub(r"[.'’`]", '', name)
+    tokens = re.sub(r'[^a-z0-9]+', ' ', name).split()
+    while len(tokens) > 2 and tokens[-1] in SUFFIXES:
+        tokens.pop()
+    return ' '.join(tokens)
+
+def get_trigrams(name: str):
+    """Return set of character trigrams of a normalised name."""
+
+    padded = f'  {name} '
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class NBANameIndex:
+    def __init__(self, players: list, fuzzy_threshold: float=0.75,
+                 fuzzy_margin: float=0.15):
+        """
+        Index of player names for matching props and injuries to players.
+        Names are matched exactly first, then by normalised name, each a dict
+        lookup. Names that still don't match are compared to every known name
+        through a trigram index, and the best candidate is accepted as an
+        alias if it is similar enough.\n
+        players = list of NBAPlayer objects, with alt_names from
+        alt_player_names.json\n
+        fuzzy_threshold = lowest trigram similarity (Dice, 0 to 1) to accept
+        a fuzzy match, None turns fuzzy matching off\n
+        fuzzy_margin = how much better than the best other player the match
+        must be
+        """
+
+        self.players = {player.id: player for player in players}
+        self.fuzzy_threshold = fuzzy_threshold
+        self.fuzzy_margin = fuzzy_margin
+        self.exact = {} # name -> player ID
+        self.normalised = {} # normalised name -> list of player IDs
+        self.trigrams = {} # trigram -> set of normalised names
+        self.n_trigrams = {} # normalised name -> number of trigrams
+        self.unmatched = {} # source -> name -> report dict
+        self.accepted = [] # Fuzzy matches accepted as aliases
+        for player in players:
+            for name in [player.full_name] + player.alt_names:
+                # Earlier players win, same as the old list scan
+                self.exact.setdefault(name, player.id)
+                self.__add_normalised(name, player.id)
+
+    def __add_normalised(self, name: str, player_id: int):
+        normalised = normalise_name(name)
+        ids = self.normalised.setdefault(normalised, [])
+        if player_id not in ids:
+            ids.append(player_id)
+        if normalised not in self.n_trigrams:
+            trigrams = get_trigrams(normalised)
+            self.n_trigrams[normalised] = len(trigrams)
+            for trigram in trigrams:
+                self.trigrams.setdefault(trigram, set()).add(normalised)
+
+    def add_alias(self, name: str, player_id: int):
+        """Resolve name to player_id from now on."""
+
+        self.exact[name] = player_id
+        self.__add_normalised(name, player_id)
+
+    def find_closest(self, name: str):
+        """
+        Return list of (player ID, similarity) for the closest known name of
+        each player sharing trigrams with name, best first.
+        """
+
+        normalised = normalise_name(name)
+        trigrams = get_trigrams(normalised)
+        shared = Counter()
+        for trigram in trigrams:
+            shared.update(self.trigrams.get(trigram, ()))
+
+        best = {} # player ID -> best similarity
+        for known, n_shared in shared.items():
+            similarity = 2 * n_shared / (len(trigrams) +
+                                         self.n_trigrams[known])
+            for player_id in self.normalised[known]:
+                if similarity > best.get(player_id, 0):
+                    best[player_id] = similarity
+        return sorted(best.items(), key=lambda item: -item[1])
+
+    def __match_fuzzy(self, name: str):
+        """
+        Return tuple (player ID if name is a confident fuzzy match else None,
+        closest candidates from find_closest).
+        """
+
+        closest = self.find_closest(name)
+        if self.fuzzy_threshold is None or len(closest) == 0:
+            return None, closest
+        player_id, similarity = closest[0]
+        runner_up = closest[1][1] if len(closest) > 1 else 0
+        if (similarity >= self.fuzzy_threshold and 
+                similarity - runner_up >= self.fuzzy_margin):
+            return player_id, closest
+        return None, closest
+
+    def resolve(self, name: str, source: str=None):
+        """
+        Return NBAPlayer for name, or None. Unresolved names are added to the
+        unmatched report under source, if given.
+        """
+
+        if name is None:
+            return None
+        player_id = self.exact.get(name)
+        if player_id is not None:
+            return self.players[player_id]
+        ids = self.normalised.get(normalise_name(name), [])
+        if len(ids) == 1:
+            return self.players[ids[0]]
+
+        closest = []
+        if len(ids) == 0:
+            player_id, closest = self.__match_fuzzy(name)
+            if player_id is not None:
+                self.add_alias(name, player_id)
+                self.accepted.append({'name': name, 'player_id': player_id,
+                                      'similarity': closest[0][1]})
+                return self.players[player_id]
+
+        if source is not None:
+            report = self.unmatched.setdefault(source, {}).setdefault(name, {
+                'name': name,
+                'normalised': normalise_name(name),
+                'reason': 'ambiguous' if len(ids) > 1 else 'not found',
+                'candidates': ids or [pid for pid, _ in closest[:3]],
+                'similarity': [round(sim, 3) for _, sim in closest[:3]],
+                'count': 0
+            })
+            report['count'] += 1
+        return None
+
+    def get_unmatched(self, source: str=None):
+        """
+        Return list of unmatched name reports for source (default all), most
+        frequent first. Each report has name, normalised, reason ('not found'
+        or 'ambiguous'), candidates (player IDs, the closest by trigram
+        similarity if not found) with their similarity, count and source.
+        """
+
+        sources = [source] if source is not None else list(self.unmatched)
+        reports = [{'source': src, **report} for src in sources
+                   for report in self.unmatched.get(src, {}).values()]
+        return sorted(reports, key=lambda report: -report['count'])
+
+    def save_unmatched(self, file_name: str='unmatched_player_names.json',
+                       file_path: str='data/nba/players'):
+        """Save unmatched name reports, for updating alt_player_names.json."""
+
+        unmatched_handler = FileHandler(file_name, file_path, indent=4)
+        unmatched_handler.write_file(self.get_unmatched())
+
+    def save_aliases(self, file_name: str='alt_player_names.json',
+                     file_path: str='data/nba/players'):
+        """
+        Add accepted fuzzy matches to the alt names file, so they match
+        exactly from now on. The file is hand edited too, so it stays
+        indented. Return number of aliases added.
+        """
+
+        if len(self.accepted) == 0:
+            return 0
+        alt_name_handler = FileHandler(file_name, file_path, indent=4)
+        alt_names = alt_name_handler.load_file()
+        n = 0
+        for match in self.accepted:
+            names = alt_names.setdefault(str(match['player_id']), [])
+            if match['name'] not in names:
+                names.append(match['name'])
+                n += 1
+        if n > 0:
+            alt_name_handler.write_file(alt_names)
+        self.accepted = []
+        return n
@@ -1,7 +1,7 @@
 import pandas as pd
 pd.set_option('display.max_columns', None)
-import timeit
 from datetime import datetime
+from functools import cached_property
 
 from file_handler import FileHandler
 
@@ -11,7 +11,8 @@ class NBAGame:
         # Game info
         self.id = key
         self.season = game['season']
-        self.datetime = datetime.fromisoformat(game['datetime'])
+        self.timestamp = game['timestamp'] # Epoch seconds, for ordering
+        self.iso_datetime = game['datetime']
         self.date = game['date']
         self.time = game['time']
         self.finished = game['finished']
@@ -24,11 +25,17 @@ class NBAGame:
         self.home = NBATeamGamelog(game['home'])
         self.away = NBATeamGamelog(game['away'])
 
+    @cached_property
+    def datetime(self):
+        # Parsed on first use, ordering and cutoffs use self.timestamp
+        return datetime.fromisoformat(self.iso_datetime)
+
 
 class NBATeamGamelog:
     def __init__(self, team_stats: dict):
         # One instance should represent stats from one team, for one game
         self.id = team_stats['id']
+        self.code = team_stats['code']
         self.outcome = team_stats['outcome']
         self.team = None # NBATeam object
         self.player_gamelogs = [] # NBAPlayerGamelog objects for team
@@ -55,6 +62,7 @@ class NBATeam:
         self.players = [] # List of NBAPlayer objects
         self.finished_games = [] # List of NBAGame objects
         self.scheduled_games = [] # List of NBAGame objects
+        self.finished_games_end = None # Point-in-time cutoff index
 
     def get_tot_stats_against(self, stats: list, pos: str='all', 
                               n_games: int=100):
@@ -133,7 +141,7 @@ class NBATeam:
         """
 
         player_gamelogs = []
-        for game in self.finished_games[-n:]:
+        for game in self.finished_games[:self.finished_games_end][-n:]:
             if game.home.id == self.id:
                 player_gamelogs.append(game.away.player_gamelogs)
             else:
@@ -143,7 +151,7 @@ class NBATeam:
     def get_no_of_gp(self, seasons=[], loc='all', opps=[]):
         """Return int representing number of games played meeting parameters"""
 
-        gamelog_list = self.finished_games.copy()
+        gamelog_list = self.finished_games[:self.finished_games_end]
         # Delete games not in seasons
         if len(seasons) > 0:
             gamelog_list = self.__check_season(seasons, gamelog_list)
@@ -199,6 +207,8 @@ class NBAPlayer:
         self.all_positions = []
         self.injury_status = None
         self.gamelog = []
+        self.gamelog_end = None # Point-in-time cutoff index
+        self.point_in_time = None # datetime obj, props after are ignored
         self.team = None
         self.props = []
         self.gp_all = len(self.gamelog)
@@ -223,7 +233,7 @@ class NBAPlayer:
         """
 
         # Make copy of player's gamelogs, then check each parameter
-        gamelog_list = self.gamelog.copy()
+        gamelog_list = self.gamelog[:self.gamelog_end]
         if len(gamelog_list) > 0:
             # Delete games not matching location
             if loc != 'all':
@@ -252,7 +262,7 @@ class NBAPlayer:
     def get_no_of_gp(self, seasons=[], loc='all', opps=[]):
         """Return int representing number of games played meeting parameters"""
 
-        gamelog_list = self.gamelog.copy()
+        gamelog_list = self.gamelog[:self.gamelog_end]
         # Delete games not in seasons
         if len(seasons) > 0:
             gamelog_list = self.__check_season(seasons, gamelog_list)
@@ -335,6 +345,14 @@ class NBAPlayer:
 
         props_list = self.props.copy()
         if len(self.props) > 0:
+            # Delete items not available at point in time, if one is set
+            if self.point_in_time is not None:
+                cutoff = self.point_in_time.timestamp()
+                for i in range(len(props_list) -1, -1, -1):
+                    if (props_list[i].timestamp > cutoff or 
+                        props_list[i].last_update.date() != 
+                        self.point_in_time.date()):
+                        del props_list[i]
             # Delete items not matching market_key
             for i in range(len(props_list) -1, -1, -1):
                 if props_list[i].market_key != market_key:
@@ -364,17 +382,17 @@ class NBAPlayerGamelog:
         self.position = player_stats['pos']
         self.base_position = (self.position[-1] if self.position is not None 
                               else None)
-        self.minutes = int(player_stats['min'].split(':')[0])
+        self.minutes = player_stats['min']
         self.points = player_stats['points']
         self.fgm = player_stats['fgm']
         self.fga = player_stats['fga']
-        self.fgp = float(player_stats['fgp'])
+        self.fgp = player_stats['fgp']
         self.ftm = player_stats['ftm']
         self.fta = player_stats['fta']
-        self.ftp = float(player_stats['ftp'])
+        self.ftp = player_stats['ftp']
         self.tpm = player_stats['tpm']
         self.tpa = player_stats['tpa']
-        self.tpp = float(player_stats['tpp'])
+        self.tpp = player_stats['tpp']
         self.off_reb = player_stats['off_reb']
         self.def_reb = player_stats['def_reb']
         self.tot_reb = player_stats['tot_reb']
@@ -460,12 +478,17 @@ class NBAPlayerProp:
         self.market_key = prop['market_key']
         self.market_name = prop['market_name']
         self.market_abv = prop['market_abv']
-        self.last_update = datetime.fromisoformat(prop['last_update'])
+        self.timestamp = prop['timestamp'] # Epoch seconds of last_update
+        self.iso_last_update = prop['last_update']
         self.player_name = prop['player_name']
         self.name = prop['name']
         self.price = prop['price']
         self.line = prop['line']
 
+    @cached_property
+    def last_update(self):
+        return datetime.fromisoformat(self.iso_last_update)
+
 
 class NBAGameProp:
     def __init__(self, prop: dict):
@@ -517,7 +540,8 @@ if __name__ == "__main__":
         }
     }
 
-    team = NBAGame('123', game)
+    from nba_schema import type_game
+    team = NBAGame('123', type_game(game))
     print(team.datetime)
 
 
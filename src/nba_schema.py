@@ -0,0 +1,218 @@
+import os
+from datetime import datetime
+
+from file_handler import FileHandler
+
+
+# Typed schema for NBA data. Values are converted and checked once at ingest,
+# so loaders can use them as they are:
+#   gamelogs: 'min' int minutes, 'fgp'/'ftp'/'tpp' float, 'plus_minus' int
+#   games: scores int, 'timestamp' epoch seconds of 'datetime'. Quarter and
+#          OT scores that are blank or negative (quarters that don't add up
+#          to the total) are None, a finished game without a total is
+#          rejected.
+#   props: 'price'/'line' numbers, 'timestamp' epoch seconds of 'last_update'.
+#          h2h (moneyline) props have no line, it stays None.
+# Files written before the schema are typed when loaded (see type_games and
+# type_gamelogs), or once for good with this module's __main__.
+
+STAT_FIELDS = ['points', 'fgm', 'fga', 'ftm', 'fta', 'tpm', 'tpa', 'off_reb',
+               'def_reb', 'tot_reb', 'assists', 'fouls', 'steals',
+               'turnovers', 'blocks']
+PERCENT_FIELDS = ['fgp', 'ftp', 'tpp']
+QUARTER_FIELDS = ['q1', 'q2', 'q3', 'q4']
+
+
+class SchemaError(ValueError):
+    pass
+
+
+def to_int(value, field: str, minimum: int=None):
+    """Return value as int, raise SchemaError if it isn't a whole number."""
+
+    if type(value) is bool:
+        raise SchemaError(f'{field}: expected int, got {value!r}')
+    try:
+        number = int(value)
+    except (TypeError, ValueError):
+        raise SchemaError(f'{field}: expected int, got {value!r}') from None
+    if number != value and str(number) != str(value).strip().lstrip('+'):
+        raise SchemaError(f'{field}: expected int, got {value!r}')
+    if minimum is not None and number < minimum:
+        raise SchemaError(f'{field}: {number} is below {minimum}')
+    return number
+
+def to_float(value, field: str, low: float=None, high: float=None):
+    """Return value as float, raise SchemaError if it isn't a number."""
+
+    if type(value) is bool:
+        raise SchemaError(f'{field}: expected number, got {value!r}')
+    try:
+        number = float(value)
+    except (TypeError, ValueError):
+        raise SchemaError(f'{field}: expected number, '
+                          f'got {value!r}') from None
+    if number != number or (low is not None and number < low) or \
+            (high is not None and number > high):
+        raise SchemaError(f'{field}: {value!r} is out of range')
+    return number
+
+def to_minutes(value):
+    """Return whole minutes played from 'MM', 'MM:SS' or an int."""
+
+    if type(value) is int and value >= 0:
+        return value
+    if type(value) is str:
+        return to_int(value.split(':')[0], 'min', minimum=0)
+    raise SchemaError(f'min: expected minutes, got {value!r}')
+
+def to_timestamp(value: str, field: str):
+    """Return epoch seconds of a timezone aware iso datetime string."""
+
+    try:
+        dt = datetime.fromisoformat(value)
+    except (TypeError, ValueError):
+        raise SchemaError(f'{field}: expected iso datetime, '
+                          f'got {value!r}') from None
+    if dt.tzinfo is None:
+        raise SchemaError(f'{field}: {value!r} has no timezone')
+    return dt.timestamp()
+
+def type_player_stat(stat: dict):
+    """
+    Return organized player gamelog (full or normalised) with typed values.
+    Raise SchemaError if a value is missing or malformed.
+    """
+
+    typed = dict(stat)
+    for field in ['player_id', 'team_id']:
+        typed[field] = to_int(stat[field], field, minimum=0)
+    for field in ['firstname', 'lastname']:
+        if type(stat[field]) is not str:
+            raise SchemaError(f'{field}: expected str, got {stat[field]!r}')
+    typed['min'] = to_minutes(stat['min'])
+    for field in STAT_FIELDS:
+        typed[field] = to_int(stat[field], field, minimum=0)
+    for field in PERCENT_FIELDS:
+        typed[field] = to_float(stat[field], field, 0, 100)
+    typed['plus_minus'] = to_int(stat['plus_minus'], 'plus_minus')
+    return typed
+
+def type_game(game: dict):
+    """
+    Return organized game with typed scores and a 'timestamp'. Raise
+    SchemaError if a value is missing or malformed.
+    """
+
+    typed = dict(game)
+    typed['timestamp'] = to_timestamp(game['datetime'], 'datetime')
+    for loc in ['away', 'home']:
+        team = dict(game[loc])
+        score = dict(team['score'])
+        for field in QUARTER_FIELDS + ['ot']:
+            try:
+                score[field] = to_int(score[field], f'{loc} {field}',
+                                      minimum=0)
+            except SchemaError:
+                score[field] = None
+        if score['total'] is not None:
+            score['total'] = to_int(score['total'], f'{loc} total',
+                                    minimum=0)
+        elif game['finished']:
+            raise SchemaError(f'{loc} total: missing for finished game')
+        if team['margin'] is not None:
+            team['margin'] = to_int(team['margin'], f'{loc} margin')
+        team['score'] = score
+        typed[loc] = team
+    return typed
+
+def type_prop(prop: dict):
+    """
+    Return organized prop with numeric price and line and a 'timestamp'.
+    Raise SchemaError if a value is missing or malformed. Line is None for
+    h2h props.
+    """
+
+    typed = dict(prop)
+    typed['price'] = to_float(prop['price'], 'price')
+    if typed['price'].is_integer():
+        typed['price'] = int(typed['price'])
+    if prop['line'] is None and prop['market_key'] == 'h2h':
+        typed['line'] = None
+    else:
+        typed['line'] = to_float(prop['line'], 'line')
+    typed['timestamp'] = to_timestamp(prop['last_update'], 'last_update')
+    return typed
+
+def type_rows(rows: list, type_row, name: str):
+    """
+    Return typed rows, leaving out malformed ones. Rejected rows are
+    reported, not raised, so one bad row doesn't stop an ingest.
+    """
+
+    typed, rejected = [], []
+    for row in rows:
+        try:
+            typed.append(type_row(row))
+        except (SchemaError, KeyError) as e:
+            rejected.append(str(e))
+    if len(rejected) > 0:
+        print(f'Rejected {len(rejected)} malformed {name}, '
+              f'first: {rejected[0]}')
+    return typed
+
+def is_typed_gamelogs(gamelogs: list):
+    return len(gamelogs) == 0 or type(gamelogs[0]['min']) is int
+
+def is_typed_games(games: dict):
+    return len(games) == 0 or 'timestamp' in next(iter(games.values()))
+
+def type_gamelogs(gamelogs: list):
+    """Return gamelogs typed, unchanged if they already are."""
+
+    if is_typed_gamelogs(gamelogs):
+        return gamelogs
+    return type_rows(gamelogs, type_player_stat, 'gamelogs')
+
+def type_games(games: dict):
+    """Return dict of game ID -> game typed, unchanged if it already is."""
+
+    if is_typed_games(games):
+        return games
+    typed = {}
+    for game_id, game in games.items():
+        try:
+            typed[game_id] = type_game(game)
+        except (SchemaError, KeyError) as e:
+            print(f'Rejected malformed game {game_id}: {e}')
+    return typed
+
+def type_props(props: list):
+    """Return props typed, unchanged if they already are."""
+
+    if len(props) == 0 or 'timestamp' in props[0]:
+        return props
+    return type_rows(props, type_prop, 'props')
+
+def upgrade_files(sport: str='nba'):
+    """
+    Rewrite games and gamelog files of sport written before the typed
+    schema. Return number of files rewritten.
+    """
+
+    n = 0
+    for folder, is_typed, convert in [
+            ('games', is_typed_games, type_games),
+            ('players/gamelogs', is_typed_gamelogs, type_gamelogs)]:
+        file_path = f'data/{sport}/{folder}'
+        for file in sorted(os.listdir(file_path)):
+            json_handler = FileHandler(file, file_path)
+            data = json_handler.load_file()
+            if not is_typed(data):
+                json_handler.write_file(convert(data))
+                n += 1
+    return n
+
+
+if __name__ == "__main__":
+    print(f'Typed {upgrade_files()} files.')
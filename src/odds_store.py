@@ -0,0 +1,261 @@
+import os
+import time
+from datetime import datetime
+import numpy as np
+import pandas as pd
+
+from file_handler import FileHandler
+from nba_schema import type_props
+
+
+class OddsStore:
+    def __init__(self, sport: str, file_path: str=None):
+        """
+        Append-only history of odds. Each refresh is saved as a compressed
+        columnar segment holding only the prices that changed, keyed by
+        (event, bookmaker, market, player, side). Props that are no longer
+        offered get a removed row, so the latest snapshot matches what the
+        books showed at the last refresh. The latest snapshot is also saved 
+        on its own (latest.npz), so latest() and append() don't read the 
+        history.\n
+        sport = 'nba', 'nfl', i.e.\n
+        file_path = folder for segments (default data/{sport}/odds/history)
+        """
+
+        self.sport = sport
+        self.file_path = file_path or f'data/{sport}/odds/history'
+        # Alternate markets list several lines per player and side, so their
+        # line is part of the key (NaN for all other markets)
+        self.key_columns = ['event_id', 'bookmaker_key', 'market_key',
+                            'player_name', 'name', 'alt_line']
+        self.prop_columns = ['event_id', 'sport_key', 'sport_name',
+                             'home_team', 'away_team', 'bookmaker_key',
+                             'bookmaker_name', 'market_key', 'market_name',
+                             'market_abv', 'last_update', 'name',
+                             'player_name', 'price', 'line']
+        self.columns = self.prop_columns + ['group', 'alt_line', 'ts',
+                                            'fetched', 'removed']
+        self.data = None # DataFrame of all segments, loaded on first use
+        self.live = None # DataFrame of the latest snapshot, loaded on first use
+
+    def append(self, props: list, markets: list, fetched: float=None):
+        """
+        Save organized props from one refresh of markets. Rows whose price
+        and line are unchanged since the last refresh are dropped. Return
+        number of rows written.\n
+        props = list of typed prop dicts from organize_all_market_odds\n
+        markets = list of market dicts that were refreshed\n
+        fetched = epoch seconds of the refresh (default now)
+        """
+
+        fetched = time.time() if fetched is None else fetched
+        groups = {market['key']: market['group'] for market in markets}
+        new = pd.DataFrame(props, columns=self.prop_columns)
+        new['player_name'] = new['player_name'].fillna('')
+        new['group'] = new['market_key'].map(groups)
+        new['alt_line'] = np.where(
+            new['market_key'].str.endswith('_alternate'), new['line'], np.nan)
+        new['ts'] = [prop['timestamp'] for prop in props]
+        new['fetched'] = fetched
+        new['removed'] = False
+        # Same key twice in one response, keep the bookmaker's last outcome
+        new = new.drop_duplicates(self.key_columns, keep='last')
+
+        live = self.__load_live()
+        live = live[live['market_key'].isin(groups)]
+        merged = new.merge(live[self.key_columns + ['price', 'line']],
+                           on=self.key_columns, how='left',
+                           suffixes=('', '_prev'), indicator=True)
+        # h2h props have no line, a NaN line is unchanged if it still is
+        same_line = ((merged['line'] == merged['line_prev']) |
+                     (merged['line'].isna() & merged['line_prev'].isna()))
+        changed = ((merged['_merge'] == 'left_only') |
+                   (merged['price'] != merged['price_prev']) |
+                   ~same_line).to_numpy()
+        rows = new[changed]
+
+        # Props in the refreshed markets that the books no longer offer
+        gone = live.merge(new[self.key_columns], on=self.key_columns,
+                          how='left', indicator=True)
+        gone = live[(gone['_merge'] == 'left_only').to_numpy()].copy()
+        gone['ts'] = fetched
+        gone['fetched'] = fetched
+        gone['removed'] = True
+
+        rows = pd.concat([rows, gone], ignore_index=True)
+        if len(rows) == 0:
+            return 0
+        n_segments = self.__write_segment(rows)
+        if self.data is not None:
+            self.data = pd.concat([self.data, rows], ignore_index=True)
+        self.live = self.__get_live(pd.concat([self.__load_live(), rows],
+                                              ignore_index=True))
+        self.__write_snapshot(n_segments)
+        return len(rows)
+
+    def load(self):
+        """Return DataFrame with every row of every segment, oldest first."""
+
+        if self.data is not None:
+            return self.data
+
+        frames = []
+        for file in self.__get_segment_files():
+            npz_handler = FileHandler(file, self.file_path)
+            frames.append(pd.DataFrame(npz_handler.load_file()))
+        if len(frames) > 0:
+            self.data = pd.concat(frames, ignore_index=True)[self.columns]
+        else:
+            self.data = self.__get_empty_frame()
+        return self.data
+
+    def latest(self, as_of: datetime=None, group: str=None,
+               market_keys: list=None):
+        """
+        Return list of prop dicts offered at the last refresh before as_of,
+        in the same form as organize_all_market_odds.\n
+        as_of = datetime (default now)\n
+        group = market group, ex.) 'player_props' (default all)\n
+        market_keys = list of market keys (default all)
+        """
+
+        if as_of is None:
+            live = self.__load_live()
+        else:
+            data = self.load()
+            live = self.__get_live(data[data['fetched'] <= as_of.timestamp()])
+        if group is not None:
+            live = live[live['group'] == group]
+        if market_keys is not None:
+            live = live[live['market_key'].isin(market_keys)]
+        return self.__to_props(live)
+
+    def get_movement(self, since: datetime, market_keys: list=None):
+        """
+        Return DataFrame with one row per prop that moved after since, with
+        its line and price then (NaN if it wasn't offered yet) and now, and
+        the number of changes.
+        """
+
+        data = self.load()
+        if market_keys is not None:
+            data = data[data['market_key'].isin(market_keys)]
+        since = since.timestamp()
+        before = data[data['ts'] <= since].drop_duplicates(self.key_columns,
+                                                            keep='last')
+        after = data[data['ts'] > since]
+
+        now = after.drop_duplicates(self.key_columns, keep='last')
+        changes = after.groupby(self.key_columns, dropna=False).size()
+        movement = now.merge(before[self.key_columns + ['line', 'price',
+                                                        'removed']],
+                             on=self.key_columns, how='left',
+                             suffixes=('_now', '_then'))
+        movement = movement.merge(changes.rename('changes').reset_index(),
+                                  on=self.key_columns, how='left')
+        # A prop removed before since wasn't offered then
+        then_removed = movement['removed_then'].fillna(False).astype(bool)
+        movement.loc[then_removed, ['line_then', 'price_then']] = np.nan
+        movement['player_name'] = movement['player_name'].replace('', None)
+        return movement[['event_id', 'home_team', 'away_team',
+                         'bookmaker_key', 'market_key', 'player_name', 'name',
+                         'line_then', 'price_then', 'line_now', 'price_now',
+                         'removed_now', 'changes']]
+
+    def __get_live(self, data: pd):
+        """Return last row of every key, without keys that were removed."""
+
+        last = data.drop_duplicates(self.key_columns, keep='last')
+        return last[~last['removed'].astype(bool)]
+
+    def __load_live(self):
+        """
+        Return the latest snapshot, read from latest.npz if it was saved 
+        after the last segment, else built from all segments and saved.
+        """
+
+        if self.live is not None:
+            return self.live
+
+        n_segments = len(self.__get_segment_files())
+        if os.path.exists(os.path.join(self.file_path, 'latest.npz')):
+            data = FileHandler('latest.npz', self.file_path).load_file()
+            if int(data.pop('segments')[0]) == n_segments:
+                self.live = pd.DataFrame(data)[self.columns]
+                return self.live
+
+        self.live = self.__get_live(self.load())
+        if n_segments > 0:
+            self.__write_snapshot(n_segments)
+        return self.live
+
+    def __get_segment_files(self):
+        if not os.path.exists(self.file_path):
+            return []
+        return sorted(file for file in os.listdir(self.file_path)
+                      if file.startswith('segment_') and file.endswith('.npz'))
+
+    def __get_empty_frame(self):
+        return pd.DataFrame(columns=self.columns).astype({
+            'price': float, 'line': float, 'alt_line': float, 'ts': float,
+            'fetched': float, 'removed': bool})
+
+    def __to_props(self, rows: pd):
+        props = []
+        for row in rows[self.prop_columns + ['ts']].to_dict('records'):
+            # ts of a live row is the epoch seconds of its last_update
+            row['timestamp'] = row.pop('ts')
+            row['player_name'] = row['player_name'] or None
+            if np.isnan(row['line']):
+                row['line'] = None
+            if float(row['price']).is_integer():
+                row['price'] = int(row['price'])
+            props.append(row)
+        return props
+
+    def __write_segment(self, rows: pd):
+        """Save rows as the next segment, return number of segments."""
+
+        os.makedirs(self.file_path, exist_ok=True)
+        n = len(self.__get_segment_files())
+        npz_handler = FileHandler(f'segment_{n:06d}.npz', self.file_path)
+        npz_handler.write_file(self.__to_arrays(rows))
+        return n + 1
+
+    def __write_snapshot(self, n_segments: int):
+        """Save the latest snapshot, as of the first n_segments segments."""
+
+        data = self.__to_arrays(self.live[self.columns])
+        data['segments'] = np.array([n_segments])
+        FileHandler('latest.npz', self.file_path).write_file(data)
+
+    def __to_arrays(self, rows: pd):
+        data = {}
+        for column in rows.columns:
+            values = rows[column].to_numpy()
+            if values.dtype == object:
+                values = values.astype(str)
+            elif column in ['removed']:
+                values = values.astype(bool)
+            else:
+                values = values.astype(float)
+            data[column] = values
+        return data
+
+
+if __name__ == "__main__":
+    # Import the current odds json files as the first snapshot
+    store = OddsStore('nba')
+    for group in ['core', 'player_props']:
+        markets_handler = FileHandler(
+            'api_keys_core_markets.json' if group == 'core' else
+            'api_keys_player_prop_markets.json',
+            'src' if group == 'core' else 'data/nba/odds')
+        markets = markets_handler.load_file()
+        props = []
+        for market in markets:
+            file_path = f'data/nba/odds/{group}'
+            if os.path.exists(os.path.join(file_path, f'{market["key"]}.json')):
+                odds_handler = FileHandler(f'{market["key"]}.json', file_path)
+                props += type_props(odds_handler.load_file())
+        print(group, store.append(props, markets), 'rows')
@@ -0,0 +1,191 @@
+import os
+import hashlib
+import numpy as np
+
+from nba_objects import NBATeam
+from file_handler import FileHandler
+
+
+class NBAOnOffMatrix:
+    def __init__(self, teams: list, stats: list, seasons: list):
+        """
+        On/off matrix for every team. For each rostered player and each
+        teammate, hold the player's stat averages and games played with and
+        without that teammate.\n
+        teams = list of NBATeam objects (players and games connected)\n
+        stats = list of str_to_stat strings\n
+        seasons = list of int, only games in these seasons are used
+        """
+
+        self.teams = teams
+        self.stats = stats
+        self.seasons = seasons
+        self.file_name = 'nba_on_off_matrix.npz'
+        self.file_path = 'data/nba/teams'
+        self.version = self.__get_dataset_version()
+        self.matrix = {} # team ID -> dict of arrays
+
+    def load_or_build(self):
+        """
+        Load matrix from file if it was built from the same dataset version,
+        otherwise build it and save it.
+        """
+
+        if os.path.exists(os.path.join(self.file_path, self.file_name)):
+            npz_handler = FileHandler(self.file_name, self.file_path)
+            data = npz_handler.load_file()
+            if str(data['version']) == self.version:
+                self.__from_flat_dict(data)
+                return
+
+        self.build()
+        npz_handler = FileHandler(self.file_name, self.file_path)
+        npz_handler.write_file(self.__to_flat_dict())
+
+    def build(self):
+        """Build on/off matrix for all teams."""
+
+        for team in self.teams:
+            self.matrix[team.id] = self.__build_team(team)
+
+    def get_with_without(self, player_id: int, teammate_id: int, stat: str):
+        """
+        Return dict with player's average and games played with and without
+        teammate for stat, or None if either player is not on the same team's
+        roster. Averages are None when there are no games.
+        """
+
+        entry = self.__find_player(player_id)
+        if entry is None or teammate_id not in entry['player_ids']:
+            return None
+        i = entry['player_ids'].index(player_id)
+        j = entry['player_ids'].index(teammate_id)
+        k = self.stats.index(stat)
+        return {
+            'avg_with': self.__none_if_nan(entry['avg_with'][i, j, k]),
+            'gp_with': int(entry['n_with'][i, j]),
+            'avg_without': self.__none_if_nan(entry['avg_without'][i, j, k]),
+            'gp_without': int(entry['n_without'][i, j])
+        }
+
+    def get_stat_average(self, player_id: int, stat: str,
+                         without_player: list=[], with_player: list=[]):
+        """
+        Return tuple (average, games played) for player's stat in games
+        where none of without_player and all of with_player played. Use for
+        any injury combination.\n
+        with/without_player inputs must be list of player IDs.
+        """
+
+        entry = self.__find_player(player_id)
+        if entry is None:
+            return None, 0
+        ids = entry['player_ids']
+        i = ids.index(player_id)
+        k = self.stats.index(stat)
+
+        presence = entry['presence']
+        mask = presence[:, i].copy()
+        for pl_id in without_player:
+            if pl_id in ids:
+                mask &= ~presence[:, ids.index(pl_id)]
+        for pl_id in with_player:
+            if pl_id in ids:
+                mask &= presence[:, ids.index(pl_id)]
+            else:
+                mask[:] = False
+
+        gp = int(mask.sum())
+        if gp == 0:
+            return None, 0
+        return float(entry['stat_log'][i, mask, k].mean()), gp
+
+    def __build_team(self, team: NBATeam):
+        """
+        Return dict of arrays for one team, where presence is (games x
+        players) and stat_log is (players x games x stats).
+        """
+
+        player_ids = [player.id for player in team.players]
+        index = {pl_id: i for i, pl_id in enumerate(player_ids)}
+        games = [game for game in team.finished_games
+                 if game.season in self.seasons]
+
+        presence = np.zeros((len(games), len(player_ids)), dtype=bool)
+        stat_log = np.zeros((len(player_ids), len(games), len(self.stats)))
+        for g, game in enumerate(games):
+            team_log = game.home if game.home.id == team.id else game.away
+            for gamelog in team_log.player_gamelogs:
+                i = index.get(gamelog.player_id)
+                if i is None:
+                    continue
+                presence[g, i] = True
+                stat_log[i, g] = [gamelog.string_to_stat(stat)
+                                  for stat in self.stats]
+
+        # Games played together, and stat sums with each teammate on court
+        pres = presence.astype(float)
+        n_with = pres.T @ pres
+        n_played = np.diag(n_with)
+        n_without = n_played[:, np.newaxis] - n_with
+        sums_with = np.einsum('gq,pgk->pqk', pres, stat_log)
+        sums_without = stat_log.sum(axis=1)[:, np.newaxis, :] - sums_with
+
+        with np.errstate(divide='ignore', invalid='ignore'):
+            avg_with = sums_with / n_with[..., np.newaxis]
+            avg_without = sums_without / n_without[..., np.newaxis]
+
+        return {
+            'player_ids': player_ids,
+            'presence': presence,
+            'stat_log': stat_log,
+            'n_with': n_with.astype(int),
+            'n_without': n_without.astype(int),
+            'avg_with': avg_with,
+            'avg_without': avg_without
+        }
+
+    def __find_player(self, player_id: int):
+        for entry in self.matrix.values():
+            if player_id in entry['player_ids']:
+                return entry
+        return None
+
+    def __get_dataset_version(self):
+        """
+        Return hash of game, gamelog and player (rosters) file names, sizes
+        and modified times, along with stats and seasons used.
+        """
+
+        version = hashlib.sha1()
+        version.update(repr((self.stats, self.seasons)).encode())
+        files = []
+        for file_path in ['data/nba/games', 'data/nba/players/gamelogs']:
+            for file in sorted(os.listdir(file_path)):
+                files.append(os.path.join(file_path, file))
+        files.append('data/nba/players/nba_players.json')
+        for file in files:
+            stat = os.stat(file)
+            version.update(f'{file}:{stat.st_size}:{stat.st_mtime_ns}'
+                           .encode())
+        return version.hexdigest()
+
+    def __to_flat_dict(self):
+        data = {'version': np.array(self.version)}
+        for team_id, entry in self.matrix.items():
+            for key, value in entry.items():
+                data[f'{team_id}_{key}'] = np.asarray(value)
+        return data
+
+    def __from_flat_dict(self, data: dict):
+        self.matrix = {}
+        for team in self.teams:
+            entry = {}
+            for key in ['player_ids', 'presence', 'stat_log', 'n_with',
+                        'n_without', 'avg_with', 'avg_without']:
+                entry[key] = data[f'{team.id}_{key}']
+            entry['player_ids'] = entry['player_ids'].tolist()
+            self.matrix[team.id] = entry
+
+    def __none_if_nan(self, value: float):
+        return None if np.isnan(value) else float(value)
@@ -0,0 +1,300 @@
+import os
+import gc
+import sys
+import time
+import atexit
+import functools
+import threading
+import tracemalloc
+from contextlib import nullcontext
+from datetime import datetime
+
+from file_handler import FileHandler
+
+
+class Profiler:
+    def __init__(self):
+        """
+        Phase timer. Phases nest, so each is recorded under its full stack,
+        ex.) 'NBADataAnalysis.__init__;NBADataAnalysis.__init_games', with
+        call count, total and self time. Off by default, timed functions and
+        phases then only check self.enabled.
+        """
+
+        self.enabled = False
+        self.report_dir = None
+        self.lock = threading.Lock()
+        self.local = threading.local() # Stack of open phases per thread
+        self.phases = {} # stack tuple -> [calls, total s, children s]
+        self.exit_registered = False
+        # Memory mode, checkpoints are taken after phases marked checkpoint
+        self.memory = False
+        self.checkpoints = [] # Memory checkpoint dicts, oldest first
+        self.n_top = 10
+        self.memory_types = ['NBAGame', 'NBATeamGamelog', 'NBAPlayerGamelog',
+                             'NBAPlayer', 'NBAPlayerProp', 'DataFrame']
+
+    def enable(self, report_dir: str='data/profiles', memory: bool=False):
+        """
+        Start recording. A report is written to report_dir when the program
+        exits (None to only keep it in memory).\n
+        memory = also trace allocations with tracemalloc and take a memory
+        checkpoint after marked phases. Tracing slows everything down, so
+        phase times in memory mode are inflated.
+        """
+
+        self.enabled = True
+        self.report_dir = report_dir
+        if memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+        self.memory = memory
+        if report_dir is not None and not self.exit_registered:
+            atexit.register(self.write_report)
+            self.exit_registered = True
+
+    def disable(self):
+        self.enabled = False
+        if self.memory:
+            tracemalloc.stop()
+            self.memory = False
+
+    def reset(self):
+        with self.lock:
+            self.phases = {}
+            self.checkpoints = []
+
+    def checkpoint(self, label: str):
+        """
+        Record memory use now, in memory mode: traced and peak bytes, peak
+        RSS, bytes retained by each of memory_types and the top allocation
+        sites of memory still held.
+        """
+
+        if not self.memory:
+            return
+        gc.collect()
+        current, peak = tracemalloc.get_traced_memory()
+        top = tracemalloc.take_snapshot().filter_traces([
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, __file__)]).statistics('lineno')
+        # Sites relative to the working directory, so reports from different
+        # checkouts can be compared
+        sites = [{'site': f'{os.path.relpath(stat.traceback[0].filename)}:'
+                          f'{stat.traceback[0].lineno}',
+                  'bytes': stat.size, 'blocks': stat.count}
+                 for stat in top[:self.n_top]]
+        self.checkpoints.append({
+            'label': label,
+            'traced_bytes': current,
+            'traced_peak_bytes': peak,
+            'rss_peak_bytes': get_peak_rss(),
+            'types': self.__get_type_sizes(),
+            'top_sites': sites
+        })
+
+    def __get_type_sizes(self):
+        """
+        Return dict of type name -> count and shallow bytes (object and its
+        __dict__, deep memory usage for DataFrames) of live memory_types.
+        """
+
+        sizes = {name: {'count': 0, 'bytes': 0} for name in self.memory_types}
+        for obj in gc.get_objects():
+            name = type(obj).__name__
+            if name not in sizes:
+                continue
+            if name == 'DataFrame':
+                size = int(obj.memory_usage(index=True, deep=True).sum())
+            else:
+                size = sys.getsizeof(obj)
+                if hasattr(obj, '__dict__'):
+                    size += sys.getsizeof(obj.__dict__)
+            sizes[name]['count'] += 1
+            sizes[name]['bytes'] += size
+        return sizes
+
+    def phase(self, name: str):
+        """Context manager timing the with block as phase name."""
+
+        if not self.enabled:
+            return nullcontext()
+        return _Phase(self, name)
+
+    def push(self, name: str):
+        stack = getattr(self.local, 'stack', None)
+        if stack is None:
+            stack = self.local.stack = []
+        stack.append([name, time.perf_counter(), 0.0])
+
+    def pop(self):
+        stack = self.local.stack
+        name, start, children = stack.pop()
+        elapsed = time.perf_counter() - start
+        key = tuple(frame[0] for frame in stack) + (name,)
+        if len(stack) > 0:
+            stack[-1][2] += elapsed
+        with self.lock:
+            entry = self.phases.setdefault(key, [0, 0.0, 0.0])
+            entry[0] += 1
+            entry[1] += elapsed
+            entry[2] += children
+
+    def get_report(self):
+        """
+        Return list of phase dicts (stack, phase, depth, calls, total_s,
+        self_s, mean_ms), slowest first.
+        """
+
+        with self.lock:
+            phases = dict(self.phases)
+        report = []
+        for key, (calls, total, children) in phases.items():
+            report.append({
+                'stack': ';'.join(key),
+                'phase': key[-1],
+                'depth': len(key) - 1,
+                'calls': calls,
+                'total_s': total,
+                'self_s': total - children,
+                'mean_ms': total / calls * 1000
+            })
+        return sorted(report, key=lambda phase: -phase['total_s'])
+
+    def get_folded(self):
+        """
+        Return report as folded stacks, one 'a;b;c microseconds' line per
+        stack with its self time, for flamegraph.pl or speedscope.
+        """
+
+        return ''.join(f'{phase["stack"]} {round(phase["self_s"] * 1e6)}\n'
+                       for phase in self.get_report())
+
+    def write_report(self, name: str=None):
+        """
+        Write report as {name}.json and {name}.folded in report_dir. Return
+        path of the json report, None if nothing was recorded.
+        """
+
+        if self.report_dir is None or len(self.phases) == 0:
+            return None
+        name = name or datetime.now().strftime('profile_%Y%m%d_%H%M%S')
+        os.makedirs(self.report_dir, exist_ok=True)
+        report_handler = FileHandler(f'{name}.json', self.report_dir,
+                                     indent=4)
+        report_handler.write_file({'pid': os.getpid(),
+                                   'created': datetime.now().isoformat(),
+                                   'phases': self.get_report(),
+                                   'memory': self.checkpoints})
+        with open(os.path.join(self.report_dir, f'{name}.folded'), 'w') as f:
+            f.write(self.get_folded())
+        return report_handler.fp
+
+
+class _Phase:
+    def __init__(self, profiler: Profiler, name: str):
+        self.profiler = profiler
+        self.name = name
+
+    def __enter__(self):
+        self.profiler.push(self.name)
+        return self
+
+    def __exit__(self, *args):
+        self.profiler.pop()
+
+
+def get_peak_rss():
+    """Return peak resident set size of this process in bytes, or None."""
+
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kB on Linux, bytes on macOS
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+
+profiler = Profiler()
+
+
+def timed(func=None, checkpoint: bool=False):
+    """
+    Decorator recording each call of func as a phase named by qualname. With
+    checkpoint=True a memory checkpoint is taken after each call in memory
+    mode, ex.) @timed(checkpoint=True)
+    """
+
+    if func is None:
+        return functools.partial(timed, checkpoint=checkpoint)
+    name = func.__qualname__
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        if not profiler.enabled:
+            return func(*args, **kwargs)
+        profiler.push(name)
+        try:
+            return func(*args, **kwargs)
+        finally:
+            profiler.pop()
+            if checkpoint:
+                profiler.checkpoint(name)
+    return wrapper
+
+def phase(name: str):
+    """Context manager timing a block as phase name, if profiling is on."""
+
+    return profiler.phase(name)
+
+def checkpoint(label: str):
+    """Take a memory checkpoint labelled label, if memory mode is on."""
+
+    profiler.checkpoint(label)
+
+def diff_memory_reports(old: dict, new: dict):
+    """
+    Return list of dicts comparing memory checkpoints with the same label
+    in two reports (ex.) two versions): traced and peak RSS bytes and bytes
+    per type, old, new and change.
+    """
+
+    old_checkpoints = {point['label']: point for point in old['memory']}
+    diffs = []
+    for point in new['memory']:
+        before = old_checkpoints.get(point['label'])
+        if before is None:
+            continue
+        diff = {'label': point['label']}
+        for key in ['traced_bytes', 'rss_peak_bytes']:
+            diff[key] = [before[key], point[key],
+                         (point[key] or 0) - (before[key] or 0)]
+        for name, size in point['types'].items():
+            old_size = before['types'].get(name, {'bytes': 0})['bytes']
+            diff[f'{name}_bytes'] = [old_size, size['bytes'],
+                                     size['bytes'] - old_size]
+        diffs.append(diff)
+    return diffs
+
+
+# SBA_PROFILE=1 turns profiling on for the whole run, SBA_PROFILE=memory
+# adds memory checkpoints. SBA_PROFILE_DIR sets where reports are written.
+if os.environ.get('SBA_PROFILE', '') not in ['', '0']:
+    profiler.enable(os.environ.get('SBA_PROFILE_DIR', 'data/profiles'),
+                    memory=os.environ['SBA_PROFILE'] == 'memory')
+
+
+if __name__ == "__main__":
+    # python profiling.py old_report.json new_report.json
+    old_handler = FileHandler(os.path.basename(sys.argv[1]),
+                              os.path.dirname(sys.argv[1]))
+    new_handler = FileHandler(os.path.basename(sys.argv[2]),
+                              os.path.dirname(sys.argv[2]))
+    for diff in diff_memory_reports(old_handler.load_file(),
+                                    new_handler.load_file()):
+        print(diff['label'])
+        for key, values in diff.items():
+            if key != 'label':
+                before, after, change = values
+                print(f'    {key:28} {before or 0:14,} -> {after or 0:14,} '
+                      f'({change:+,})')
@@ -0,0 +1,119 @@
+import numpy as np
+
+
+def get_player_splits(gp: int, spl_4: int):
+    """
+    Return list of the four split lengths used for player performance
+    analysis, or an empty list if the gp threshold is not met. Matches splits
+    from NBADataAnalysis.__get_player_metrics.
+    """
+
+    if gp >= 40:
+        return [5, 10, 20, spl_4]
+    elif 4 <= gp < 40:
+        return [round(gp/7.99), round(gp/4), round(gp/2), spl_4]
+    else:
+        return []
+
+def get_player_weights(spl_4: np.ndarray):
+    """
+    Given array of 4th split lengths, return (avl, cover) weight arrays with
+    one extra axis of length 4 for the splits.
+    """
+
+    avl = 0.3
+    cover = 0.7
+    full_avl = np.array([avl*(7/20), avl*(5/20), avl*(4/20), avl*(4/20)])
+    full_cov = np.array([cover*(7/20), cover*(5/20), cover*(4/20),
+                         cover*(4/20)])
+    # If spl_4 is less than 4, split 4th metric weight and set as zero
+    part_avl = np.array([avl*(9/20), avl*(6/20), avl*(5/20), 0])
+    part_cov = np.array([cover*(9/20), cover*(6/20), cover*(5/20), 0])
+
+    full = (spl_4 >= 4)[..., np.newaxis]
+    return np.where(full, full_avl, part_avl), np.where(full, full_cov, part_cov)
+
+def get_def_weights(gp_season: np.ndarray):
+    """
+    Given array of opponent games played this season, return rank vs stat
+    weight array with one extra axis of length 4 for the splits.
+    """
+
+    rvs = 1
+    full_rvs = np.array([rvs*(4/20), rvs*(5/20), rvs*(5/20), rvs*(6/20)])
+    # If gp_season is less than 3, split 4th metric weight and set as zero
+    part_rvs = np.array([rvs*(6/20), rvs*(6/20), rvs*(8/20), 0])
+
+    full = (gp_season >= 3)[..., np.newaxis]
+    return np.where(full, full_rvs, part_rvs)
+
+def score_player_props(lines: np.ndarray, gp: np.ndarray, spl_4: np.ndarray,
+                       avgs: np.ndarray, cover_counts: np.ndarray,
+                       cover_lens: np.ndarray, def_ranks: np.ndarray,
+                       def_gp_season: np.ndarray):
+    """
+    Score every prop on a slate at once. Return (scores, totals), where
+    scores has shape (n, 5) with columns pl_all, pl_loc, pl_opp, def_all,
+    def_pos (NaN if gp threshold not met) and totals has shape (n,).\n
+    lines = (n,) consensus lines\n
+    gp, spl_4 = (n, 3) games played and 4th split for all, loc and opp\n
+    avgs = (n, 3, 4) rounded averages per split, NaN if not available\n
+    cover_counts, cover_lens = (n, 3, 4) games over the line and games in
+    each split\n
+    def_ranks = (n, 2, 4) opp ranks vs all and vs player's position\n
+    def_gp_season = (n,) opp games played this season
+    """
+
+    # Avg vs line metric
+    ratio = np.clip(avgs / lines[:, np.newaxis, np.newaxis], 0.5, 2)
+    m_avl = np.interp(ratio, [0.5, 1, 2], [0, 0.5, 1])
+    # Log vs line metric, rows that don't meet gp threshold have no games
+    with np.errstate(divide='ignore', invalid='ignore'):
+        m_cover = cover_counts / cover_lens
+
+    # Apply weights, splits with no weight add nothing even if not available
+    w_avl, w_cover = get_player_weights(spl_4)
+    m_avl = np.where(w_avl == 0, 0.0, m_avl * w_avl)
+    m_cover = np.where(w_cover == 0, 0.0, m_cover * w_cover)
+
+    # Sum splits in order, so results match the per-player path exactly
+    s_pl = ((m_avl[..., 0] + m_avl[..., 1] + m_avl[..., 2] + m_avl[..., 3])
+            + (m_cover[..., 0] + m_cover[..., 1] + m_cover[..., 2]
+               + m_cover[..., 3]))
+    s_pl = np.where(gp >= 4, s_pl, np.nan)
+
+    # Rank vs stat metric
+    m_rvs = (def_ranks / 30) * get_def_weights(def_gp_season)[:, np.newaxis]
+    s_def = m_rvs[..., 0] + m_rvs[..., 1] + m_rvs[..., 2] + m_rvs[..., 3]
+
+    scores = np.concatenate([s_pl, s_def], axis=1)
+
+    # Define weight values, opp weight moves to all and loc if not available
+    no_opp = np.isnan(s_pl[:, 2])
+    weights = np.empty_like(scores)
+    weights[:, 0] = np.where(no_opp, 0.5, 0.4)
+    weights[:, 1] = np.where(no_opp, 0.3, 0.2)
+    weights[:, 2] = np.where(no_opp, 0, 0.2)
+    weights[:, 3] = 0.1
+    weights[:, 4] = 0.1
+
+    totals = np.zeros(len(lines))
+    weighted = np.where(np.isnan(scores), 0.0, scores * weights)
+    for i in range(scores.shape[1]):
+        totals = totals + weighted[:, i]
+
+    return scores, totals
+
+def format_scores(scores: np.ndarray, totals: np.ndarray):
+    """
+    Return list of lists with rounded score values and total for analysis
+    tables, None where a score is not available.
+    """
+
+    # np.round, not round, to match rounding of np.float64 totals
+    totals = np.round(totals*100, 2)
+    display = []
+    for row, total in zip(scores.tolist(), totals.tolist()):
+        display.append([None if np.isnan(s) else round(s*100) for s in row]
+                       + [total])
+    return display
@@ -0,0 +1,103 @@
+import numpy as np
+
+from nba_objects import NBAPlayer
+
+
+class NBAPlayerIndex:
+    def __init__(self, players: list, n_games: int=20, pos_weight: float=3):
+        """
+        Feature index over players for nearest neighbour queries. Each row
+        holds a player's recent per-minute production, minutes, usage proxies
+        and position.\n
+        players = list of NBAPlayer objects\n
+        n_games = number of recent games used for features (default 20)\n
+        pos_weight = weight of position features relative to standardized
+        production features (default 3)
+        """
+
+        self.players = players
+        self.n_games = n_games
+        self.pos_weight = pos_weight
+        self.per_min_stats = ['points', 'rebounds', 'assists', 'threes',
+                              'blocks', 'steals', 'turnovers']
+        self.positions = ['G', 'F', 'C']
+        self.ids = [player.id for player in players]
+        self.id_index = {pl_id: i for i, pl_id in enumerate(self.ids)}
+        self.raw = np.zeros((len(players), len(self.per_min_stats) + 4))
+        self.pos = np.zeros((len(players), len(self.positions)))
+        self.n_logged = np.full(len(players), -1) # Gamelog len at last build
+        self.features = None
+
+        self.refresh()
+
+    def refresh(self):
+        """
+        Recompute rows for players whose gamelog, up to their point-in-time
+        cutoff, changed since the last build, then restandardize the feature
+        matrix. Return number of rows updated.
+        """
+
+        updated = 0
+        for i, player in enumerate(self.players):
+            n_logged = len(player.gamelog[:player.gamelog_end])
+            if n_logged != self.n_logged[i]:
+                self.raw[i], self.pos[i] = self.__get_player_features(player)
+                self.n_logged[i] = n_logged
+                updated += 1
+        if updated > 0:
+            self.__standardize()
+        return updated
+
+    def nearest(self, player_id: int, k: int, candidate_ids: list=None):
+        """
+        Return list of k player IDs most similar to player, closest first.
+        Player is never included.\n
+        candidate_ids = list of player IDs to choose from (default all)
+        """
+
+        i = self.id_index[player_id]
+        dist = ((self.features - self.features[i]) ** 2).sum(axis=1)
+        dist[i] = np.inf
+        if candidate_ids is not None:
+            mask = np.ones(len(self.ids), dtype=bool)
+            rows = [self.id_index[pl_id] for pl_id in candidate_ids
+                    if pl_id in self.id_index]
+            mask[rows] = False
+            dist[mask] = np.inf
+
+        k = min(k, int(np.isfinite(dist).sum()))
+        if k == 0:
+            return []
+        closest = np.argpartition(dist, k - 1)[:k]
+        closest = closest[np.argsort(dist[closest], kind='stable')]
+        return [self.ids[j] for j in closest]
+
+    def __get_player_features(self, player: NBAPlayer):
+        """
+        Return (production, position) feature rows for player. Production is
+        per-minute stats, then minutes, fga, fta and tpa per minute.
+        """
+
+        pos = np.zeros(len(self.positions))
+        if player.base_position in self.positions:
+            pos[self.positions.index(player.base_position)] = 1
+
+        # Only games before the player's point-in-time cutoff
+        gamelogs = player.gamelog[:player.gamelog_end][-self.n_games:]
+        minutes = sum(log.minutes for log in gamelogs)
+        if minutes == 0:
+            return np.zeros(self.raw.shape[1]), pos
+
+        row = [sum(log.string_to_stat(stat) for log in gamelogs) / minutes
+               for stat in self.per_min_stats]
+        row.append(minutes / len(gamelogs))
+        row.append(sum(log.fga for log in gamelogs) / minutes)
+        row.append(sum(log.fta for log in gamelogs) / minutes)
+        row.append(sum(log.tpa for log in gamelogs) / minutes)
+        return np.array(row), pos
+
+    def __standardize(self):
+        std = self.raw.std(axis=0)
+        std[std == 0] = 1
+        production = (self.raw - self.raw.mean(axis=0)) / std
+        self.features = np.hstack([production, self.pos * self.pos_weight])
@@ -0,0 +1,446 @@
+import json
+import time
+import threading
+from random import Random
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+
+class StubNBALeague:
+    def __init__(self, seasons: list=[2023], n_teams: int=30,
+                 roster_size: int=13, games_per_team: int=82, seed: int=0):
+        """
+        Generate fake API-NBA responses with the same structure as the real
+        API, so get_data can run against the stub server offline.
+        """
+
+        self.rand = Random(seed)
+        self.seasons = seasons
+        self.teams = self.__make_teams(n_teams)
+        self.players = self.__make_players(roster_size)
+        self.games = {season: self.__make_games(season, games_per_team)
+                      for season in seasons}
+
+    def get_response(self, path: str, params: dict):
+        """Return (status, JSON) for endpoint path and query params."""
+
+        season = int(params.get('season', self.seasons[-1]))
+        team = int(params['team']) if 'team' in params else None
+        if path == '/seasons':
+            return 200, self.__wrap(self.seasons)
+        if path == '/teams':
+            return 200, self.__wrap(self.teams)
+        if path == '/games':
+            return 200, self.__wrap(self.games.get(season, []))
+        if path == '/players':
+            return 200, self.__wrap([pl for pl in self.players
+                                     if team is None or pl['_team'] == team])
+        if path == '/players/statistics':
+            if 'game' in params:
+                return 200, self.__wrap(self.__make_game_player_stats(
+                    int(params['game'])))
+            return 200, self.__wrap(self.__make_player_stats(team, season))
+        return 404, {'message': f'Endpoint {path} does not exist'}
+
+    def __wrap(self, response: list):
+        return {'get': '', 'parameters': {}, 'errors': [],
+                'results': len(response), 'response': response}
+
+    def __make_teams(self, n_teams: int):
+        teams = []
+        for i in range(1, n_teams + 1):
+            teams.append({
+                'id': i,
+                'name': f'Team {i}',
+                'nickname': f'T{i}',
+                'code': f'T{i:02d}',
+                'city': f'City {i}',
+                'logo': None,
+                'allStar': False,
+                'nbaFranchise': True,
+                'leagues': {'standard': {'conference': 'East' if i % 2 else
+                                         'West',
+                                         'division': f'Division {i % 6}'}}
+            })
+        return teams
+
+    def __make_players(self, roster_size: int):
+        players = []
+        positions = ['PG', 'SG', 'SF', 'PF', 'C']
+        for team in self.teams:
+            for j in range(roster_size):
+                pl_id = team['id'] * 100 + j
+                players.append({
+                    'id': pl_id,
+                    'firstname': f'First{pl_id}',
+                    'lastname': f'Last{pl_id}',
+                    'height': {'feets': '6', 'inches': str(j % 12)},
+                    'weight': {'pounds': str(180 + j * 5)},
+                    'leagues': {'standard': {'jersey': j,
+                                             'pos': positions[j % 5]}},
+                    '_team': team['id']
+                })
+        return players
+
+    def __make_games(self, season: int, games_per_team: int):
+        games = []
+        n_teams = len(self.teams)
+        start = datetime(season, 10, 24, 23, 30, tzinfo=timezone.utc)
+        n_days = games_per_team
+        for day in range(n_days):
+            order = list(range(1, n_teams + 1))
+            self.rand.shuffle(order)
+            for k in range(0, n_teams - 1, 2):
+                game_id = season * 10000 + len(games)
+                home, away = order[k], order[k + 1]
+                scores = {}
+                for side in ['home', 'visitors']:
+                    linescore = [str(self.rand.randint(20, 35))
+                                 for _ in range(4)]
+                    scores[side] = {
+                        'linescore': linescore,
+                        'points': sum(int(q) for q in linescore)
+                    }
+                # No ties in the NBA, give the home team the last point
+                if scores['home']['points'] == scores['visitors']['points']:
+                    scores['home']['linescore'][3] = str(
+                        int(scores['home']['linescore'][3]) + 1)
+                    scores['home']['points'] += 1
+                dt = start + timedelta(days=day)
+                games.append({
+                    'id': game_id,
+                    'league': 'standard',
+                    'season': season,
+                    'stage': 2,
+                    'date': {'start': dt.isoformat().replace('+00:00', '.000Z')},
+                    'status': {'long': 'Finished'},
+                    'arena': {'name': 'Arena', 'city': 'City', 'state': None,
+                              'country': None},
+                    'teams': {'home': {'id': home, 'code': f'T{home:02d}'},
+                              'visitors': {'id': away, 'code': f'T{away:02d}'}},
+                    'scores': scores
+                })
+        return games
+
+    def __make_game_player_stats(self, game_id: int):
+        stats = []
+        for games in self.games.values():
+            for game in games:
+                if game['id'] != game_id:
+                    continue
+                for side in ['home', 'visitors']:
+                    stats += self.__make_player_stats(
+                        game['teams'][side]['id'], game['season'], game_id)
+        return stats
+
+    def __make_player_stats(self, team: int, season: int,
+                            game_id: int=None):
+        stats = []
+        roster = [pl for pl in self.players if pl['_team'] == team]
+        for game in self.games.get(season, []):
+            if team not in [game['teams']['home']['id'],
+                            game['teams']['visitors']['id']]:
+                continue
+            if game_id is not None and game['id'] != game_id:
+                continue
+            for pl in roster:
+                rand = Random(hash((pl['id'], game['id'])))
+                fga, fta, tpa = (rand.randint(2, 20), rand.randint(0, 10),
+                                 rand.randint(0, 10))
+                fgm, ftm = rand.randint(0, fga), rand.randint(0, fta)
+                tpm = rand.randint(0, min(tpa, fgm))
+                off_reb, def_reb = rand.randint(0, 4), rand.randint(0, 10)
+                stats.append({
+                    'player': {'id': pl['id'], 'firstname': pl['firstname'],
+                               'lastname': pl['lastname']},
+                    'team': {'id': team},
+                    'game': {'id': game['id']},
+                    'points': 2 * fgm + tpm + ftm,
+                    'pos': pl['leagues']['standard']['pos'],
+                    'min': f'{rand.randint(5, 40)}:00',
+                    'fgm': fgm, 'fga': fga,
+                    'fgp': str(round(100 * fgm / fga, 1)),
+                    'ftm': ftm, 'fta': fta,
+                    'ftp': str(round(100 * ftm / fta, 1)) if fta else '0',
+                    'tpm': tpm, 'tpa': tpa,
+                    'tpp': str(round(100 * tpm / tpa, 1)) if tpa else '0',
+                    'offReb': off_reb, 'defReb': def_reb,
+                    'totReb': off_reb + def_reb,
+                    'assists': rand.randint(0, 10),
+                    'pFouls': rand.randint(0, 6),
+                    'steals': rand.randint(0, 3),
+                    'turnovers': rand.randint(0, 5),
+                    'blocks': rand.randint(0, 3),
+                    'plusMinus': str(rand.randint(-20, 20)),
+                    'comment': None
+                })
+        return stats
+
+
+class StubOddsLeague:
+    def __init__(self, sport: str='basketball_nba', n_events: int=10,
+                 players_per_event: int=16, seed: int=0):
+        """
+        Generate fake The Odds API responses for events and event odds.
+        Responses include usage headers, with each call costing (markets
+        returned x regions) credits like the real API.
+        """
+
+        self.rand = Random(seed)
+        self.sport = sport
+        self.credits_used = 0
+        self.lock = threading.Lock()
+        self.events = self.__make_events(n_events)
+        self.players = {event['id']: [f'Player {i}-{j}'
+                                      for j in range(players_per_event)]
+                        for i, event in enumerate(self.events)}
+
+    def get_response(self, path: str, params: dict):
+        """Return (status, JSON, headers) for endpoint path and params."""
+
+        parts = path.strip('/').split('/')
+        markets = [m for m in params.get('markets', '').split(',') if m]
+        bookmakers = [b for b in params.get('bookmakers', '').split(',') if b]
+        regions = (-(-len(bookmakers) // 10) if bookmakers else
+                   len(params.get('regions', 'us').split(',')))
+        if parts == [self.sport, 'events']:
+            return 200, self.events, self.__usage_headers(0)
+        if parts == [self.sport, 'odds']:
+            body = [{**event, 'bookmakers': [
+                self.__make_core_bookmaker(event, bookie, markets)
+                for bookie in bookmakers or ['draftkings']]}
+                for event in self.events]
+            return 200, body, self.__usage_headers(len(markets) * regions)
+        if (len(parts) == 4 and parts[:2] == [self.sport, 'events'] and
+            parts[3] == 'odds'):
+            event = next((e for e in self.events if e['id'] == parts[2]),
+                         None)
+            if event is None:
+                return 404, {'message': 'Event not found'}
+            body = {**event, 'bookmakers': [
+                self.__make_bookmaker(event['id'], bookie, markets)
+                for bookie in bookmakers or ['draftkings']]}
+            return 200, body, self.__usage_headers(len(markets) * regions)
+        return 404, {'message': f'Endpoint {path} does not exist'}
+
+    def __usage_headers(self, cost: int):
+        with self.lock:
+            self.credits_used += cost
+            return {'x-requests-last': str(cost),
+                    'x-requests-used': str(self.credits_used),
+                    'x-requests-remaining': str(20000 - self.credits_used)}
+
+    def __make_events(self, n_events: int):
+        events = []
+        start = datetime(2024, 3, 25, 23, 0, tzinfo=timezone.utc)
+        for i in range(n_events):
+            events.append({
+                'id': f'{i:032x}',
+                'sport_key': self.sport,
+                'sport_title': 'NBA',
+                'commence_time': (start + timedelta(minutes=30 * i))
+                                 .isoformat().replace('+00:00', 'Z'),
+                'home_team': f'Team {2 * i + 1}',
+                'away_team': f'Team {2 * i + 2}'
+            })
+        return events
+
+    def __make_core_bookmaker(self, event: dict, bookie: str, markets: list):
+        last_update = '2024-03-25T18:00:00Z'
+        rand = Random(f'{event["id"]}:{bookie}')
+        spread = rand.randint(1, 12) + 0.5
+        total = rand.randint(200, 240) + 0.5
+        teams = [event['home_team'], event['away_team']]
+        outcomes = {
+            'h2h': [{'name': teams[0], 'price': -150},
+                    {'name': teams[1], 'price': 130}],
+            'spreads': [{'name': teams[0], 'price': -110, 'point': -spread},
+                        {'name': teams[1], 'price': -110, 'point': spread}],
+            'totals': [{'name': 'Over', 'price': -110, 'point': total},
+                       {'name': 'Under', 'price': -110, 'point': total}]
+        }
+        return {'key': bookie, 'title': bookie.title(),
+                'last_update': last_update,
+                'markets': [{'key': market, 'last_update': last_update,
+                             'outcomes': outcomes[market]}
+                            for market in markets if market in outcomes]}
+
+    def __make_bookmaker(self, event_id: str, bookie: str, markets: list):
+        last_update = '2024-03-25T18:00:00Z'
+        bookmaker = {'key': bookie, 'title': bookie.title(),
+                     'last_update': last_update, 'markets': []}
+        for market in markets:
+            rand = Random(f'{event_id}:{bookie}:{market}')
+            outcomes = []
+            for player in self.players[event_id]:
+                point = rand.randint(1, 30) + 0.5
+                for name in ['Over', 'Under']:
+                    outcomes.append({'name': name, 'description': player,
+                                     'price': rand.choice([-120, -110, 100]),
+                                     'point': point})
+            bookmaker['markets'].append({'key': market,
+                                         'last_update': last_update,
+                                         'outcomes': outcomes})
+        return bookmaker
+
+
+class StubRouter:
+    def __init__(self, *leagues):
+        """
+        Serve several stub leagues from one server. Each request goes to the
+        first league that doesn't answer 404.
+        """
+
+        self.leagues = leagues
+
+    def get_response(self, path: str, params: dict):
+        for league in self.leagues:
+            result = league.get_response(path, params)
+            if result[0] != 404:
+                return result
+        return result
+
+
+class StubAPIServer:
+    def __init__(self, league=None, rate_limit: int=None,
+                 latency: float=0, error_rate: float=0, port: int=0,
+                 seed: int=0):
+        """
+        Local HTTP server serving stub API responses on a background thread.\n
+        league = object with get_response(path, params) returning (status,
+        JSON) or (status, JSON, headers) (default StubNBALeague())\n
+        rate_limit = requests allowed per minute, extra requests get 429
+        (default no limit)\n
+        latency = seconds to wait before each response\n
+        error_rate = share of requests answered with a random 500, 502 or 503
+        \n
+        port = 0 picks a free port\n
+        seed = seed for injected errors
+        """
+
+        self.league = league or StubNBALeague()
+        self.rate_limit = rate_limit
+        self.latency = latency
+        self.error_rate = error_rate
+        self.rand = Random(seed)
+        self.request_times = []
+        self.failures = [] # Queue of (status, retry_after) to respond with
+        self.lock = threading.Lock()
+        self.httpd = ThreadingHTTPServer(('127.0.0.1', port),
+                                         self.__make_handler())
+        self.thread = None
+
+    @property
+    def url(self):
+        host, port = self.httpd.server_address
+        return f'http://{host}:{port}'
+
+    def start(self):
+        self.thread = threading.Thread(target=self.httpd.serve_forever,
+                                       daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *args):
+        self.stop()
+
+    def fail_next(self, n: int, status: int=503, retry_after: float=None):
+        """
+        Respond to the next n requests with status, and a Retry-After header 
+        if retry_after is given.
+        """
+
+        with self.lock:
+            self.failures += [(status, retry_after)] * n
+
+    def pop_failure(self):
+        with self.lock:
+            if len(self.failures) > 0:
+                return self.failures.pop(0)
+            if self.error_rate > 0 and self.rand.random() < self.error_rate:
+                return self.rand.choice([500, 502, 503]), None
+            return None
+
+    def over_rate_limit(self):
+        """Record request, return True if quota for the last minute is used."""
+
+        with self.lock:
+            now = time.monotonic()
+            self.request_times = [t for t in self.request_times
+                                  if now - t < 60]
+            if (self.rate_limit is not None and
+                len(self.request_times) >= self.rate_limit):
+                return True
+            self.request_times.append(now)
+            return False
+
+    def __make_handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                parsed = urlparse(self.path)
+                params = {k: v[0] for k, v in parse_qs(parsed.query).items()}
+                if server.latency > 0:
+                    time.sleep(server.latency)
+                failure = server.pop_failure()
+                retry_after = None
+                headers = {}
+                if failure is not None:
+                    status, retry_after = failure
+                    body = {'message': 'Injected failure'}
+                elif server.over_rate_limit():
+                    status, body = 429, {'message': 'Too many requests'}
+                else:
+                    result = server.league.get_response(parsed.path, params)
+                    status, body = result[:2]
+                    if len(result) > 2:
+                        headers = result[2]
+                data = json.dumps(body).encode()
+                self.send_response(status)
+                if retry_after is not None:
+                    self.send_header('Retry-After', str(retry_after))
+                for key, value in headers.items():
+                    self.send_header(key, value)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+
+if __name__ == "__main__":
+    # Benchmark serial vs rate limited concurrent player stats requests
+    from get_data_api import NBAStatsAPIClient
+
+    with StubAPIServer(latency=0.5) as server:
+        client = NBAStatsAPIClient(rate_limit=600, max_concurrency=8,
+                                   base_url=server.url, key='stub')
+        kwargs_list = [{'team': team, 'season': 2023} for team in range(1, 31)]
+
+        start = time.perf_counter()
+        for kwargs in kwargs_list:
+            client.get_player_stats(**kwargs)
+        print(f'Serial: {time.perf_counter() - start:.2f}s')
+
+        start = time.perf_counter()
+        client.map_requests('get_player_stats', kwargs_list)
+        print(f'Concurrent: {time.perf_counter() - start:.2f}s')
+
+        # Retries: two 503s with Retry-After, then success
+        server.fail_next(2, status=503, retry_after=0.1)
+        client.get_teams()
+        print(client.metrics[-1])
+        print(client.get_metrics_summary())
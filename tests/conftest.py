@@ -0,0 +1,51 @@
+import os
+import sys
+
+import pytest
+
+
+# Tests import the scripts in src and the synthetic league in benchmarks
+ROOT_PATH = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+for folder in ['src', 'benchmarks']:
+    path = os.path.join(ROOT_PATH, folder)
+    if path not in sys.path:
+        sys.path.insert(0, path)
+
+import get_data
+import get_data_api as api
+from synthetic_league import SyntheticLeague
+from stub_api_server import StubAPIServer, StubNBALeague
+
+
+@pytest.fixture(scope='session')
+def synthetic_league(tmp_path_factory):
+    """
+    Small synthetic league written to a temporary directory, with every prop
+    market. Returns (league, root, manifest).
+    """
+
+    league = SyntheticLeague(seasons=2, n_teams=4, roster_size=6,
+                             games_per_team=30, n_books=2, n_markets=14)
+    root = str(tmp_path_factory.mktemp('league'))
+    manifest = league.write(root)
+    return league, root, manifest
+
+@pytest.fixture
+def league_workspace(synthetic_league, monkeypatch):
+    """
+    Enter the synthetic league's directory, with seasons served by a local
+    stub API server. Returns (league, manifest).
+    """
+
+    league, root, manifest = synthetic_league
+    server = StubAPIServer(StubNBALeague(
+        seasons=league.seasons, n_teams=2, roster_size=1,
+        games_per_team=1)).start()
+    get_data.set_api_overrides(api.NBAStatsAPIClient, base_url=server.url,
+                               key='stub')
+    monkeypatch.chdir(root)
+    try:
+        yield league, manifest
+    finally:
+        get_data.set_api_overrides(api.NBAStatsAPIClient)
+        server.stop()
@@ -0,0 +1,22 @@
+import pytest
+
+import get_data_api as api
+from analysis_application import AnalysisApplication
+
+
+def test_failed_request_returns_to_menu(monkeypatch, capsys):
+    app = AnalysisApplication()
+    app.sport = 'nba'
+    commands = iter(['1', '1', 'exit'])
+    monkeypatch.setattr('builtins.input', lambda prompt: next(commands))
+    calls = []
+
+    def refresh_data():
+        calls.append(1)
+        raise api.APIRequestError('Request failed with status: 503')
+
+    monkeypatch.setattr(app, 'refresh_data', refresh_data)
+    with pytest.raises(SystemExit):
+        app.sport_execute()
+    assert len(calls) == 2
+    assert 'Failed: Request failed with status: 503' in capsys.readouterr().out
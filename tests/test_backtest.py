@@ -0,0 +1,133 @@
+import copy
+from datetime import datetime, timedelta
+
+import pandas as pd
+import pytest
+
+from backtest import NBABacktest
+from data_analysis import NBADataAnalysis
+from file_handler import FileHandler
+
+
+SCORE_COLUMNS = ['date', 'market', 'first_name', 'last_name', 'team', 'line',
+                 's_pl_all', 's_pl_loc', 's_pl_opp', 's_def_all', 's_def_pos',
+                 'total']
+
+
+@pytest.fixture
+def analysis(league_workspace):
+    return NBADataAnalysis()
+
+def get_markets():
+    return FileHandler('api_keys_player_prop_markets.json',
+                       'data/nba/odds').load_file()[:3]
+
+def get_past_dates(manifest: dict, n: int):
+    """Return the n days before the slate as 'yyyy-mm-dd' strings."""
+
+    slate = datetime.strptime(manifest['slate_date'], '%Y-%m-%d')
+    return [(slate - timedelta(days=i)).strftime('%Y-%m-%d')
+            for i in range(n, 0, -1)]
+
+def add_past_props(analysis: NBADataAnalysis, date_strs: list):
+    """Copy each player's slate props to 4 hours before each date's games."""
+
+    for player in analysis.players:
+        slate_props = list(player.props)
+        for date_str in date_strs:
+            games = analysis.get_game_objects(
+                datetime.strptime(date_str, '%Y-%m-%d'))
+            last_update = (min(game.datetime for game in games) -
+                           timedelta(hours=4))
+            for prop in slate_props:
+                prop = copy.copy(prop)
+                prop.__dict__.pop('last_update', None)
+                prop.iso_last_update = last_update.isoformat()
+                prop.timestamp = last_update.timestamp()
+                player.props.append(prop)
+
+def get_actual_gamelog(analysis: NBADataAnalysis, row: pd.Series):
+    games = analysis.get_game_objects(
+        datetime.strptime(row['date'], '%Y-%m-%d'))
+    game_ids = [game.id for game in games]
+    player = next(player for player in analysis.players
+                  if player.first_name == row['first_name'] and
+                  player.last_name == row['last_name'])
+    return next((gamelog for gamelog in player.gamelog
+                 if gamelog.game_id in game_ids), None)
+
+
+def test_forked_matches_single_process(analysis, league_workspace):
+    league, manifest = league_workspace
+    dates = get_past_dates(manifest, 3)
+    add_past_props(analysis, dates)
+    backtest = NBABacktest(analysis)
+    forked = backtest.run(dates[0], dates[-1], get_markets(), n_workers=2)
+    single = backtest.run(dates[0], dates[-1], get_markets(), n_workers=1)
+    assert len(forked) > 0
+    assert set(forked['date']) == set(dates)
+    pd.testing.assert_frame_equal(forked, single)
+
+def test_actual_and_result_joined_to_game(analysis, league_workspace):
+    league, manifest = league_workspace
+    dates = get_past_dates(manifest, 2)
+    add_past_props(analysis, dates)
+    markets = {market['key']: market for market in get_markets()}
+    results = NBABacktest(analysis).run(dates[0], dates[-1],
+                                        list(markets.values()), n_workers=1)
+    assert results['actual'].notna().sum() > 0
+    for _, row in results.iterrows():
+        gamelog = get_actual_gamelog(analysis, row)
+        if gamelog is None:
+            assert row['actual'] is None and row['result'] is None
+            continue
+        actual = gamelog.string_to_stat(markets[row['market']]['str_to_stat'])
+        assert row['actual'] == actual
+        if actual > row['line']:
+            assert row['result'] == 'Over'
+        elif actual < row['line']:
+            assert row['result'] == 'Under'
+        else:
+            assert row['result'] == 'Push'
+
+def test_no_gamelog_from_tip_off_on_is_scored(analysis, league_workspace):
+    league, manifest = league_workspace
+    date_str = get_past_dates(manifest, 1)[0]
+    add_past_props(analysis, [date_str])
+    backtest = NBABacktest(analysis)
+    results = backtest.run(date_str, date_str, get_markets(), n_workers=1)
+    assert len(results) > 0
+
+    # Scores don't change when everything from tip-off on is gone
+    tip_off = min(game.datetime for game in analysis.get_game_objects(
+        datetime.strptime(date_str, '%Y-%m-%d')))
+    for player in analysis.players:
+        player.gamelog = [gamelog for gamelog in player.gamelog
+                          if gamelog.game.datetime < tip_off]
+    before = backtest.run(date_str, date_str, get_markets(), n_workers=1)
+    pd.testing.assert_frame_equal(results[SCORE_COLUMNS],
+                                  before[SCORE_COLUMNS])
+    assert before['actual'].isna().all()
+
+def test_traded_player_actual_found(analysis, league_workspace):
+    league, manifest = league_workspace
+    date_str = get_past_dates(manifest, 1)[0]
+    add_past_props(analysis, [date_str])
+    games = analysis.get_game_objects(datetime.strptime(date_str, '%Y-%m-%d'))
+    game_ids = [game.id for game in games]
+    # Traded: every game before the date was for a team in the other game
+    player = games[0].away.team.players[0]
+    new_team = games[1].away.team
+    for gamelog in player.gamelog:
+        if gamelog.game_id not in game_ids:
+            gamelog.team_id = new_team.id
+
+    market = get_markets()[0]
+    results = NBABacktest(analysis).run(date_str, date_str, [market],
+                                        n_workers=1)
+    row = results[(results['first_name'] == player.first_name) &
+                  (results['last_name'] == player.last_name)].iloc[0]
+    assert row['team'] == new_team.code
+    gamelog = next(gamelog for gamelog in player.gamelog
+                   if gamelog.game_id in game_ids)
+    assert row['actual'] == gamelog.string_to_stat(market['str_to_stat'])
@@ -0,0 +1,78 @@
+import sqlite3
+
+import pandas as pd
+import pytest
+
+from database import NBADatabase
+from data_analysis import NBADataAnalysis
+
+
+@pytest.fixture
+def db(tmp_path):
+    db = NBADatabase(str(tmp_path / 'nba.db'))
+    yield db
+    db.close()
+
+def make_prop(player_name, name, line, price=-110):
+    return {'event_id': 'e1', 'sport_key': 'basketball_nba',
+            'sport_name': 'NBA', 'home_team': 'Home', 'away_team': 'Away',
+            'bookmaker_key': 'draftkings', 'bookmaker_name': 'DraftKings',
+            'market_key': 'h2h' if player_name is None else 'player_points',
+            'market_name': 'Moneyline', 'market_abv': 'ML',
+            'last_update': '2024-03-25T20:00:00Z', 'name': name,
+            'player_name': player_name, 'price': price, 'line': line,
+            'timestamp': 1711396800.0}
+
+MARKETS = [{'key': 'h2h', 'group': 'core'},
+           {'key': 'player_points', 'group': 'player_props'}]
+
+
+def test_gamelog_queries_match_between_backends(league_workspace):
+    league, manifest = league_workspace
+    db = NBADatabase()
+    db.import_json()
+    db.close()
+    json_analysis = NBADataAnalysis()
+    sql_analysis = NBADataAnalysis(backend='sqlite')
+
+    player = json_analysis.players[0]
+    opp = json_analysis.teams[-1]
+    for filters in [{}, {'seasons': [league.seasons[-1]]}, {'loc': 'away'},
+                    {'player': player, 'opp': opp, 'loc': 'home'}]:
+        json_logs = json_analysis.query_player_gamelogs(**filters)
+        sql_filters = dict(filters)
+        if 'player' in filters:
+            sql_filters['player'] = next(pl for pl in sql_analysis.players
+                                         if pl.id == player.id)
+        sql_logs = sql_analysis.query_player_gamelogs(**sql_filters)
+        assert len(json_logs) > 0
+        pd.testing.assert_frame_equal(json_logs, sql_logs)
+
+def test_core_market_props_are_not_duplicated(db):
+    props = [make_prop(None, 'Home', None), make_prop(None, 'Away', None),
+             make_prop('Player One', 'Over', 20.5)]
+    db.replace_props(props, MARKETS)
+    # Same outcome listed twice keeps the last price
+    db.replace_props(props + [make_prop(None, 'Home', None, price=120)],
+                     MARKETS)
+
+    loaded = db.load_props()
+    assert len(loaded) == 3
+    home = [prop for prop in loaded if prop['name'] == 'Home']
+    assert home[0]['price'] == 120
+    assert home[0]['player_name'] is None
+
+def test_failed_replace_keeps_old_rows(db):
+    db.replace_props([make_prop('Player One', 'Over', 20.5)], MARKETS)
+    db.replace_injuries([{'name': 'Player One', 'status': 'Out',
+                          'comment': ''}])
+
+    bad_prop = {**make_prop('Player Two', 'Over', 10.5), 'price': object()}
+    with pytest.raises(sqlite3.Error):
+        db.replace_props([bad_prop], MARKETS)
+    with pytest.raises(sqlite3.Error):
+        db.replace_injuries([{'name': 'Player Two', 'status': object(),
+                              'comment': ''}])
+
+    assert [prop['player_name'] for prop in db.load_props()] == ['Player One']
+    assert [injury['name'] for injury in db.load_injuries()] == ['Player One']
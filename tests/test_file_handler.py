@@ -0,0 +1,28 @@
+import pytest
+
+from file_handler import FileHandler
+
+
+def test_compact_every_needs_key(tmp_path):
+    with pytest.raises(ValueError):
+        FileHandler('log.jsonl', str(tmp_path), compact_every=2)
+
+def test_compact_every_keeps_last_record_per_key(tmp_path):
+    handler = FileHandler('log.jsonl', str(tmp_path), buffer_size=1,
+                          compact_every=2, compact_key=lambda r: r['id'])
+    for i, value in enumerate(['a', 'b', 'c', 'd']):
+        handler.add_to_file({'id': i % 2, 'value': value})
+    assert handler.load_file() == [{'id': 0, 'value': 'c'},
+                                   {'id': 1, 'value': 'd'}]
+
+def test_buffered_records_written_on_exit(tmp_path):
+    with FileHandler('log.jsonl', str(tmp_path), buffer_size=10) as handler:
+        handler.add_to_file({'id': 0})
+        assert FileHandler('log.jsonl', str(tmp_path)).load_file() == []
+    assert handler.load_file() == [{'id': 0}]
+
+def test_records_written_when_dropped_by_default(tmp_path):
+    handler = FileHandler('log.jsonl', str(tmp_path))
+    handler.add_to_file({'id': 0})
+    del handler
+    assert FileHandler('log.jsonl', str(tmp_path)).load_file() == [{'id': 0}]
@@ -0,0 +1,156 @@
+import os
+import shutil
+
+import pytest
+
+import get_data
+import get_data_api as api
+from file_handler import FileHandler
+from stub_api_server import StubAPIServer, StubNBALeague, StubOddsLeague
+
+
+SEASON = 2023
+ROOT_PATH = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+@pytest.fixture
+def league():
+    """Stub league whose last 8 games have not been played yet."""
+
+    league = StubNBALeague(seasons=[SEASON], n_teams=4, roster_size=2,
+                           games_per_team=12)
+    for game in league.games[SEASON][-8:]:
+        game['status']['long'] = 'Scheduled'
+    return league
+
+@pytest.fixture
+def workspace(league, tmp_path, monkeypatch):
+    """Empty data folders with the stub league served locally."""
+
+    monkeypatch.chdir(tmp_path)
+    for folder in ['games', 'teams', 'players/gamelogs']:
+        os.makedirs(os.path.join('data', 'nba', folder))
+    server = StubAPIServer(league=league).start()
+    get_data.set_api_overrides(api.NBAStatsAPIClient, base_url=server.url,
+                               key='stub')
+    try:
+        get_data.get_team_data('nba')
+        get_data.get_game_data('nba', SEASON)
+        yield league
+    finally:
+        get_data.set_api_overrides(api.NBAStatsAPIClient)
+        server.stop()
+
+@pytest.fixture
+def full_reloads(monkeypatch):
+    """List that gets an entry for every get_all_player_stats_data call."""
+
+    calls = []
+    get_all = get_data.get_all_player_stats_data
+
+    def counted(*args, **kwargs):
+        calls.append(args)
+        return get_all(*args, **kwargs)
+
+    monkeypatch.setattr(get_data, 'get_all_player_stats_data', counted)
+    return calls
+
+def finish_games(league: StubNBALeague, n: int):
+    """Finish the next n scheduled games and refresh the games file."""
+
+    scheduled = [game for game in league.games[SEASON]
+                 if game['status']['long'] == 'Scheduled']
+    for game in scheduled[:n]:
+        game['status']['long'] = 'Finished'
+    # Fresh clients, so the games aren't served from the response cache
+    shutil.rmtree('data/cache', ignore_errors=True)
+    get_data.api_clients.clear()
+    get_data.get_game_data('nba', SEASON)
+    return [str(game['id']) for game in scheduled[:n]]
+
+def get_game_datetime(game_id: str):
+    games = FileHandler(f'{SEASON}_nba_games.json',
+                        'data/nba/games').load_file()
+    return games[game_id]['datetime']
+
+
+def test_first_sync_returns_player_ids(workspace, full_reloads):
+    player_ids = get_data.get_new_player_stats_data('nba', SEASON)
+    assert len(full_reloads) == 1
+    assert player_ids == {player['id'] for player in workspace.players}
+
+def test_new_games_fetched_per_game(workspace, full_reloads):
+    get_data.get_new_player_stats_data('nba', SEASON)
+    game_ids = finish_games(workspace, 2)
+    player_ids = get_data.get_new_player_stats_data('nba', SEASON)
+    assert len(full_reloads) == 1
+    assert len(player_ids) > 0
+    assert (get_data.load_sync_watermark('nba', SEASON) ==
+            get_game_datetime(game_ids[-1]))
+
+def test_more_new_games_than_teams_reloads_teams(workspace, full_reloads):
+    get_data.get_new_player_stats_data('nba', SEASON)
+    game_ids = finish_games(workspace, 5)
+    player_ids = get_data.get_new_player_stats_data('nba', SEASON)
+    assert len(full_reloads) == 2
+    assert player_ids == {player['id'] for player in workspace.players}
+    assert (get_data.load_sync_watermark('nba', SEASON) ==
+            get_game_datetime(game_ids[-1]))
+
+def test_watermark_stops_at_game_without_stats(workspace, monkeypatch):
+    get_data.get_new_player_stats_data('nba', SEASON)
+    watermark = get_data.load_sync_watermark('nba', SEASON)
+    game_ids = finish_games(workspace, 3)
+
+    # Stats for the second new game are not available yet
+    get_response = workspace.get_response
+
+    def no_stats_for_game(path, params):
+        status, response = get_response(path, params)
+        if str(params.get('game')) == game_ids[1]:
+            response = {**response, 'results': 0, 'response': []}
+        return status, response
+
+    monkeypatch.setattr(workspace, 'get_response', no_stats_for_game)
+    get_data.get_new_player_stats_data('nba', SEASON)
+    assert (get_data.load_sync_watermark('nba', SEASON) ==
+            get_game_datetime(game_ids[0]))
+    assert get_data.load_sync_watermark('nba', SEASON) > watermark
+
+    # Once its stats are in, the next sync catches up
+    monkeypatch.setattr(workspace, 'get_response', get_response)
+    player_ids = get_data.get_new_player_stats_data('nba', SEASON)
+    assert len(player_ids) > 0
+    assert (get_data.load_sync_watermark('nba', SEASON) ==
+            get_game_datetime(game_ids[-1]))
+
+def test_failed_event_odds_are_skipped(tmp_path, monkeypatch):
+    markets = FileHandler('api_keys_player_prop_markets.json',
+                          os.path.join(ROOT_PATH, 'data/nba/odds')
+                          ).load_file()[:2]
+    monkeypatch.chdir(tmp_path)
+    os.makedirs('src')
+    os.makedirs('data/nba/odds')
+    for file in ['api_keys_sports.json', 'api_keys_bookmakers.json']:
+        shutil.copy(os.path.join(ROOT_PATH, 'src', file), 'src')
+    league = StubOddsLeague(n_events=3)
+    # The last event has started and is no longer offered
+    started = {**league.events[0], 'id': 'f' * 32}
+    FileHandler('events.json', 'data/nba/odds').write_file(
+        league.events + [started])
+    monkeypatch.setattr(get_data, 'odds_stores', {})
+    server = StubAPIServer(league=league).start()
+    get_data.set_api_overrides(api.OddsAPIClient, base_url=server.url,
+                               key='stub')
+    try:
+        report = get_data.get_additional_markets_odds('nba', markets)
+    finally:
+        get_data.set_api_overrides(api.OddsAPIClient)
+        server.stop()
+
+    assert report['failed_events'] == [started['id']]
+    props = get_data.get_odds_store('nba').latest()
+    assert ({prop['event_id'] for prop in props} ==
+            {event['id'] for event in league.events})
+    assert ({prop['market_key'] for prop in props} ==
+            {market['key'] for market in markets})
@@ -0,0 +1,139 @@
+import os
+
+import pytest
+
+import get_data_api as api
+from stub_api_server import StubAPIServer
+
+
+URL = 'http://localhost/players'
+
+
+def put_responses(cache: api.ResponseCache, ids: list):
+    for i in ids:
+        cache.put(URL, {'id': i}, {'response': 'x' * 100})
+
+def is_cached(cache: api.ResponseCache, i: int):
+    return os.path.exists(os.path.join(
+        cache.file_path, cache.get_key(URL, {'id': i}) + '.json'))
+
+
+def test_cache_evicts_least_recently_used(tmp_path):
+    cache = api.ResponseCache(str(tmp_path), max_bytes=10**6)
+    put_responses(cache, range(5))
+    size = cache.total_bytes // 5
+    cache.max_bytes = size * 5
+    assert cache.get(URL, {'id': 0}, ttl=60) is not None
+    put_responses(cache, [5, 6])
+    # 0 was read after 1 and 2 were stored, so they go first
+    assert [is_cached(cache, i) for i in range(7)] == [
+        True, False, False, True, True, True, True]
+    assert cache.total_bytes == size * 5
+    assert len(os.listdir(tmp_path)) == 5
+
+def test_cache_lists_folder_once(tmp_path, monkeypatch):
+    cache = api.ResponseCache(str(tmp_path), max_bytes=10**6)
+    put_responses(cache, [0])
+    listdir = os.listdir
+    calls = []
+
+    def counted(path):
+        calls.append(path)
+        return listdir(path)
+
+    monkeypatch.setattr(os, 'listdir', counted)
+    put_responses(cache, range(1, 50))
+    # Overwriting a response replaces its size
+    put_responses(cache, [0])
+    assert calls == []
+    assert cache.total_bytes == sum(
+        os.path.getsize(os.path.join(tmp_path, file))
+        for file in listdir(tmp_path))
+
+def test_cache_hit_evicted_by_another_thread_is_a_miss(tmp_path, monkeypatch):
+    cache = api.ResponseCache(str(tmp_path))
+    put_responses(cache, [0])
+    utime = os.utime
+
+    def evicted_first(path, times):
+        os.remove(path)
+        utime(path, times)
+
+    monkeypatch.setattr(os, 'utime', evicted_first)
+    assert cache.get(URL, {'id': 0}, ttl=60) is None
+    assert cache.misses == 1
+
+def test_cache_picks_up_existing_files(tmp_path):
+    put_responses(api.ResponseCache(str(tmp_path)), range(3))
+    cache = api.ResponseCache(str(tmp_path), max_bytes=0)
+    put_responses(cache, [3])
+    assert os.listdir(tmp_path) == []
+
+
+@pytest.fixture
+def sleeps(monkeypatch):
+    """List of seconds the client slept between retries, without waiting."""
+
+    waited = []
+    monkeypatch.setattr(api.time, 'sleep', waited.append)
+    return waited
+
+def make_client(server: StubAPIServer, retries: int=3):
+    client = api.NBAStatsAPIClient(rate_limit=10**6, base_url=server.url,
+                                   key='stub')
+    client.retries = retries
+    return client
+
+
+def test_retries_5xx_with_backoff(sleeps):
+    with StubAPIServer() as server:
+        server.fail_next(2, status=503)
+        client = make_client(server)
+        assert client.get_seasons()['response'] == [2023]
+    assert sleeps == [1, 2]
+    assert client.metrics[-1]['attempts'] == 3
+    assert client.get_metrics_summary()['failures'] == 0
+
+def test_retry_after_header_is_used(sleeps):
+    with StubAPIServer() as server:
+        server.fail_next(1, status=429, retry_after=7)
+        server.fail_next(1, status=503, retry_after=0.5)
+        client = make_client(server)
+        client.get_seasons()
+    assert sleeps == [7, 0.5]
+
+def test_error_raised_after_retries(sleeps):
+    with StubAPIServer(error_rate=1) as server:
+        client = make_client(server, retries=2)
+        with pytest.raises(api.APIRequestError, match='status: 50[023]'):
+            client.get_seasons()
+    assert sleeps == [1, 2]
+    assert client.metrics[-1]['attempts'] == 3
+    assert client.get_metrics_summary()['failures'] == 1
+
+def test_rate_limit_429_retried_then_raised(sleeps):
+    with StubAPIServer(rate_limit=1) as server:
+        client = make_client(server)
+        client.get_seasons()
+        with pytest.raises(api.APIRequestError, match='status: 429'):
+            client.get_teams()
+    # No Retry-After from the server, so exponential backoff
+    assert sleeps == [1, 2, 4]
+    assert client.metrics[-1]['attempts'] == 4
+
+def test_other_errors_not_retried(sleeps):
+    with StubAPIServer() as server:
+        client = make_client(server)
+        with pytest.raises(api.APIRequestError, match='status: 404'):
+            client.get_request(server.url + '/missing', {})
+    assert sleeps == []
+    assert client.metrics[-1]['attempts'] == 1
+
+def test_some_errors_recovered(sleeps):
+    with StubAPIServer(error_rate=0.3, seed=1) as server:
+        client = make_client(server, retries=5)
+        for _ in range(20):
+            assert client.get_seasons()['response'] == [2023]
+    summary = client.get_metrics_summary()
+    assert summary['failures'] == 0
+    assert summary['retries'] == len(sleeps) > 0
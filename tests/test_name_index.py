@@ -0,0 +1,112 @@
+from types import SimpleNamespace
+
+import pytest
+
+import name_index
+from name_index import NBANameIndex, normalise_name
+from data_analysis import NBADataAnalysis
+from file_handler import FileHandler
+
+
+def make_players(*names):
+    return [SimpleNamespace(id=i, full_name=name, alt_names=[])
+            for i, name in enumerate(names, 1)]
+
+
+@pytest.mark.parametrize('name, normalised', [
+    ('Dāvis Bertāns', 'davis bertans'),
+    ('Nikola Jokić', 'nikola jokic'),
+    ('Kelly Oubre Jr.', 'kelly oubre'),
+    ('Gary Trent Jr', 'gary trent'),
+    ('Robert Williams III', 'robert williams'),
+    ('C.J. McCollum', 'cj mccollum'),
+    ("De'Aaron Fox", 'deaaron fox'),
+    ('Olivier-Maxence Prosper', 'olivier maxence prosper'),
+    ('  Jimmy   Butler ', 'jimmy butler'),
+    # A suffix is only dropped after a first and last name
+    ('Jr Smith', 'jr smith')
+])
+def test_normalise_name(name, normalised):
+    assert normalise_name(name) == normalised
+
+def test_resolve_exact_and_normalised():
+    players = make_players('Kelly Oubre Jr.', 'Dāvis Bertāns')
+    index = NBANameIndex(players)
+    assert index.resolve('Kelly Oubre Jr.') is players[0]
+    assert index.resolve('Kelly Oubre') is players[0]
+    assert index.resolve('Davis Bertans') is players[1]
+    assert index.get_unmatched() == []
+
+def test_ambiguous_normalised_name_is_not_resolved():
+    players = make_players('Marcus Morris Sr.', 'Marcus Morris')
+    index = NBANameIndex(players)
+    assert index.resolve('Marcus Morris') is players[1]
+    assert index.resolve('Marcus Morris Jr.', 'props') is None
+    report = index.get_unmatched('props')[0]
+    assert report['reason'] == 'ambiguous'
+    assert report['candidates'] == [1, 2]
+
+def test_fuzzy_match_accepted_as_alias():
+    players = make_players('Jalen Williams', 'Jaylin Williams')
+    index = NBANameIndex(players)
+    assert index.resolve('Jalen Wiliams', 'props') is players[0]
+    assert index.accepted[0]['name'] == 'Jalen Wiliams'
+    assert index.accepted[0]['player_id'] == 1
+    # Matches exactly from now on
+    assert index.exact['Jalen Wiliams'] == 1
+    assert index.get_unmatched() == []
+
+def test_near_miss_below_threshold_not_accepted():
+    players = make_players('Jaylin Williams', 'Kris Murray')
+    index = NBANameIndex(players)
+    assert index.resolve('Jalen Williams', 'props') is None
+    assert index.accepted == []
+    report = index.get_unmatched('props')[0]
+    assert report['reason'] == 'not found'
+    assert report['candidates'][0] == 1
+    assert report['similarity'][0] < index.fuzzy_threshold
+
+def test_fuzzy_match_without_margin_not_accepted():
+    # Close to both players, so neither is a confident match
+    players = make_players('Bojan Bogdanovic', 'Bogdan Bogdanovic')
+    index = NBANameIndex(players)
+    assert index.resolve('Bojan Bogdanovich', 'props') is None
+    assert index.accepted == []
+    assert index.get_unmatched('props')[0]['candidates'][:2] == [1, 2]
+
+def test_fuzzy_matching_off():
+    index = NBANameIndex(make_players('Jalen Williams'), fuzzy_threshold=None)
+    assert index.resolve('Jalen Wiliams') is None
+
+def test_save_aliases_only_writes_new_names(tmp_path, monkeypatch):
+    alt_name_handler = FileHandler('alt_player_names.json', str(tmp_path),
+                                   indent=4)
+    alt_name_handler.write_file({'1': ['Jalen Wiliams']})
+    index = NBANameIndex(make_players('Jalen Williams', 'Jaylin Williams'))
+    index.accepted = [{'name': 'Jalen Wiliams', 'player_id': 1,
+                       'similarity': 0.9}]
+    writes = []
+    write_file = FileHandler.write_file
+
+    def counted(self, data):
+        writes.append(data)
+        write_file(self, data)
+
+    monkeypatch.setattr(FileHandler, 'write_file', counted)
+    assert index.save_aliases(file_path=str(tmp_path)) == 0
+    assert writes == []
+    index.accepted = [{'name': 'Jaylen Wiliams', 'player_id': 1,
+                       'similarity': 0.8}]
+    assert index.save_aliases(file_path=str(tmp_path)) == 1
+    assert len(writes) == 1
+    assert alt_name_handler.load_file() == {
+        '1': ['Jalen Wiliams', 'Jaylen Wiliams']}
+
+def test_analysis_saves_aliases_only_when_asked(league_workspace, monkeypatch):
+    calls = []
+    monkeypatch.setattr(name_index.NBANameIndex, 'save_aliases',
+                        lambda self: calls.append(self))
+    NBADataAnalysis()
+    assert calls == []
+    NBADataAnalysis(save_aliases=True)
+    assert len(calls) == 1
@@ -0,0 +1,41 @@
+import os
+
+import pytest
+
+import nba_schema
+from file_handler import FileHandler
+from odds_store import OddsStore
+
+
+CORE_PATH = os.path.join(os.path.dirname(os.path.dirname(
+    os.path.abspath(__file__))), 'data', 'nba', 'odds', 'core')
+MARKETS = [{'key': 'h2h', 'group': 'core'},
+           {'key': 'spreads', 'group': 'core'}]
+
+
+def load_core_props(market_key: str):
+    return FileHandler(f'{market_key}.json', CORE_PATH).load_file()
+
+
+def test_h2h_props_have_no_line():
+    props = load_core_props('h2h')
+    typed = nba_schema.type_rows(props, nba_schema.type_prop, 'props')
+    assert len(typed) == len(props) > 0
+    assert all(prop['line'] is None for prop in typed)
+
+def test_other_props_need_a_line():
+    prop = {**load_core_props('spreads')[0], 'line': None}
+    with pytest.raises(nba_schema.SchemaError):
+        nba_schema.type_prop(prop)
+
+def test_h2h_props_round_trip_odds_store(tmp_path):
+    props = nba_schema.type_props(load_core_props('h2h') +
+                                  load_core_props('spreads'))
+    store = OddsStore('nba', str(tmp_path))
+    assert store.append(props, MARKETS, fetched=1.0) == len(props)
+    # Unchanged h2h props aren't written again
+    assert store.append(props, MARKETS, fetched=2.0) == 0
+
+    h2h = OddsStore('nba', str(tmp_path)).latest(market_keys=['h2h'])
+    assert len(h2h) == len(load_core_props('h2h'))
+    assert all(prop['line'] is None for prop in h2h)
@@ -0,0 +1,62 @@
+import os
+from datetime import datetime
+
+import pytest
+
+from odds_store import OddsStore
+
+
+MARKETS = [{'key': 'player_points', 'group': 'player_props'}]
+
+
+def make_props(prices: dict, last_update: float):
+    """Return typed props, one Over per player name -> price."""
+
+    return [{'event_id': 'e1', 'sport_key': 'basketball_nba',
+             'sport_name': 'NBA', 'home_team': 'Home', 'away_team': 'Away',
+             'bookmaker_key': 'draftkings', 'bookmaker_name': 'DraftKings',
+             'market_key': 'player_points', 'market_name': 'Points',
+             'market_abv': 'Pts', 'last_update': '', 'name': 'Over',
+             'player_name': name, 'price': price, 'line': 20.5,
+             'timestamp': last_update}
+            for name, price in prices.items()]
+
+def get_prices(props: list):
+    return {prop['player_name']: prop['price'] for prop in props}
+
+@pytest.fixture
+def store_path(tmp_path):
+    store = OddsStore('nba', str(tmp_path))
+    store.append(make_props({'A': -110, 'B': 100}, 1.0), MARKETS, fetched=1.0)
+    store.append(make_props({'A': -120, 'C': 110}, 2.0), MARKETS, fetched=2.0)
+    return str(tmp_path)
+
+
+def test_latest_reads_snapshot_only(store_path, monkeypatch):
+    def no_history(self):
+        raise AssertionError('history was read')
+
+    monkeypatch.setattr(OddsStore, 'load', no_history)
+    store = OddsStore('nba', store_path)
+    assert get_prices(store.latest()) == {'A': -120, 'C': 110}
+    store.append(make_props({'A': -120}, 3.0), MARKETS, fetched=3.0)
+    assert get_prices(OddsStore('nba', store_path).latest()) == {'A': -120}
+
+def test_latest_as_of_uses_history(store_path):
+    store = OddsStore('nba', store_path)
+    as_of = datetime.fromtimestamp(1.5)
+    assert get_prices(store.latest(as_of=as_of)) == {'A': -110, 'B': 100}
+
+def test_stale_snapshot_is_rebuilt(store_path):
+    # Snapshot from before the last segment, ex.) a crash between writes
+    store = OddsStore('nba', store_path)
+    os.rename(os.path.join(store_path, 'segment_000001.npz'),
+              os.path.join(store_path, 'segment_000001.bak'))
+    store.live = None
+    store.data = None
+    store.latest()
+    os.rename(os.path.join(store_path, 'segment_000001.bak'),
+              os.path.join(store_path, 'segment_000001.npz'))
+
+    assert get_prices(OddsStore('nba', store_path).latest()) == {
+        'A': -120, 'C': 110}
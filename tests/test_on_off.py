@@ -0,0 +1,54 @@
+import os
+
+import pytest
+
+from data_analysis import NBADataAnalysis
+from on_off import NBAOnOffMatrix
+
+
+@pytest.fixture
+def analysis(league_workspace):
+    return NBADataAnalysis()
+
+def get_on_off(analysis: NBADataAnalysis):
+    on_off = NBAOnOffMatrix(analysis.teams, ['minutes', 'points'],
+                            [analysis.season])
+    on_off.load_or_build()
+    return on_off
+
+
+def test_averages_match_player_stats(analysis):
+    on_off = get_on_off(analysis)
+    team = next(team for team in analysis.teams if len(team.players) > 1)
+    player, teammate = team.players[:2]
+    for kwargs in [{}, {'with_player': [teammate.id]},
+                   {'without_player': [teammate.id]}]:
+        log = player.get_stats(['points'], seasons=[analysis.season],
+                               **kwargs)
+        avg, gp = on_off.get_stat_average(player.id, 'points', **kwargs)
+        assert gp == len(log)
+        if gp > 0:
+            assert avg == pytest.approx(sum(log) / len(log))
+
+def test_cached_matrix_rebuilt_when_rosters_change(analysis):
+    on_off = get_on_off(analysis)
+    assert os.path.exists(os.path.join(on_off.file_path, on_off.file_name))
+    assert get_on_off(analysis).version == on_off.version
+
+    players_file = 'data/nba/players/nba_players.json'
+    stat = os.stat(players_file)
+    os.utime(players_file, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+    assert get_on_off(analysis).version != on_off.version
+
+def test_with_without_none_for_other_team(analysis):
+    on_off = get_on_off(analysis)
+    team, other = [team for team in analysis.teams
+                   if len(team.players) > 1][:2]
+    player, teammate = team.players[:2]
+    result = on_off.get_with_without(player.id, teammate.id, 'points')
+    assert set(result) == {'avg_with', 'gp_with', 'avg_without',
+                           'gp_without'}
+    assert result['gp_with'] == len(player.get_stats(
+        ['points'], seasons=[analysis.season], with_player=[teammate.id]))
+    assert on_off.get_with_without(player.id, other.players[0].id,
+                                   'points') is None
@@ -0,0 +1,74 @@
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import prop_scoring
+from file_handler import FileHandler
+from data_analysis import NBADataAnalysis
+
+
+@pytest.fixture
+def analysis(league_workspace):
+    return NBADataAnalysis()
+
+def get_markets():
+    return FileHandler('api_keys_player_prop_markets.json',
+                       'data/nba/odds').load_file()
+
+def get_slate_date(manifest: dict):
+    return datetime.strptime(manifest['slate_date'], '%Y-%m-%d')
+
+def assert_tables_match(analysis: NBADataAnalysis, date_obj: datetime,
+                        market: dict):
+    batch = analysis.create_player_prop_tables(date_obj, market)
+    single = analysis.create_player_prop_tables(date_obj, market,
+                                                batch_scoring=False)
+    assert len(batch) > 0
+    pd.testing.assert_frame_equal(batch, single)
+
+
+def test_batch_matches_per_player_for_every_market(analysis, league_workspace):
+    league, manifest = league_workspace
+    markets = get_markets()
+    assert len(markets) == 14
+    for market in markets:
+        assert_tables_match(analysis, get_slate_date(manifest), market)
+
+def test_batch_matches_per_player_without_games_this_season(
+        analysis, league_workspace):
+    # Players without games this season have a 4th split of 0 for all and
+    # home/away, and None as its average
+    league, manifest = league_workspace
+    for team in analysis.teams:
+        for player in team.players[::2]:
+            player.gamelog = [gamelog for gamelog in player.gamelog
+                              if gamelog.game.season != analysis.season]
+    for market in get_markets():
+        assert_tables_match(analysis, get_slate_date(manifest), market)
+
+
+def test_zero_4th_split_has_no_weight():
+    w_avl, w_cover = prop_scoring.get_player_weights(np.array([0, 4]))
+    assert w_avl[0, 3] == 0 and w_cover[0, 3] == 0
+    assert w_avl[1, 3] > 0 and w_cover[1, 3] > 0
+    assert prop_scoring.get_player_splits(50, 0) == [5, 10, 20, 0]
+    assert prop_scoring.get_player_splits(3, 0) == []
+
+def test_score_player_props_ignores_missing_4th_average():
+    lines = np.array([10.5])
+    gp = np.full((1, 3), 50.0)
+    spl_4 = np.array([[0.0, 0.0, 50.0]])
+    avgs = np.full((1, 3, 4), 12.0)
+    avgs[0, :2, 3] = np.nan
+    cover_counts = np.full((1, 3, 4), 3.0)
+    cover_lens = np.full((1, 3, 4), 5.0)
+    def_ranks = np.full((1, 2, 4), 15.0)
+    scores, totals = prop_scoring.score_player_props(
+        lines, gp, spl_4, avgs, cover_counts, cover_lens, def_ranks,
+        np.array([0.0]))
+    assert not np.isnan(scores).any()
+    assert not np.isnan(totals).any()
+    display = prop_scoring.format_scores(scores, totals)
+    assert None not in display[0]
@@ -0,0 +1,55 @@
+from datetime import datetime, timezone
+
+import numpy as np
+import pytest
+
+from data_analysis import NBADataAnalysis
+from similarity import NBAPlayerIndex
+
+
+@pytest.fixture
+def analysis(league_workspace):
+    return NBADataAnalysis()
+
+def get_first_season_end(analysis: NBADataAnalysis):
+    """Return datetime just after the last game of the first season."""
+
+    first_season = min(game.season for game in analysis.games)
+    timestamp = max(game.timestamp for game in analysis.games
+                    if game.season == first_season)
+    return datetime.fromtimestamp(timestamp + 1, tz=timezone.utc)
+
+
+def test_features_stop_at_point_in_time(analysis):
+    players = [player for player in analysis.players
+               if len(player.gamelog) > 0]
+    index = NBAPlayerIndex(players)
+    latest = index.features.copy()
+
+    analysis.set_point_in_time(get_first_season_end(analysis))
+    assert index.refresh() == len(players)
+    assert not np.array_equal(index.features, latest)
+    # Same rows as an index built from the games before the cutoff only
+    for player in players:
+        player.gamelog = player.gamelog[:player.gamelog_end]
+        player.gamelog_end = None
+    assert np.array_equal(index.features, NBAPlayerIndex(players).features)
+
+def test_refresh_only_updates_changed_players(analysis):
+    index = analysis.get_player_index()
+    assert index.refresh() == 0
+    assert analysis.get_player_index(refresh=False) is index
+
+    player = index.players[0]
+    player.gamelog_end = len(player.gamelog) - 1
+    assert index.refresh() == 1
+
+def test_prop_tables_with_index_ranking(analysis, league_workspace):
+    league, manifest = league_workspace
+    date_obj = datetime.strptime(manifest['slate_date'], '%Y-%m-%d')
+    market = league.markets[0]
+    by_position = analysis.create_player_prop_tables(date_obj, market)
+    by_index = analysis.create_player_prop_tables(date_obj, market,
+                                                  similar_by_index=True)
+    assert analysis.player_index is not None
+    assert by_index.shape == by_position.shape